@@ -19,85 +19,252 @@ The interface includes the following screens:
 8. Login screen: Sign in or register for account and order history.
 """
 
+import time
+_BOOT_START = time.perf_counter()
+
 import tkinter as tk
 from tkinter import messagebox
-from PIL import Image, ImageTk
-import json
+import tkinter.font as tkfont
+import argparse
+import sys
+import address_index
+import assets
+import catalog
+import delivery
+import kitchen
+import kitchen_display
+import ordering
+import pricing
+import promotions
+import recommend
+import scheduler
+import store
+from widgets import AutocompleteEntry, VirtualList, bind_mousewheel
+
+# How long after it is placed an order is expected at the door, for orders this kitchen didn't take.
+DELIVERY_MINUTES = 30
+PREPARING_MINUTES = 10
+# From the kitchen's ready time to the door.
+DRIVE_MINUTES = 20
+# Where the store sits on the Track Order map, and how many pixels a km of delivery.py's table is.
+MAP_STORE = (400, 200)
+MAP_PIXELS_PER_KM = 60
+COURIER_FRAME_MS = 100
 
 class PizzaPalace:
-    def __init__(self, root):
+    def __init__(self, root, store_path="users.json", shared_kitchen=None, shared_dispatcher=None):
+        # Staged boot: only what the home screen needs is loaded before the
+        # first frame. Users and the other images load when a screen asks.
+        self.boot_timings = []
+        # Extra kiosk windows are Toplevels; time those from their own creation.
+        self.boot_started = _BOOT_START if isinstance(root, tk.Tk) else time.perf_counter()
+        self._boot_mark = self.boot_started
+        self.mark_boot_stage("imports")
+
         self.root = root
         self.root.title("Pizza Palace Ordering System")
         self.root.geometry("1000x1200")
         self.root.configure(bg="#FFE461")
         self.cart = []
-        self.users = {}
+        self.cart_version = 0
+        self.screens = {}
+        self.current_screen = None
+        self.store_path = store_path
+        self._store = None
+        self._promotions = None
+        self._recommender = None
+        self.coupon_code = None
         self.current_user = None
-        self.load_users()
-        self.load_images()
+        self.tracked_order = None
+        # Kiosk windows in one process share the kitchen their orders go to, and the
+        # dispatcher, which shared_dispatcher() fetches when this window first needs it.
+        self.kitchen = shared_kitchen or kitchen.Kitchen(now=time.time())
+        self.shared_dispatcher = shared_dispatcher
+        self._dispatcher = None
+        self.scheduler = scheduler.shared(root)
+        self.images_loaded = False
+        self.image_keys = []
+        self.root.bind("<Destroy>", self.on_destroy, add="+")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.mark_boot_stage("window setup")
+
+        self.load_home_images()
+        self.mark_boot_stage("logo")
         self.create_home_screen()
+        self.mark_boot_stage("home screen")
+
+        self.first_frame_ms = None
+        self.root.after_idle(self.first_frame_shown)
+
+    def mark_boot_stage(self, stage):
+        now = time.perf_counter()
+        self.boot_timings.append((stage, (now - self._boot_mark) * 1000))
+        self._boot_mark = now
+
+    def first_frame_shown(self):
+        self.mark_boot_stage("first frame")
+        self.first_frame_ms = (self._boot_mark - self.boot_started) * 1000
+
+    def startup_report(self):
+        lines = ["Startup timing (ms):"]
+        for stage, ms in self.boot_timings:
+            lines.append(f"  {stage:<20}{ms:8.1f}")
+        if self.first_frame_ms is not None:
+            lines.append(f"  {'time to first frame':<20}{self.first_frame_ms:8.1f}")
+        return "\n".join(lines)
+
+    def acquire_image(self, source, size=None):
+        image = assets.registry.acquire(self.root, source, size)
+        self.image_keys.append((source, size))
+        return image
+
+    def release_images(self):
+        for source, size in self.image_keys:
+            assets.registry.release(source, size)
+        self.image_keys = []
+
+    def on_close(self):
+        # Orders still waiting for the writer thread are flushed before the window goes.
+        if self._store is not None:
+            self._store.close()
+        self.save_recommendations()
+        self.root.destroy()
+
+    def on_destroy(self, event):
+        # <Destroy> on a toplevel also fires for every child widget it loses.
+        if event.widget is self.root:
+            try:
+                for name in self.screens:
+                    self.scheduler.cancel((self, name))
+            except tk.TclError:
+                pass
+            self.release_images()
+            if self._store is not None:
+                self._store.close()
+            self.save_recommendations()
+
+    def load_home_images(self):
+        try:
+            self.logo_photo = self.acquire_image("logo.JPG")
+        except Exception as e:
+            print(f"Error loading logo: {e}")
+            self.logo_photo = tk.PhotoImage(width=1, height=1)
 
     def load_images(self):
+        if self.images_loaded:
+            return
+        self.images_loaded = True
+        started = time.perf_counter()
         try:
-            self.logo_image = Image.open("logo.JPG")
-            self.logo_photo = ImageTk.PhotoImage(self.logo_image)
-
             self.toppings_images = {
-                "Bacon": ImageTk.PhotoImage(Image.open("bacon.png").resize((50, 50), Image.Resampling.LANCZOS)),
-                "Black Olives": ImageTk.PhotoImage(Image.open("black olives.png").resize((50, 50), Image.Resampling.LANCZOS)),
-                "Extra Cheese": ImageTk.PhotoImage(Image.open("extra cheese.png").resize((50, 50), Image.Resampling.LANCZOS)),
-                "Green Peppers": ImageTk.PhotoImage(Image.open("green peppers.png").resize((50, 50), Image.Resampling.LANCZOS)),
-                "Mushrooms": ImageTk.PhotoImage(Image.open("mushrooms.png").resize((50, 50), Image.Resampling.LANCZOS)),
-                "Onions": ImageTk.PhotoImage(Image.open("onions.png").resize((50, 50), Image.Resampling.LANCZOS)),
-                "Pepperoni": ImageTk.PhotoImage(Image.open("pepperoni.png").resize((50, 50), Image.Resampling.LANCZOS)),
-                "Pineapple": ImageTk.PhotoImage(Image.open("pineapple.png").resize((50, 50), Image.Resampling.LANCZOS)),
-                "Ham": ImageTk.PhotoImage(Image.open("ham.png").resize((50, 50), Image.Resampling.LANCZOS)),
-                "Sausage": ImageTk.PhotoImage(Image.open("sausage.png").resize((50, 50), Image.Resampling.LANCZOS)),
-                "Spinach": ImageTk.PhotoImage(Image.open("spinach.png").resize((50, 50), Image.Resampling.LANCZOS))
+                "Bacon": self.acquire_image("bacon.png", (50, 50)),
+                "Black Olives": self.acquire_image("black olives.png", (50, 50)),
+                "Extra Cheese": self.acquire_image("extra cheese.png", (50, 50)),
+                "Green Peppers": self.acquire_image("green peppers.png", (50, 50)),
+                "Mushrooms": self.acquire_image("mushrooms.png", (50, 50)),
+                "Onions": self.acquire_image("onions.png", (50, 50)),
+                "Pepperoni": self.acquire_image("pepperoni.png", (50, 50)),
+                "Pineapple": self.acquire_image("pineapple.PNG", (50, 50)),
+                "Ham": self.acquire_image("ham.png", (50, 50)),
+                "Sausage": self.acquire_image("sausage.PNG", (50, 50)),
+                "Spinach": self.acquire_image("spinach.png", (50, 50))
             }
 
             self.menu_images = {
-                "BBQ Chicken": ImageTk.PhotoImage(Image.open("BBQChicken.png").resize((100, 100), Image.Resampling.LANCZOS)),
-                "Charcoal": ImageTk.PhotoImage(Image.open("Charcoal.png").resize((100, 100), Image.Resampling.LANCZOS)),
-                "Cheesey": ImageTk.PhotoImage(Image.open("Cheesey.png").resize((100, 100), Image.Resampling.LANCZOS)),
-                "Flaming Pork": ImageTk.PhotoImage(Image.open("Flaming Pork.png").resize((100, 100), Image.Resampling.LANCZOS)),
-                "Hawaiian": ImageTk.PhotoImage(Image.open("Hawaiian.png").resize((100, 100), Image.Resampling.LANCZOS)),
-                "Margherita": ImageTk.PhotoImage(Image.open("MargheritaPizza.png").resize((100, 100), Image.Resampling.LANCZOS)),
-                "Meat Lovers": ImageTk.PhotoImage(Image.open("MeatLovers.png").resize((100, 100), Image.Resampling.LANCZOS)),
-                "Pepperoni": ImageTk.PhotoImage(Image.open("PepperoniPizza.png").resize((100, 100), Image.Resampling.LANCZOS)),
-                "Seafood": ImageTk.PhotoImage(Image.open("Seafood.png").resize((100, 100), Image.Resampling.LANCZOS)),
-                "Supreme": ImageTk.PhotoImage(Image.open("Supreme.png").resize((100, 100), Image.Resampling.LANCZOS))
+                "BBQ Chicken": self.acquire_image("BBQChicken.png", (100, 100)),
+                "Charcoal": self.acquire_image("Charcoal.png", (100, 100)),
+                "Cheesey": self.acquire_image("Cheesey.png", (100, 100)),
+                "Flaming Pork": self.acquire_image("Flaming Pork.png", (100, 100)),
+                "Hawaiian": self.acquire_image("Hawaiian.png", (100, 100)),
+                "Margherita": self.acquire_image("MargheritaPizza.png", (100, 100)),
+                "Meat Lovers": self.acquire_image("MeatLovers.png", (100, 100)),
+                "Pepperoni": self.acquire_image("PepperoniPizza.png", (100, 100)),
+                "Seafood": self.acquire_image("Seafood.png", (100, 100)),
+                "Supreme": self.acquire_image("Supreme.png", (100, 100))
             }
 
             self.beverage_images = {
-                "Coke": ImageTk.PhotoImage(Image.open("coke.png").resize((200, 100), Image.Resampling.LANCZOS)),
-                "Jarritos": ImageTk.PhotoImage(Image.open("jarritos.png").resize((200, 100), Image.Resampling.LANCZOS))
+                "Coke": self.acquire_image("coke.png", (200, 100)),
+                "Jarritos": self.acquire_image("jarritos.png", (200, 100))
             }
 
-            self.map_image = ImageTk.PhotoImage(Image.open("map.PNG").resize((800, 400), Image.Resampling.LANCZOS))
-            print("Images loaded successfully")
+            self.map_image = self.acquire_image("map.PNG", (800, 400))
 
         except Exception as e:
             print(f"Error loading images: {e}")
-
-    def load_users(self):
-        try:
-            with open("users.json", "r") as f:
-                self.users = json.load(f)
-        except FileNotFoundError:
-            self.users = {}
-
-    def save_users(self):
-        with open("users.json", "w") as f:
-            json.dump(self.users, f)
+        self.boot_timings.append(("images (deferred)", (time.perf_counter() - started) * 1000))
+
+    @property
+    def store(self):
+        if self._store is None:
+            started = time.perf_counter()
+            self._store = store.WriteBehindStore(self.store_path, self.root)
+            self.boot_timings.append(("users (deferred)", (time.perf_counter() - started) * 1000))
+        return self._store
+
+    @property
+    def promotions(self):
+        if self._promotions is None:
+            started = time.perf_counter()
+            self._promotions = promotions.load_rules()
+            self.boot_timings.append(("promotions (deferred)", (time.perf_counter() - started) * 1000))
+        return self._promotions
+
+    @property
+    def recommender(self):
+        if self._recommender is None:
+            try:
+                self._recommender = recommend.Recommender(recommend.index_path(self.store_path))
+            except (OSError, ValueError) as e:
+                print(f"Error loading recommendations: {e}")
+                self._recommender = recommend.Recommender()
+        return self._recommender
+
+    @property
+    def dispatcher(self):
+        if self._dispatcher is None and self.shared_dispatcher is not None:
+            self._dispatcher = self.shared_dispatcher()
+        if self._dispatcher is None:
+            try:
+                addresses = delivery.load_addresses()
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error loading the address table: {e}")
+                addresses = {}
+            self._dispatcher = delivery.Dispatcher(addresses, now=time.time())
+        return self._dispatcher
+
+    def save_recommendations(self):
+        if self._recommender is not None:
+            try:
+                self._recommender.save()
+            except (OSError, ValueError) as e:
+                print(f"Error saving recommendations: {e}")
+
+    def show_screen(self, name, build, refresh=None):
+        # Screens are built once into their own frame and kept alive; navigating
+        # raises the frame and lets refresh() patch whatever data changed.
+        if self.current_screen is not None and self.current_screen != name:
+            # Whatever the screen being left had running stops with it; refresh() starts it again.
+            self.scheduler.cancel((self, self.current_screen))
+        screen = self.screens.get(name)
+        if screen is None:
+            screen = tk.Frame(self.root, bg="#FFE461")
+            screen.place(relx=0, rely=0, relwidth=1, relheight=1)
+            self.screens[name] = screen
+            build(screen)
+        elif refresh:
+            refresh()
+        screen.tkraise()
+        self.current_screen = name
 
     def create_home_screen(self):
-        self.clear_screen()
+        self.show_screen("home", self.build_home_screen)
 
-        tk.Label(self.root, image=self.logo_photo, bg="#FFE461").pack(pady=10)
-        tk.Label(self.root, text="Welcome to Pizza Palace!", font=("Cooper Black", 36), bg="#FFE461").pack(pady=20)
+    def build_home_screen(self, parent):
+        tk.Label(parent, image=self.logo_photo, bg="#FFE461").pack(pady=10)
+        tk.Label(parent, text="Welcome to Pizza Palace!", font=("Cooper Black", 36), bg="#FFE461").pack(pady=20)
 
-        button_frame = tk.Frame(self.root, bg="#FFE461")
+        button_frame = tk.Frame(parent, bg="#FFE461")
         button_frame.pack(pady=10)
 
         buttons = [
@@ -116,8 +283,11 @@ class PizzaPalace:
             tk.Button(button_frame, text=text, command=command, width=20).grid(row=row, column=col, padx=5, pady=5)
 
     def create_order_pizza_screen(self):
-        self.clear_screen()
-        canvas, frame = self.create_scrollable_canvas()
+        self.load_images()
+        self.show_screen("order_pizza", self.build_order_pizza_screen, self.reset_order_pizza_screen)
+
+    def build_order_pizza_screen(self, parent):
+        canvas, frame = self.create_scrollable_canvas(parent)
 
         tk.Label(frame, text="Select Pizza Size", font=("Cooper Black", 12), bg="#FFE461").pack(pady=5)
         self.size_var = tk.StringVar(value="Medium")
@@ -132,7 +302,7 @@ class PizzaPalace:
             tk.Radiobutton(frame, text=text, variable=self.crust_var, value=value, bg="#FFE461").pack(anchor=tk.W)
 
         tk.Label(frame, text="Select Toppings", font=("Cooper Black", 12), bg="#FFE461").pack(pady=5)
-        self.toppings = ["Pepperoni", "Mushrooms", "Onions", "Sausage", "Bacon", "Extra Cheese", "Black Olives", "Green Peppers", "Pineapple", "Spinach", "Ham"]
+        self.toppings = catalog.TOPPINGS
         self.toppings_vars = []
         for topping in self.toppings:
             var = tk.BooleanVar()
@@ -150,38 +320,44 @@ class PizzaPalace:
         tk.Button(frame, text="View Cart", command=self.create_cart_screen).pack(pady=5)
         tk.Button(frame, text="Back to Home", command=self.create_home_screen).pack(pady=5)
 
+    def reset_order_pizza_screen(self):
+        self.size_var.set("Medium")
+        self.crust_var.set("Regular")
+        for var in self.toppings_vars:
+            var.set(False)
+        self.quantity_var.set(1)
+
     def add_pizza_to_cart(self):
         size = self.size_var.get()
         crust = self.crust_var.get().replace(" +$2", "")
         toppings = [topping for topping, var in zip(self.toppings, self.toppings_vars) if var.get()]
-        quantity = self.quantity_var.get()
-
-        if not size or not crust or quantity <= 0:
+        try:
+            item = ordering.custom_pizza(size, crust, toppings, self.quantity_var.get())
+        except (ordering.OrderError, tk.TclError):
             messagebox.showwarning("Invalid Input", "Please select size, crust type, and a valid quantity.")
             return
 
-        base_price = {"Small": 10.99, "Medium": 12.99, "Large": 14.99}
-        crust_price = 2.0 if crust == "Stuffed" else 0.0
-        price = base_price[size] + crust_price + 1.5 * len(toppings)
-
-        item = {"type": "pizza", "size": size, "crust": crust, "toppings": toppings, "quantity": quantity, "price": price, "specialty": ""}
         self.cart.append(item)
+        self.cart_version += 1
         messagebox.showinfo("Added to Cart", "Your pizza has been added to the cart.")
 
     def create_order_beverage_screen(self):
-        self.clear_screen()
-        canvas, frame = self.create_scrollable_canvas()
+        self.load_images()
+        self.show_screen("order_beverage", self.build_order_beverage_screen, self.reset_order_beverage_screen)
+
+    def build_order_beverage_screen(self, parent):
+        canvas, frame = self.create_scrollable_canvas(parent)
 
         tk.Label(frame, text="Select Beverage", font=("Cooper Black", 12), bg="#FFE461").pack(pady=5)
 
         tk.Label(frame, image=self.beverage_images["Coke"], bg="#FFE461").pack()
         self.beverage_var = tk.StringVar(value="None")
-        coke_flavors = ["None", "Diet Coke", "Coca-cola", "Dr. Pepper", "Sunkist", "Squirt", "Sprite"]
+        coke_flavors = ["None"] + catalog.COKE_FLAVORS
         for flavor in coke_flavors:
             tk.Radiobutton(frame, text=flavor, variable=self.beverage_var, value=flavor, bg="#FFE461").pack(anchor=tk.W)
 
         tk.Label(frame, image=self.beverage_images["Jarritos"], bg="#FFE461").pack()
-        jarritos_flavors = ["None", "Tamarind", "Strawberry", "Mandarin", "Grapefruit", "Fruit Punch"]
+        jarritos_flavors = ["None"] + catalog.JARRITOS_FLAVORS
         for flavor in jarritos_flavors:
             tk.Radiobutton(frame, text=flavor, variable=self.beverage_var, value=flavor, bg="#FFE461").pack(anchor=tk.W)
 
@@ -193,49 +369,88 @@ class PizzaPalace:
         tk.Button(frame, text="View Cart", command=self.create_cart_screen).pack(pady=5)
         tk.Button(frame, text="Back to Home", command=self.create_home_screen).pack(pady=5)
 
-    def add_beverage_to_cart(self):
-        beverage = self.beverage_var.get()
-        beverage_quantity = self.beverage_quantity_var.get()
+    def reset_order_beverage_screen(self):
+        self.beverage_var.set("None")
+        self.beverage_quantity_var.set(1)
 
-        if beverage == "None" or beverage_quantity <= 0:
+    def add_beverage_to_cart(self):
+        try:
+            item = ordering.beverage(self.beverage_var.get(), self.beverage_quantity_var.get())
+        except (ordering.OrderError, tk.TclError):
             messagebox.showwarning("Invalid Input", "Please select a beverage and a valid quantity.")
             return
 
-        beverage_price = 1.75 if beverage in ["Tamarind", "Strawberry", "Mandarin", "Grapefruit", "Fruit Punch"] else 1.0
-        price = beverage_price * beverage_quantity
-
-        item = {"type": "beverage", "beverage": beverage, "beverage_quantity": beverage_quantity, "price": price}
         self.cart.append(item)
+        self.cart_version += 1
         messagebox.showinfo("Added to Cart", "Your beverage has been added to the cart.")
 
     def create_cart_screen(self):
-        self.clear_screen()
-        canvas, frame = self.create_scrollable_canvas()
+        self.show_screen("cart", self.build_cart_screen, self.refresh_cart_screen)
+
+    def build_cart_screen(self, parent):
+        tk.Label(parent, text="Cart", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
+
+        bottom_frame = tk.Frame(parent, bg="#FFE461")
+        bottom_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        totals_frame = tk.Frame(bottom_frame, bg="#FFE461")
+        totals_frame.pack(fill=tk.X, padx=20, pady=5)
+        coupon_frame = tk.Frame(totals_frame, bg="#FFE461")
+        coupon_frame.pack(anchor=tk.E, pady=5)
+        tk.Label(coupon_frame, text="Coupon:", bg="#FFE461").pack(side=tk.LEFT)
+        self.coupon_entry = tk.Entry(coupon_frame, width=12)
+        self.coupon_entry.pack(side=tk.LEFT, padx=5)
+        tk.Button(coupon_frame, text="Apply", command=self.apply_coupon).pack(side=tk.LEFT)
+        self.suggestions_frame = tk.Frame(totals_frame, bg="#FFE461")
+        tk.Label(self.suggestions_frame, text="Frequently ordered together:", bg="#FFE461").pack(side=tk.LEFT)
+        self.suggestion_buttons = [tk.Button(self.suggestions_frame) for _ in range(recommend.SUGGESTIONS)]
+        self.subtotal_label = tk.Label(totals_frame, bg="#FFE461")
+        self.subtotal_label.pack(anchor=tk.E)
+        self.discount_label = tk.Label(totals_frame, bg="#FFE461", justify=tk.RIGHT)
+        self.discount_label.pack(anchor=tk.E)
+        self.tax_label = tk.Label(totals_frame, bg="#FFE461")
+        self.tax_label.pack(anchor=tk.E)
+        self.total_label = tk.Label(totals_frame, bg="#FFE461")
+        self.total_label.pack(anchor=tk.E)
+        tk.Button(bottom_frame, text="Proceed to Checkout", command=self.create_checkout_screen).pack(pady=10)
+        tk.Button(bottom_frame, text="Back to Home", command=self.create_home_screen).pack(pady=5)
+
+        self.cart_empty_label = tk.Label(parent, text="Your cart is empty.", bg="#FFE461")
+        self.cart_list = VirtualList(parent, self.create_cart_row, self.update_cart_row)
+        self.cart_rendered_version = None
+        self.refresh_cart_screen()
+
+    def create_cart_row(self, parent):
+        row = tk.Frame(parent, bg="#FFE461", pady=5)
+        row.label = tk.Label(row, bg="#FFE461")
+        row.label.pack(side=tk.LEFT)
+        row.edit_button = tk.Button(row, text="Edit")
+        row.edit_button.pack(side=tk.LEFT, padx=5)
+        row.remove_button = tk.Button(row, text="Remove")
+        row.remove_button.pack(side=tk.LEFT, padx=5)
+        return row
+
+    def update_cart_row(self, row, index, item):
+        if item['type'] == 'pizza':
+            item_text = f"Pizza {index + 1}: Size - {item['size']}, Crust - {item['crust']}, Toppings - {', '.join(item['toppings'])}, Specialty - {item['specialty']}, Quantity - {item['quantity']}, Price - {pricing.format_price(pricing.item_cents(item))}"
+        else:
+            item_text = f"Beverage {index + 1}: {item['beverage']} x {item['beverage_quantity']}, Price - {pricing.format_price(pricing.item_cents(item))}"
+        row.label.config(text=item_text)
+        row.edit_button.config(command=lambda i=index: self.edit_cart_item(i))
+        row.remove_button.config(command=lambda i=index: self.remove_cart_item(i))
 
-        tk.Label(frame, text="Cart", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
+    def refresh_cart_screen(self):
+        if self.cart_rendered_version == self.cart_version:
+            return
+        self.cart_rendered_version = self.cart_version
 
         if not self.cart:
-            tk.Label(frame, text="Your cart is empty.", bg="#FFE461").pack(pady=10)
+            self.cart_list.pack_forget()
+            self.cart_empty_label.pack(pady=10)
         else:
-            self.cart_frames = []
-            for index, item in enumerate(self.cart):
-                item_frame = tk.Frame(frame, bg="#FFE461")
-                item_frame.pack(fill=tk.X, pady=5)
-                self.cart_frames.append(item_frame)
-
-                if item['type'] == 'pizza':
-                    item_text = f"Pizza {index + 1}: Size - {item['size']}, Crust - {item['crust']}, Toppings - {', '.join(item['toppings'])}, Specialty - {item['specialty']}, Quantity - {item['quantity']}, Price - ${item['price'] * item['quantity']:.2f}"
-                else:
-                    item_text = f"Beverage {index + 1}: {item['beverage']} x {item['beverage_quantity']}, Price - ${item['price']:.2f}"
-                tk.Label(item_frame, text=item_text, bg="#FFE461").pack(side=tk.LEFT)
-
-                tk.Button(item_frame, text="Edit", command=lambda i=index: self.edit_cart_item(i)).pack(side=tk.LEFT, padx=5)
-                tk.Button(item_frame, text="Remove", command=lambda i=index: self.remove_cart_item(i)).pack(side=tk.LEFT, padx=5)
-
-            self.update_cart_total()
-
-        tk.Button(frame, text="Proceed to Checkout", command=self.create_checkout_screen).pack(pady=10)
-        tk.Button(frame, text="Back to Home", command=self.create_home_screen).pack(pady=5)
+            self.cart_empty_label.pack_forget()
+            self.cart_list.pack(fill=tk.BOTH, expand=True, padx=10)
+        self.cart_list.set_items(self.cart)
+        self.update_cart_total()
 
     def edit_cart_item(self, index):
         edit_window = tk.Toplevel(self.root)
@@ -253,157 +468,346 @@ class PizzaPalace:
             tk.Button(edit_window, text="Update", command=lambda: self.update_cart_item(index, beverage_quantity_var.get(), edit_window)).pack(pady=10)
 
     def update_cart_item(self, index, new_quantity, window):
-        if self.cart[index]['type'] == 'pizza':
-            self.cart[index]['quantity'] = new_quantity
-        else:
-            self.cart[index]['beverage_quantity'] = new_quantity
-            beverage_price = 1.75 if self.cart[index]['beverage'] in ["Tamarind", "Strawberry", "Mandarin", "Grapefruit", "Fruit Punch"] else 1.0
-            self.cart[index]['price'] = beverage_price * new_quantity
+        try:
+            ordering.set_quantity(self.cart[index], new_quantity)
+        except ordering.OrderError as e:
+            messagebox.showwarning("Invalid Input", str(e))
+            return
+        self.cart_version += 1
         window.destroy()
+        # Patch the one row and the totals rather than redrawing the cart.
+        self.cart_list.update_item(index, self.cart[index])
+        self.update_cart_total()
+        self.cart_rendered_version = self.cart_version
         self.create_cart_screen()
 
     def remove_cart_item(self, index):
         del self.cart[index]
+        self.cart_version += 1
+        if self.cart:
+            self.cart_list.delete(index)
+            self.update_cart_total()
+            self.cart_rendered_version = self.cart_version
         self.create_cart_screen()
 
-    def update_cart_total(self):
-        subtotal = sum(item['price'] * (item['quantity'] if item['type'] == 'pizza' else 1) for item in self.cart)
-        tax = subtotal * 0.07
-        total = subtotal + tax
-
-        frame = tk.Frame(self.root, bg="#FFE461")
-        frame.pack(fill=tk.X, pady=5)
-        self.cart_frames.append(frame)
+    def apply_coupon(self):
+        try:
+            self.coupon_code = ordering.check_coupon(self.promotions, self.coupon_entry.get())
+        except ordering.OrderError as e:
+            messagebox.showwarning("Coupon", str(e))
+            return
+        self.update_cart_total()
 
-        tk.Label(frame, text=f"Subtotal: ${subtotal:.2f}", bg="#FFE461").pack(anchor=tk.E)
-        tk.Label(frame, text=f"Tax: ${tax:.2f}", bg="#FFE461").pack(anchor=tk.E)
-        tk.Label(frame, text=f"Total: ${total:.2f}", bg="#FFE461").pack(anchor=tk.E)
+    def update_cart_total(self):
+        quote, applied = ordering.cart_totals(self.cart, self.promotions, self.coupon_code)
+
+        self.subtotal_label.config(text=f"Subtotal: {pricing.format_price(quote.subtotal)}")
+        self.discount_label.config(text="\n".join(f"{name}: {pricing.format_price(-value)}" for name, value in applied))
+        self.tax_label.config(text=f"Tax: {pricing.format_price(quote.tax)}")
+        self.total_label.config(text=f"Total: {pricing.format_price(quote.total)}")
+        self.update_suggestions()
+
+    def update_suggestions(self):
+        suggestions = self.recommender.suggest(self.cart) if self.cart else []
+        if not suggestions:
+            self.suggestions_frame.pack_forget()
+            return
+        self.suggestions_frame.pack(anchor=tk.W, pady=5, before=self.subtotal_label)
+        for button, (kind, name) in zip(self.suggestion_buttons, suggestions):
+            price = pricing.item_cents(self.suggested_item(kind, name))
+            button.config(text=f"Add {name} ({pricing.format_price(price)})",
+                          command=lambda k=kind, n=name: self.add_suggestion(k, n))
+            button.pack(side=tk.LEFT, padx=5)
+        for button in self.suggestion_buttons[len(suggestions):]:
+            button.pack_forget()
+
+    def suggested_item(self, kind, name):
+        # Specialties come as the menu's default, a Large on Regular crust.
+        return ordering.specialty_pizza(name) if kind == "specialty" else ordering.beverage(name)
+
+    def add_suggestion(self, kind, name):
+        self.cart.append(self.suggested_item(kind, name))
+        self.cart_version += 1
+        self.refresh_cart_screen()
 
     def create_view_menu_screen(self):
-        self.clear_screen()
-        canvas, frame = self.create_scrollable_canvas()
-
-        tk.Label(frame, text="Menu", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
-
-        self.menu_items = [
-            {"name": "BBQ Chicken", "description": "BBQ sauce, chicken, and mozzarella", "price": 16.99, "image": "BBQ Chicken"},
-            {"name": "Charcoal", "description": "Charcoal crust, smoky flavor", "price": 27.99, "image": "Charcoal"},
-            {"name": "Cheesey", "description": "Extra cheese and mozzarella", "price": 14.99, "image": "Cheesey"},
-            {"name": "Flaming Pork", "description": "Spicy pork and hot sauce", "price": 17.99, "image": "Flaming Pork"},
-            {"name": "Hawaiian", "description": "Ham, pineapple, and mozzarella", "price": 15.99, "image": "Hawaiian"},
-            {"name": "Margherita", "description": "Classic pizza with tomato sauce and mozzarella", "price": 15.99, "image": "Margherita"},
-            {"name": "Meat Lovers", "description": "Pepperoni, sausage, bacon, and ham", "price": 16.99, "image": "Meat Lovers"},
-            {"name": "Pepperoni", "description": "Pepperoni, tomato sauce, and mozzarella", "price": 15.99, "image": "Pepperoni"},
-            {"name": "Seafood", "description": "Shrimp, calamari, and mozzarella", "price": 19.99, "image": "Seafood"},
-            {"name": "Supreme", "description": "Pepperoni, sausage, green peppers, onions, and mushrooms", "price": 17.99, "image": "Supreme"}
-        ]
+        self.load_images()
+        self.show_screen("view_menu", self.build_view_menu_screen, self.reset_view_menu_screen)
 
-        self.size_prices = {
-            "Small": -4.0,
-            "Medium": -2.0,
-            "Large": 0.0
-        }
-        
-        self.crust_prices = {
-            "Thin": 0.0,
-            "Regular": 0.0,
-            "Stuffed": 2.0
-        }
+    def build_view_menu_screen(self, parent):
+        tk.Label(parent, text="Menu", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
+
+        self.menu_items = catalog.SPECIALTIES
 
         self.size_vars = {}
         self.crust_vars = {}
         self.price_labels = {}
-
         for item in self.menu_items:
-            item_frame = tk.Frame(frame, padx=150, pady=5, bg="#FFE461", highlightbackground="red", highlightthickness=2)
-            item_frame.pack(fill=tk.X, pady=5)
-            item_frame.configure(height=200)
-            size_var = tk.StringVar(value="Large")
-            self.size_vars[item["name"]] = size_var
-            crust_var = tk.StringVar(value="Regular")
-            self.crust_vars[item["name"]] = crust_var
-
-            try:
-                img = self.menu_images[item["image"]]
-                img_label = tk.Label(item_frame, image=img, bg="#FFE461")
-                img_label.image = img  # Keep a reference to avoid garbage collection
-                img_label.pack(side=tk.LEFT, padx=10)
-            except KeyError:
-                print(f"Image for {item['name']} not found")
-
-            text_frame = tk.Frame(item_frame, bg="#FFE461")
-            text_frame.pack(side=tk.LEFT, fill=tk.X)
-
-            tk.Label(text_frame, text=f"{item['name']}", font=("Cooper Black", 12), bg="#FFE461").pack(anchor=tk.W)
-            tk.Label(text_frame, text=item["description"], bg="#FFE461", wraplength=300, justify=tk.LEFT).pack(anchor=tk.W)
-            
-            size_frame = tk.Frame(text_frame, bg="#FFE461")
-            size_frame.pack(fill=tk.X)
-            for size in self.size_prices:
-                tk.Radiobutton(size_frame, text=size, variable=size_var, value=size, command=lambda i=item, sv=size_var, cv=crust_var: self.update_price(i, sv, cv), bg="#FFE461").pack(side=tk.LEFT)
-
-            crust_frame = tk.Frame(text_frame, bg="#FFE461")
-            crust_frame.pack(fill=tk.X)
-            for crust in self.crust_prices:
-                tk.Radiobutton(crust_frame, text=crust, variable=crust_var, value=crust, command=lambda i=item, sv=size_var, cv=crust_var: self.update_price(i, sv, cv), bg="#FFE461").pack(side=tk.LEFT)
-
-            price_label = tk.Label(text_frame, text=f"${item['price']:.2f}", font=("Cooper Black", 12), bg="#FFE461")
-            price_label.pack(anchor=tk.E)
-            self.price_labels[item["name"]] = price_label
-
-            tk.Button(text_frame, text="Add to Cart", command=lambda i=item: self.add_menu_item_to_cart(i)).pack(anchor=tk.E)
-
-        tk.Button(frame, text="View Cart", command=self.create_cart_screen).pack(pady=10)
-        tk.Button(frame, text="Back to Home", command=self.create_home_screen).pack(pady=10)
+            self.size_vars[item["name"]] = tk.StringVar(value="Large")
+            self.crust_vars[item["name"]] = tk.StringVar(value="Regular")
+
+        bottom_frame = tk.Frame(parent, bg="#FFE461")
+        bottom_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        tk.Button(bottom_frame, text="View Cart", command=self.create_cart_screen).pack(pady=10)
+        tk.Button(bottom_frame, text="Back to Home", command=self.create_home_screen).pack(pady=10)
+
+        self.menu_list = VirtualList(parent, self.create_menu_row, self.update_menu_row)
+        self.menu_list.pack(fill=tk.BOTH, expand=True)
+        self.menu_list.set_items(self.menu_items)
+
+    def create_menu_row(self, parent):
+        row = tk.Frame(parent, bg="#FFE461", pady=5)
+        item_frame = tk.Frame(row, padx=150, pady=5, bg="#FFE461", highlightbackground="red", highlightthickness=2)
+        item_frame.pack(fill=tk.X)
+
+        row.img_label = tk.Label(item_frame, bg="#FFE461")
+        row.img_label.pack(side=tk.LEFT, padx=10)
+
+        text_frame = tk.Frame(item_frame, bg="#FFE461")
+        text_frame.pack(side=tk.LEFT, fill=tk.X)
+
+        row.name_label = tk.Label(text_frame, font=("Cooper Black", 12), bg="#FFE461")
+        row.name_label.pack(anchor=tk.W)
+        row.description_label = tk.Label(text_frame, bg="#FFE461", wraplength=300, justify=tk.LEFT)
+        row.description_label.pack(anchor=tk.W)
+
+        size_frame = tk.Frame(text_frame, bg="#FFE461")
+        size_frame.pack(fill=tk.X)
+        row.size_buttons = []
+        for size in catalog.SIZES:
+            button = tk.Radiobutton(size_frame, text=size, value=size, bg="#FFE461")
+            button.pack(side=tk.LEFT)
+            row.size_buttons.append(button)
+
+        crust_frame = tk.Frame(text_frame, bg="#FFE461")
+        crust_frame.pack(fill=tk.X)
+        row.crust_buttons = []
+        for crust in catalog.CRUSTS:
+            button = tk.Radiobutton(crust_frame, text=crust, value=crust, bg="#FFE461")
+            button.pack(side=tk.LEFT)
+            row.crust_buttons.append(button)
+
+        row.price_label = tk.Label(text_frame, font=("Cooper Black", 12), bg="#FFE461")
+        row.price_label.pack(anchor=tk.E)
+
+        row.add_button = tk.Button(text_frame, text="Add to Cart")
+        row.add_button.pack(anchor=tk.E)
+        return row
+
+    def update_menu_row(self, row, index, item):
+        size_var = self.size_vars[item["name"]]
+        crust_var = self.crust_vars[item["name"]]
+        update = lambda i=item, sv=size_var, cv=crust_var: self.update_price(i, sv, cv)
+
+        img = self.menu_images.get(item["image"])
+        if img is None:
+            print(f"Image for {item['name']} not found")
+        row.img_label.config(image=img or "")
+        row.name_label.config(text=f"{item['name']}")
+        row.description_label.config(text=item["description"])
+        for button in row.size_buttons:
+            button.config(variable=size_var, command=update)
+        for button in row.crust_buttons:
+            button.config(variable=crust_var, command=update)
+        row.add_button.config(command=lambda i=item: self.add_menu_item_to_cart(i))
+
+        # Rows are recycled between items, so point the price label at this one.
+        self.price_labels[item["name"]] = row.price_label
+        self.update_price(item, size_var, crust_var)
+
+    def reset_view_menu_screen(self):
+        for item in self.menu_items:
+            self.size_vars[item["name"]].set("Large")
+            self.crust_vars[item["name"]].set("Regular")
+        self.menu_list.refresh()
 
     def update_price(self, item, size_var, crust_var):
-        base_price = item['price']
-        size = size_var.get()
-        crust = crust_var.get()
-        new_price = base_price + self.size_prices[size] + self.crust_prices[crust]
-        self.price_labels[item["name"]].config(text=f"${new_price:.2f}")
+        new_price = pricing.specialty_cents(item["name"], size_var.get(), crust_var.get())
+        self.price_labels[item["name"]].config(text=pricing.format_price(new_price))
 
     def add_menu_item_to_cart(self, item):
         size = self.size_vars[item["name"]].get()
         crust = self.crust_vars[item["name"]].get()
-        base_price = item['price']
-        price = base_price + self.size_prices[size] + self.crust_prices[crust]
-        self.cart.append({"type": "pizza", "size": size, "crust": crust, "toppings": [], "quantity": 1, "name": item['name'], "price": price, "specialty": item["name"]})
+        self.cart.append(ordering.specialty_pizza(item["name"], size, crust))
+        self.cart_version += 1
         messagebox.showinfo("Added to Cart", f"{item['name']} has been added to the cart.")
 
     def create_track_order_screen(self):
-        self.clear_screen()
-        canvas, frame = self.create_scrollable_canvas()
+        self.load_images()
+        self.show_screen("track_order", self.build_track_order_screen, self.refresh_track_order_screen)
+
+    def build_track_order_screen(self, parent):
+        canvas, frame = self.create_scrollable_canvas(parent)
 
         tk.Label(frame, text="Track Order", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
 
-        tk.Label(frame, text="Order #1234 - Status: Out for Delivery", bg="#FFE461").pack(pady=5)
+        search_frame = tk.Frame(frame, bg="#FFE461")
+        search_frame.pack(pady=5)
+        tk.Label(search_frame, text="Order ID, phone or name:", bg="#FFE461").pack(side=tk.LEFT)
+        self.track_search_entry = tk.Entry(search_frame, width=30)
+        self.track_search_entry.pack(side=tk.LEFT, padx=5)
+        self.track_search_entry.bind("<Return>", lambda event: self.find_tracked_order())
+        tk.Button(search_frame, text="Find", command=self.find_tracked_order).pack(side=tk.LEFT)
+
+        # Shown only when a phone number or name matches more than one order.
+        self.track_matches = []
+        self.track_match_list = tk.Listbox(frame, height=5, width=70)
+        self.track_match_list.bind("<<ListboxSelect>>", self.select_tracked_order)
+
+        self.track_status_label = tk.Label(frame, bg="#FFE461")
+        self.track_status_label.pack(pady=5)
+        self.track_details_label = tk.Label(frame, bg="#FFE461", justify=tk.LEFT, wraplength=700)
+        self.track_details_label.pack(pady=5)
 
         self.tracking_canvas = tk.Canvas(frame, width=800, height=400)
         self.tracking_canvas.pack()
         self.tracking_canvas.create_image(0, 0, anchor=tk.NW, image=self.map_image)
+        store_x, store_y = MAP_STORE
+        self.tracking_canvas.create_oval(store_x - 10, store_y - 10, store_x + 10, store_y + 10, fill="green")
 
-        self.tracking_canvas.create_oval(340, 190, 360, 210, fill="red")  # Order location
-        self.tracking_canvas.create_oval(40, 40, 60, 60, fill="green")   # Starting point
-        self.tracking_canvas.create_line(50, 50, 350, 200, fill="blue", dash=(4, 2))
-
-        self.remaining_time_label = tk.Label(frame, text="Time Remaining: 10 min", font=("Cooper Black", 12), bg="#FFE461")
+        self.remaining_time_label = tk.Label(frame, font=("Cooper Black", 12), bg="#FFE461")
         self.remaining_time_label.pack(pady=10)
-        self.update_timer(600)
+        self.countdown_job = None
+        self.track_due = None
+        self.track_run = None
+        self.courier_items = {}
+        self.refresh_track_order_screen()
 
         tk.Button(frame, text="Message", command=self.send_message).pack(side=tk.LEFT, padx=10)
         tk.Button(frame, text="Change Address", command=self.change_address).pack(side=tk.RIGHT, padx=10)
 
         tk.Button(frame, text="Back to Home", command=self.create_home_screen).pack(pady=10)
 
-    def update_timer(self, remaining_time):
+    def refresh_track_order_screen(self):
+        self.track_match_list.pack_forget()
+        self.scheduler.cancel((self, "track_order"))
+        self.scheduler.every(COURIER_FRAME_MS, self.move_couriers, owner=(self, "track_order"))
+        if self.tracked_order is None:
+            self.track_status_label.config(text="Enter your order ID, phone number or name to find your order.")
+            self.track_details_label.config(text="")
+            self.remaining_time_label.config(text="")
+            self.tracking_canvas.delete("route")
+            return
+        self.show_tracked_order(self.tracked_order)
+
+    def find_tracked_order(self):
+        query = self.track_search_entry.get().strip()
+        if not query:
+            messagebox.showwarning("Track Order", "Please enter an order ID, phone number or name.")
+            return
+        order = self.store.find_order(query.upper())
+        if order is not None:
+            matches = [order]
+        elif store.phone_key(query) and not any(ch.isalpha() for ch in query):
+            matches = self.store.find_orders(phone=query)
+        else:
+            matches = self.store.find_orders(name=query)
+
+        self.track_match_list.pack_forget()
+        if not matches:
+            messagebox.showinfo("Track Order", f"No orders found for {query}.")
+        elif len(matches) == 1:
+            self.tracked_order = matches[0]
+            self.show_tracked_order(matches[0])
+        else:
+            self.track_matches = matches
+            self.track_match_list.delete(0, tk.END)
+            for order in matches:
+                placed = time.strftime("%b %d %I:%M %p", time.localtime(order["placed_at"]))
+                self.track_match_list.insert(tk.END, f"#{order['id']}  {placed}  {order['name']}  {order['address']}")
+            self.track_match_list.pack(after=self.track_status_label, pady=5)
+            self.track_status_label.config(text=f"{len(matches)} orders found; pick one.")
+
+    def select_tracked_order(self, event):
+        selection = self.track_match_list.curselection()
+        if selection:
+            self.tracked_order = self.track_matches[selection[0]]
+            self.track_match_list.pack_forget()
+            self.show_tracked_order(self.tracked_order)
+
+    def show_tracked_order(self, order):
+        items = ", ".join(f"{item.get('beverage_quantity', 1)} x {item['beverage']}" if "beverage" in item
+                          else f"{item.get('quantity', 1)} x {item.get('name') or 'Custom Pizza'} ({item.get('size')})"
+                          for item in order["items"])
+        self.track_details_label.config(text=f"Name: {order['name']}\nAddress: {order['address']}\nItems: {items}")
+        self.track_run = self.dispatcher.run_for(order["id"], time.time())
+        self.draw_route(self.track_run, order["id"])
+        self.track_due = self.due_time(order, self.track_run)
+        if self.countdown_job is not None:
+            self.countdown_job.cancel()
+        self.countdown_job = self.scheduler.every(1000, self.update_timer, owner=(self, "track_order"))
+
+    def due_time(self, order, run):
+        if run is not None:
+            return run.arrival_of(order["id"])
+        ready_at = self.kitchen.ready_at(order["id"])
+        if ready_at is not None:
+            return ready_at + DRIVE_MINUTES * 60
+        return order["placed_at"] + DELIVERY_MINUTES * 60
+
+    def map_point(self, point):
+        x, y = point
+        return MAP_STORE[0] + x * MAP_PIXELS_PER_KM, MAP_STORE[1] - y * MAP_PIXELS_PER_KM
+
+    def draw_route(self, run, order_id):
+        # The driver's whole run, store to store; this order is red and the others on the run orange.
+        canvas = self.tracking_canvas
+        canvas.delete("route")
+        if run is None:
+            # The address isn't in the table (or the order is from another till), so there is no route to show.
+            return
+        points = [MAP_STORE] + [self.map_point(stop.point) for stop in run.stops] + [MAP_STORE]
+        canvas.create_line(*[value for point in points for value in point], fill="blue", dash=(4, 2), tags="route")
+        for stop in run.stops:
+            x, y = self.map_point(stop.point)
+            color = "red" if stop.order_id == order_id else "orange"
+            canvas.create_oval(x - 8, y - 8, x + 8, y + 8, fill=color, tags="route")
+        canvas.tag_raise("courier")
+
+    def move_couriers(self, now):
+        # A marker is made when a run leaves and moved from then on; nothing else on the map is redrawn.
+        canvas = self.tracking_canvas
+        runs = self.dispatcher.on_road(now)
+        for run in [run for run in self.courier_items if run not in runs]:
+            canvas.delete(self.courier_items.pop(run))
+        for run in runs:
+            x, y = self.map_point(run.position_at(now))
+            box = (x - 6, y - 6, x + 6, y + 6)
+            item = self.courier_items.get(run)
+            if item is None:
+                self.courier_items[run] = canvas.create_rectangle(*box, fill="blue", outline="white", tags="courier")
+            else:
+                canvas.coords(item, *box)
+
+    def update_timer(self, now):
+        order = self.tracked_order
+        run = self.dispatcher.run_for(order["id"], now)
+        if run is not self.track_run:
+            # Runs are planned again as orders come in, which can change this one's stops.
+            self.track_run = run
+            self.draw_route(run, order["id"])
+            self.track_due = self.due_time(order, run)
+        # Counted from the clock each tick, so a late tick doesn't leave the countdown behind.
+        remaining_time = max(int(self.track_due - now), 0)
         if remaining_time > 0:
             mins, secs = divmod(remaining_time, 60)
             time_format = f"Time Remaining: {mins} min {secs} sec"
             self.remaining_time_label.config(text=time_format)
-            self.root.after(1000, self.update_timer, remaining_time - 1)
         else:
             self.remaining_time_label.config(text="Order Delivered!")
+            self.countdown_job.cancel()
+        stage = self.kitchen.stage(order["id"], now)
+        if remaining_time <= 0:
+            status = "Delivered"
+        elif run is not None and run.departs_at <= now:
+            status = f"Out for Delivery with driver {run.driver}"
+        elif stage is not None:
+            status = "Ready, waiting for a driver" if stage == "Ready" else stage
+        elif remaining_time > (DELIVERY_MINUTES - PREPARING_MINUTES) * 60:
+            status = "Preparing"
+        else:
+            status = "Out for Delivery"
+        self.track_status_label.config(text=f"Order #{order['id']} - Status: {status}")
 
     def send_message(self):
         message_window = tk.Toplevel(self.root)
@@ -425,13 +829,17 @@ class PizzaPalace:
     def change_address(self):
         change_address_window = tk.Toplevel(self.root)
         change_address_window.title("Change Address")
+        # Room for the list of completions under the entry.
+        change_address_window.minsize(420, 240)
 
         tk.Label(change_address_window, text="New Address:").pack(pady=5)
-        new_address_entry = tk.Entry(change_address_window, width=50)
+        new_address_entry = AutocompleteEntry(change_address_window, address_index.shared(self.root).complete, width=50)
         new_address_entry.pack(pady=5)
         tk.Button(change_address_window, text="Submit", command=lambda: self.submit_new_address(new_address_entry.get(), change_address_window)).pack(pady=10)
 
     def submit_new_address(self, new_address, window):
+        if new_address and not self.address_known(new_address, window):
+            return
         if new_address:
             messagebox.showinfo("Address Updated", f"Your address has been updated to: {new_address}")
             window.destroy()
@@ -439,8 +847,10 @@ class PizzaPalace:
             messagebox.showwarning("Invalid Address", "Please enter a valid address.")
 
     def create_contact_us_screen(self):
-        self.clear_screen()
-        canvas, frame = self.create_scrollable_canvas()
+        self.show_screen("contact_us", self.build_contact_us_screen)
+
+    def build_contact_us_screen(self, parent):
+        canvas, frame = self.create_scrollable_canvas(parent)
 
         tk.Label(frame, text="Contact Us", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
 
@@ -474,10 +884,15 @@ class PizzaPalace:
             return
 
         messagebox.showinfo("Feedback Submitted", "Thank you for your feedback!")
+        self.feedback_name_entry.delete(0, tk.END)
+        self.feedback_email_entry.delete(0, tk.END)
+        self.feedback_message_entry.delete("1.0", tk.END)
 
     def create_checkout_screen(self):
-        self.clear_screen()
-        canvas, frame = self.create_scrollable_canvas()
+        self.show_screen("checkout", self.build_checkout_screen)
+
+    def build_checkout_screen(self, parent):
+        canvas, frame = self.create_scrollable_canvas(parent)
 
         tk.Label(frame, text="Checkout", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
 
@@ -487,7 +902,8 @@ class PizzaPalace:
         self.checkout_name_entry.pack(fill=tk.X, padx=10, pady=5)
 
         tk.Label(frame, text="Address:", bg="#FFE461").pack(anchor=tk.W, padx=10)
-        self.checkout_address_entry = tk.Entry(frame)
+        # Completes from the delivery address table, so what is picked is somewhere the drivers can find.
+        self.checkout_address_entry = AutocompleteEntry(frame, address_index.shared(self.root).complete)
         self.checkout_address_entry.pack(fill=tk.X, padx=10, pady=5)
 
         tk.Label(frame, text="Phone:", bg="#FFE461").pack(anchor=tk.W, padx=10)
@@ -510,50 +926,82 @@ class PizzaPalace:
         tk.Button(frame, text="Place Order", command=self.place_order).pack(pady=10)
         tk.Button(frame, text="Back to Cart", command=self.create_cart_screen).pack(pady=5)
 
+    def clear_checkout_form(self):
+        for entry in (self.checkout_name_entry, self.checkout_address_entry, self.checkout_phone_entry,
+                      self.card_number_entry, self.card_expiry_entry, self.card_cvv_entry):
+            entry.delete(0, tk.END)
+
     def place_order(self):
-        name = self.checkout_name_entry.get()
-        address = self.checkout_address_entry.get()
-        phone = self.checkout_phone_entry.get()
-        card_number = self.card_number_entry.get()
-        card_expiry = self.card_expiry_entry.get()
-        card_cvv = self.card_cvv_entry.get()
-
-        if not name or not address or not phone or not card_number or not card_expiry or not card_cvv:
-            messagebox.showwarning("Incomplete Form", "Please fill out all fields.")
+        customer = {"name": self.checkout_name_entry.get(), "address": self.checkout_address_entry.get(),
+                    "phone": self.checkout_phone_entry.get(), "card_number": self.card_number_entry.get(),
+                    "card_expiry": self.card_expiry_entry.get(), "card_cvv": self.card_cvv_entry.get()}
+        try:
+            order = ordering.checkout(self.current_user, self.cart, customer)
+        except ordering.OrderError as e:
+            messagebox.showwarning("Incomplete Form", str(e))
             return
 
-        if self.current_user:
-            if 'order_history' not in self.users[self.current_user]:
-                self.users[self.current_user]['order_history'] = []
-            self.users[self.current_user]['order_history'].append(self.cart.copy())
-            self.save_users()
+        if not self.address_known(order["address"]):
+            return
 
-        messagebox.showinfo("Order Placed", "Thank you for your order! Your pizza will be delivered soon.")
+        # Guests' orders are kept too, so they can be tracked by id, phone or name.
+        self.store.record_order(self.current_user, order, on_saved=self.order_saved)
+        self.recommender.add_order(order["items"])
+        if self.recommender.unsaved >= recommend.SAVE_EVERY:
+            self.save_recommendations()
+        self.tracked_order = order
+        ready_at = self.kitchen.place(order["id"], order["items"], order["placed_at"])
+        # Addresses missing from the table still go out, just not as part of a planned run.
+        self.dispatcher.add(order["id"], order["address"], ready_at, ready_at + DRIVE_MINUTES * 60)
+        due = time.strftime("%I:%M %p", time.localtime(ready_at + DRIVE_MINUTES * 60)).lstrip("0")
+
+        messagebox.showinfo("Order Placed", f"Thank you for your order! Your order number is {order['id']}.\n"
+                                            f"It should be with you by about {due}.")
         self.cart = []
+        self.cart_version += 1
+        self.coupon_code = None
+        self.coupon_entry.delete(0, tk.END)
+        self.clear_checkout_form()
         self.create_home_screen()
 
+    def address_known(self, address, parent=None):
+        # Bad addresses hold deliveries up more than anything, so one the map doesn't know needs a second look.
+        if not self.dispatcher.addresses or self.dispatcher.locate(address) is not None:
+            return True
+        return messagebox.askyesno("Address Not Found", f"We couldn't find {address} on our delivery map.\n"
+                                   "Use it anyway?", parent=parent or self.root)
+
+    def order_saved(self, result):
+        if result is not True:
+            messagebox.showerror("Order Not Saved", "Your order was placed but could not be saved; it may not show in Track Order or your order history.")
+
     def create_login_screen(self):
-        self.clear_screen()
+        self.show_screen("login", self.build_login_screen, self.reset_login_screen)
 
-        tk.Label(self.root, text="Login", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
+    def build_login_screen(self, parent):
+        tk.Label(parent, text="Login", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
 
-        tk.Label(self.root, text="Username:", bg="#FFE461").pack(pady=5)
-        self.login_username_entry = tk.Entry(self.root)
+        tk.Label(parent, text="Username:", bg="#FFE461").pack(pady=5)
+        self.login_username_entry = tk.Entry(parent)
         self.login_username_entry.pack(pady=5)
 
-        tk.Label(self.root, text="Password:", bg="#FFE461").pack(pady=5)
-        self.login_password_entry = tk.Entry(self.root, show="*")
+        tk.Label(parent, text="Password:", bg="#FFE461").pack(pady=5)
+        self.login_password_entry = tk.Entry(parent, show="*")
         self.login_password_entry.pack(pady=5)
 
-        tk.Button(self.root, text="Login", command=self.login).pack(pady=10)
-        tk.Button(self.root, text="Register", command=self.create_register_screen).pack(pady=5)
-        tk.Button(self.root, text="Back to Home", command=self.create_home_screen).pack(pady=5)
+        tk.Button(parent, text="Login", command=self.login).pack(pady=10)
+        tk.Button(parent, text="Register", command=self.create_register_screen).pack(pady=5)
+        tk.Button(parent, text="Back to Home", command=self.create_home_screen).pack(pady=5)
+
+    def reset_login_screen(self):
+        self.login_username_entry.delete(0, tk.END)
+        self.login_password_entry.delete(0, tk.END)
 
     def login(self):
         username = self.login_username_entry.get()
         password = self.login_password_entry.get()
 
-        if username in self.users and self.users[username]["password"] == password:
+        if self.store.check_password(username, password):
             self.current_user = username
             messagebox.showinfo("Login Successful", f"Welcome, {username}!")
             self.create_home_screen()
@@ -561,83 +1009,146 @@ class PizzaPalace:
             messagebox.showerror("Login Failed", "Invalid username or password.")
 
     def create_register_screen(self):
-        self.clear_screen()
+        self.show_screen("register", self.build_register_screen, self.reset_register_screen)
 
-        tk.Label(self.root, text="Register", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
+    def build_register_screen(self, parent):
+        tk.Label(parent, text="Register", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
 
-        tk.Label(self.root, text="Username:", bg="#FFE461").pack(pady=5)
-        self.register_username_entry = tk.Entry(self.root)
+        tk.Label(parent, text="Username:", bg="#FFE461").pack(pady=5)
+        self.register_username_entry = tk.Entry(parent)
         self.register_username_entry.pack(pady=5)
 
-        tk.Label(self.root, text="Password:", bg="#FFE461").pack(pady=5)
-        self.register_password_entry = tk.Entry(self.root, show="*")
+        tk.Label(parent, text="Password:", bg="#FFE461").pack(pady=5)
+        self.register_password_entry = tk.Entry(parent, show="*")
         self.register_password_entry.pack(pady=5)
 
-        tk.Button(self.root, text="Register", command=self.register).pack(pady=10)
-        tk.Button(self.root, text="Back to Login", command=self.create_login_screen).pack(pady=5)
+        tk.Button(parent, text="Register", command=self.register).pack(pady=10)
+        tk.Button(parent, text="Back to Login", command=self.create_login_screen).pack(pady=5)
+
+    def reset_register_screen(self):
+        self.register_username_entry.delete(0, tk.END)
+        self.register_password_entry.delete(0, tk.END)
 
     def register(self):
         username = self.register_username_entry.get()
         password = self.register_password_entry.get()
 
-        if username in self.users:
+        if not self.store.add_user(username, password, on_saved=lambda result: self.registration_saved(username, result)):
             messagebox.showerror("Registration Failed", "Username already exists.")
         else:
-            self.users[username] = {"password": password, "order_history": []}
-            self.save_users()
             messagebox.showinfo("Registration Successful", "You can now log in.")
             self.create_login_screen()
 
+    def registration_saved(self, username, result):
+        if result is True:
+            return
+        # Another terminal took the name before this one's write landed.
+        if self.current_user == username:
+            self.current_user = None
+            self.create_home_screen()
+        messagebox.showerror("Registration Failed", f"The account {username} could not be saved. Please register again.")
+
     def create_order_history_screen(self):
         if not self.current_user:
             messagebox.showwarning("Login Required", "Please log in to view your order history.")
             self.create_login_screen()
             return
 
-        self.clear_screen()
-        canvas, frame = self.create_scrollable_canvas()
-
-        tk.Label(frame, text="Order History", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
-
-        if "order_history" not in self.users[self.current_user] or not self.users[self.current_user]["order_history"]:
-            tk.Label(frame, text="You have no order history.", bg="#FFE461").pack(pady=10)
+        self.show_screen("order_history", self.build_order_history_screen, self.refresh_order_history_screen)
+
+    def build_order_history_screen(self, parent):
+        tk.Label(parent, text="Order History", font=("Cooper Black", 16), bg="#FFE461").pack(pady=10)
+
+        tk.Button(parent, text="Back to Home", command=self.create_home_screen).pack(side=tk.BOTTOM, pady=10)
+
+        nav_frame = tk.Frame(parent, bg="#FFE461")
+        nav_frame.pack(side=tk.BOTTOM, pady=5)
+        self.history_newer_button = tk.Button(nav_frame, text="< Newer", command=lambda: self.show_history_page(self.history_page.newer))
+        self.history_newer_button.pack(side=tk.LEFT, padx=5)
+        self.history_page_label = tk.Label(nav_frame, bg="#FFE461")
+        self.history_page_label.pack(side=tk.LEFT, padx=5)
+        self.history_older_button = tk.Button(nav_frame, text="Older >", command=lambda: self.show_history_page(self.history_page.older))
+        self.history_older_button.pack(side=tk.LEFT, padx=5)
+
+        self.history_empty_label = tk.Label(parent, text="You have no order history.", bg="#FFE461")
+        self.history_title_height = tkfont.Font(font=("Cooper Black", 12)).metrics("linespace")
+        self.history_line_height = tkfont.nametofont("TkDefaultFont").metrics("linespace")
+        self.history_list = VirtualList(parent, self.create_history_row, self.update_history_row, height_of=self.history_row_height)
+        self.history_rendered_key = None
+        self.history_page = None
+        self.refresh_order_history_screen()
+
+    def history_row_height(self, index, entry):
+        number, order = entry
+        # Title with pady=5, one line per item, the solid border and the row's own padding.
+        return self.history_title_height + 10 + self.history_line_height * max(len(order), 1) + 4 + 10
+
+    def create_history_row(self, parent):
+        row = tk.Frame(parent, bg="#FFE461", pady=5)
+        order_frame = tk.Frame(row, bg="#FFE461", borderwidth=2, relief="solid")
+        order_frame.pack(fill=tk.BOTH, expand=True)
+        row.title_label = tk.Label(order_frame, font=("Cooper Black", 12), bg="#FFE461")
+        row.title_label.pack(pady=5)
+        row.items_label = tk.Label(order_frame, bg="#FFE461", justify=tk.LEFT, anchor=tk.W)
+        row.items_label.pack(anchor=tk.W)
+        return row
+
+    def update_history_row(self, row, index, entry):
+        number, order = entry
+        lines = []
+        for item in order:
+            item_type = item.get('type', 'unknown')
+            if item_type == 'pizza':
+                item_text = f"Pizza: Size - {item.get('size', 'Unknown')}, Crust - {item.get('crust', 'Unknown')}, Toppings - {', '.join(item.get('toppings', []))}, Specialty - {item.get('specialty', 'None')}, Quantity - {item.get('quantity', 1)}, Price - {pricing.format_price(pricing.item_cents(item))}"
+            elif item_type == 'beverage':
+                item_text = f"Beverage: {item.get('beverage', 'Unknown')} x {item.get('beverage_quantity', 1)}, Price - {pricing.format_price(pricing.item_cents(item))}"
+            else:
+                item_text = "Unknown item"
+            lines.append(item_text)
+        row.title_label.config(text=f"Order {number}")
+        row.items_label.config(text="\n".join(lines))
+
+    def refresh_order_history_screen(self):
+        key = (self.current_user, self.store.order_count(self.current_user))
+        if key == self.history_rendered_key:
+            return
+        self.history_rendered_key = key
+        self.show_history_page(None)
+
+    def show_history_page(self, before):
+        # One page of orders, newest first; only that page is read from the store.
+        page = self.store.order_page(self.current_user, before)
+        self.history_page = page
+
+        if not page.orders:
+            self.history_list.pack_forget()
+            self.history_empty_label.pack(pady=10)
+            self.history_page_label.config(text="")
         else:
-            for order_index, order in enumerate(self.users[self.current_user]["order_history"]):
-                print(f"Processing Order {order_index + 1}: {order}")  # Debug print statement
-                order_frame = tk.Frame(frame, bg="#FFE461", borderwidth=2, relief="solid")
-                order_frame.pack(fill=tk.X, pady=5)
-                tk.Label(order_frame, text=f"Order {order_index + 1}", font=("Cooper Black", 12), bg="#FFE461").pack(pady=5)
-                for item in order:
-                    print(f"Processing Item: {item}")  # Debug print statement
-                    item_type = item.get('type', 'unknown')
-                    if item_type == 'pizza':
-                        item_text = f"Pizza: Size - {item.get('size', 'Unknown')}, Crust - {item.get('crust', 'Unknown')}, Toppings - {', '.join(item.get('toppings', []))}, Specialty - {item.get('specialty', 'None')}, Quantity - {item.get('quantity', 1)}, Price - ${item.get('price', 0) * item.get('quantity', 1):.2f}"
-                    elif item_type == 'beverage':
-                        item_text = f"Beverage: {item.get('beverage', 'Unknown')} x {item.get('beverage_quantity', 1)}, Price - ${item.get('price', 0):.2f}"
-                    else:
-                        item_text = "Unknown item"
-                    tk.Label(order_frame, text=item_text, bg="#FFE461").pack(anchor=tk.W)
-
-        tk.Button(frame, text="Back to Home", command=self.create_home_screen).pack(pady=10)
-
-    def clear_screen(self):
-        for widget in self.root.winfo_children():
-            widget.destroy()
-
-    def create_scrollable_canvas(self):
-        canvas = tk.Canvas(self.root, bg="#FFE461")
-        scrollbar = tk.Scrollbar(self.root, orient="vertical", command=canvas.yview)
+            self.history_empty_label.pack_forget()
+            self.history_list.pack(fill=tk.BOTH, expand=True, padx=10)
+            self.history_page_label.config(text=f"Orders {page.orders[0][0]}-{page.orders[-1][0]} of {page.total}")
+        self.history_newer_button.config(state=tk.NORMAL if page.newer is not None else tk.DISABLED)
+        self.history_older_button.config(state=tk.NORMAL if page.older is not None else tk.DISABLED)
+        self.history_list.set_items(page.orders)
+        self.history_list.yview("moveto", 0)
+
+    def create_scrollable_canvas(self, parent):
+        canvas = tk.Canvas(parent, bg="#FFE461", yscrollincrement=20)
+        scrollbar = tk.Scrollbar(parent, orient="vertical", command=canvas.yview)
         scrollable_frame = tk.Frame(canvas, bg="#FFE461")
 
+        # The frame's own size is the scroll region; no need to walk every item with bbox("all").
         scrollable_frame.bind(
             "<Configure>",
             lambda e: canvas.configure(
-                scrollregion=canvas.bbox("all")
+                scrollregion=(0, 0, e.width, e.height)
             )
         )
 
         canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
         canvas.configure(yscrollcommand=scrollbar.set)
+        bind_mousewheel(parent, canvas)
 
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
@@ -645,7 +1156,33 @@ class PizzaPalace:
         return canvas, scrollable_frame
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pizza Palace Ordering System")
+    parser.add_argument("--startup-report", action="store_true", help="print where startup time went once the home screen is up")
+    parser.add_argument("--windows", type=int, default=1, metavar="N", help="number of kiosk windows to open in this process")
+    parser.add_argument("--store", default="users.json", metavar="PATH", help="user store to open: users.json, a users.d directory of shards or a .db SQLite file; "
+                        "busy shops should use .db or .d, as users.json is rewritten whole on every order (see store.py)")
+    parser.add_argument("--kitchen-display", action="store_true", help="also open the line cooks' live ticket display")
+    parser.add_argument("--startup-budget", type=float, metavar="MS", help="start, report time to first frame and exit non-zero if it exceeds MS")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = PizzaPalace(root)
+    app = PizzaPalace(root, args.store)
+    for _ in range(args.windows - 1):
+        PizzaPalace(tk.Toplevel(root), args.store, app.kitchen, lambda: app.dispatcher)
+    if args.kitchen_display:
+        kitchen_display.KitchenDisplay(tk.Toplevel(root), app.kitchen)
+
+    if args.startup_budget is not None:
+        root.update()
+        print(app.startup_report())
+        over = app.first_frame_ms is None or app.first_frame_ms > args.startup_budget
+        print(f"Startup budget {args.startup_budget:.0f} ms: {'FAILED' if over else 'ok'}")
+        assets.registry.close()
+        root.destroy()
+        sys.exit(1 if over else 0)
+
+    if args.startup_report:
+        root.after_idle(lambda: print(app.startup_report()))
     root.mainloop()
+    assets.registry.close()
 
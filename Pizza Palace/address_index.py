@@ -0,0 +1,222 @@
+"""
+Title: Pizza Palace Address Index
+File: address_index.py
+Author: Joshua Nobel
+
+Address completion for the checkout and Change Address forms, from the
+delivery address table (addresses.csv, see delivery.py), so that what the
+customer picks is an address the drivers can find.
+
+AddressIndex keeps every address sorted by its lookup form (lower case,
+"Street" as "st" and so on, see delivery.address_key). The keys are one
+long string with an array of where each starts, and likewise the
+addresses as they are shown, so a big gazetteer costs a few bytes an
+entry over its text rather than two Python strings each. A completion is
+a binary search for the first key starting with what was typed, then the
+next few keys. A half-typed last word that could be a suffix is looked up
+both as typed and as the suffix, so "12 Cou" finds 12 County Rd and
+12 Court St.
+
+Lookup answers completions on a worker thread, so the Tk thread never
+waits on a lookup (or on loading the file, which happens on the first
+one). A request the user has already typed past is skipped by the worker,
+and an answer for text that is no longer in the box is dropped; answers
+come back to the Tk thread through a queue, polled by a scheduler job that
+only runs while answers are due.
+
+Usage:
+    python address_index.py complete "22 elm"
+    python address_index.py bench --entries 300000
+"""
+
+import argparse
+import csv
+import queue
+import random
+import threading
+import time
+from array import array
+
+import delivery
+import scheduler
+
+COMPLETIONS = 8
+POLL_MS = 15
+BENCH_TOWNS = ["Evansville", "Newburgh", "Henderson", "Boonville", "Chandler", "Darmstadt", "Haubstadt", "Elberfeld"]
+
+
+def query_keys(text):
+    """(prefix, whole word) pairs to look text up by: text in lookup form, and as each suffix a half-typed
+    last word is on its way to ("stre" as a whole word "st")."""
+    key = delivery.address_key(text)
+    if not key:
+        return set()
+    keys = {(key, False)}
+    if not text[-1:].isspace():
+        start, _, last = key.rpartition(" ")
+        keys.update((start + (" " if start else "") + short, True)
+                    for word, short in delivery.SUFFIXES.items() if word.startswith(last) and last != short)
+    return keys
+
+
+class AddressIndex:
+    def __init__(self, addresses):
+        pairs = sorted({delivery.address_key(address): address.strip() for address in addresses}.items())
+        self.size = len(pairs)
+        self.keys = "".join(key for key, address in pairs)
+        self.shown = "".join(address for key, address in pairs)
+        self.key_starts = array("I", [0])
+        self.shown_starts = array("I", [0])
+        for key, address in pairs:
+            self.key_starts.append(self.key_starts[-1] + len(key))
+            self.shown_starts.append(self.shown_starts[-1] + len(address))
+
+    def key(self, n):
+        return self.keys[self.key_starts[n]:self.key_starts[n + 1]]
+
+    def address(self, n):
+        return self.shown[self.shown_starts[n]:self.shown_starts[n + 1]]
+
+    def complete(self, text, limit=COMPLETIONS):
+        """Up to limit addresses starting with text, in order."""
+        # "12 Cou" may be the start of "County" as well as of "Court" (ct), so look for both.
+        found = sorted(set().union(*(self._starting(prefix, limit, word) for prefix, word in query_keys(text))))
+        return [self.address(n) for n in found[:limit]]
+
+    def _first(self, prefix):
+        # bisect_left by hand, as the keys are slices of one string rather than a list.
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _starting(self, prefix, limit, word=False):
+        """The numbers of the first limit keys starting with prefix, or with prefix as a whole word if word."""
+        found = []
+        if word:
+            low = self._first(prefix)
+            if low < self.size and self.key(low) == prefix:
+                found.append(low)
+            prefix += " "
+        low = self._first(prefix)
+        while low < self.size and len(found) < limit and self.key(low).startswith(prefix):
+            found.append(low)
+            low += 1
+        return found
+
+
+def load_index(path=delivery.ADDRESSES_FILE):
+    with open(path, newline="") as f:
+        return AddressIndex(row["address"] for row in csv.DictReader(f))
+
+
+class Lookup:
+    def __init__(self, root, load=load_index):
+        self.root = root
+        self.load = load
+        self.requests = queue.Queue()
+        self.answers = queue.Queue()
+        # What each requester (its show callback) asked for last.
+        self.latest = {}
+        self.outstanding = 0
+        self.thread = None
+        self.poll_job = None
+
+    def complete(self, text, show):
+        """Look text up off the Tk thread and call show(text, matches) on it, unless text has been typed past."""
+        self.latest[show] = text
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._work, daemon=True)
+            self.thread.start()
+        self.outstanding += 1
+        self.requests.put((text, show))
+        if self.poll_job is None:
+            self.poll_job = scheduler.shared(self.root).every(POLL_MS, self._poll, owner=self, delay_ms=POLL_MS)
+
+    def _work(self):
+        index = None
+        while True:
+            text, show = self.requests.get()
+            if self.latest.get(show) != text:
+                self.answers.put((text, show, None))
+                continue
+            if index is None:
+                try:
+                    index = self.load()
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Error loading the address index: {e}")
+                    index = AddressIndex([])
+            self.answers.put((text, show, index.complete(text)))
+
+    def _poll(self, now):
+        while True:
+            try:
+                text, show, matches = self.answers.get_nowait()
+            except queue.Empty:
+                break
+            self.outstanding -= 1
+            if matches is not None and self.latest.get(show) == text:
+                del self.latest[show]
+                show(text, matches)
+        if not self.outstanding:
+            self.poll_job.cancel()
+            self.poll_job = None
+
+
+def shared(widget):
+    """The address lookup for widget's Tk interpreter, so every window in the process shares one index."""
+    root = widget.nametowidget(".")
+    found = getattr(root, "pizza_address_lookup", None)
+    if found is None:
+        found = root.pizza_address_lookup = Lookup(root)
+    return found
+
+
+def _bench(entries, seed=1):
+    import tracemalloc
+    # The made-up town's streets in each of several towns.
+    addresses = [f"{address}, {town}" for town in BENCH_TOWNS for address, x, y in delivery.grid_addresses()][:entries]
+    started = time.perf_counter()
+    index = AddressIndex(addresses)
+    built = time.perf_counter() - started
+    # Measured on a second build, as tracing every allocation slows the first down several times over.
+    tracemalloc.start()
+    measured = AddressIndex(addresses)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del measured
+
+    # Type 2,000 addresses a letter at a time.
+    rng = random.Random(seed)
+    timings = []
+    for address in rng.sample(addresses, 2000):
+        for end in range(1, len(address) + 1):
+            started = time.perf_counter()
+            index.complete(address[:end])
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"Indexed {index.size} addresses in {built:.1f} s, {size / 1e6:.0f} MB "
+          f"({len(index.keys) + len(index.shown)} characters of text)")
+    print(f"{len(timings)} keystrokes: {timings[len(timings) // 2] * 1e6:.0f} us median, "
+          f"{timings[int(len(timings) * 0.99)] * 1e6:.0f} us p99, {timings[-1] * 1e6:.0f} us worst")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pizza Palace address completion")
+    commands = parser.add_subparsers(dest="command", required=True)
+    complete = commands.add_parser("complete", help="complete an address from the table")
+    complete.add_argument("text")
+    complete.add_argument("--addresses", default=delivery.ADDRESSES_FILE)
+    bench = commands.add_parser("bench", help="time completions over a made-up gazetteer")
+    bench.add_argument("--entries", type=int, default=300000)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        _bench(args.entries)
+    else:
+        for address in load_index(args.addresses).complete(args.text):
+            print(address)
@@ -0,0 +1,205 @@
+"""
+Title: Pizza Palace Asset Cache
+File: assets.py
+Author: Joshua Nobel
+
+Keeps resized copies of the GUI images in a thumbnail cache on disk so the
+full-size PNGs only have to be opened and resampled once. Cache entries are
+keyed by the source path, its modification time and size, and the target
+dimensions, so editing or replacing an asset rebuilds its thumbnail on the
+next start.
+
+Missing thumbnails are built by AssetLoader on a pool of worker processes.
+Screens get a lightweight placeholder straight away, and the real image is
+read into that same PhotoImage on the Tk thread once its worker finishes.
+
+The module-level registry hands the same PhotoImage objects to every window
+in the process and reference counts them, so opening another kiosk window
+neither decodes nor stores the images a second time.
+"""
+
+import hashlib
+import os
+import queue
+import tkinter as tk
+from concurrent.futures import ProcessPoolExecutor
+
+CACHE_DIR = ".thumbnails"
+
+
+def thumbnail_path(source, size=None, cache_dir=CACHE_DIR):
+    stat = os.stat(source)
+    dims = f"{size[0]}x{size[1]}" if size else "full"
+    prefix = hashlib.sha1(f"{os.path.abspath(source)}|{dims}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{prefix}-{dims}-{stat.st_mtime_ns:x}-{stat.st_size:x}.png")
+
+
+def build_thumbnail(source, size=None, cache_dir=CACHE_DIR):
+    """Resize source into the cache (if it isn't there already) and return the cached path."""
+    path = thumbnail_path(source, size, cache_dir)
+    if os.path.exists(path):
+        return path
+
+    from PIL import Image
+
+    os.makedirs(cache_dir, exist_ok=True)
+    image = Image.open(source)
+    if size:
+        image = image.resize(size, Image.Resampling.LANCZOS)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    image.save(tmp_path, format="PNG")
+    os.replace(tmp_path, path)
+    prune_stale(path)
+    return path
+
+
+def prune_stale(path):
+    """Remove older thumbnails of the same source and size as path."""
+    cache_dir, name = os.path.split(path)
+    prefix = name.split("-", 1)[0] + "-"
+    for other in os.listdir(cache_dir):
+        if other.startswith(prefix) and other.endswith(".png") and other != name:
+            try:
+                os.remove(os.path.join(cache_dir, other))
+            except OSError:
+                pass
+
+
+def discard(path):
+    """Remove a cached thumbnail Tk could not read, e.g. one cut short, so it is built again."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def load_thumbnail(source, size=None, cache_dir=CACHE_DIR):
+    """Return a tk.PhotoImage of source at size, reading the cached copy when it is current."""
+    path = build_thumbnail(source, size, cache_dir)
+    try:
+        return tk.PhotoImage(file=path)
+    except tk.TclError:
+        discard(path)
+        return tk.PhotoImage(file=build_thumbnail(source, size, cache_dir))
+
+
+class AssetLoader:
+    def __init__(self, root, cache_dir=CACHE_DIR, workers=None, poll_ms=25):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.poll_ms = poll_ms
+        self._pool = None
+        self._done = queue.Queue()
+        self._pending = 0
+        self._poll_id = None
+
+    def load(self, source, size, placeholder_color="#F5D547"):
+        """Return a PhotoImage for source at size.
+
+        A cached thumbnail is read immediately. Otherwise a placeholder of the
+        right size is returned and filled in via root.after when it is ready,
+        so labels already showing the placeholder pick up the real image.
+        """
+        image = tk.PhotoImage(width=size[0], height=size[1])
+        try:
+            path = thumbnail_path(source, size, self.cache_dir)
+        except OSError as e:
+            print(f"Error loading image {source}: {e}")
+            return image
+
+        if os.path.exists(path):
+            try:
+                image.configure(file=path)
+                return image
+            except tk.TclError:
+                discard(path)
+
+        image.put(placeholder_color, to=(0, 0, size[0], size[1]))
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        future = self._pool.submit(build_thumbnail, source, size, self.cache_dir)
+        future.add_done_callback(lambda f, image=image, source=source: self._done.put((image, source, f)))
+        self._pending += 1
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
+        return image
+
+    def _poll(self):
+        self._poll_id = None
+        while True:
+            try:
+                image, source, future = self._done.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            try:
+                path = future.result()
+                image.configure(file=path)
+            except tk.TclError as e:
+                # The placeholder stays; the next start builds the thumbnail again.
+                print(f"Error loading image {source}: {e}")
+                discard(path)
+            except Exception as e:
+                print(f"Error loading image {source}: {e}")
+        if self._pending:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
+
+    def close(self):
+        if self._poll_id is not None:
+            try:
+                self.root.after_cancel(self._poll_id)
+            except tk.TclError:
+                pass
+            self._poll_id = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class AssetRegistry:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.loader = None
+        self._images = {}
+        self._refs = {}
+
+    def acquire(self, widget, source, size=None):
+        """Return the shared PhotoImage for (source, size) and take a reference to it."""
+        key = (source, size)
+        if key not in self._images:
+            if self.loader is None:
+                # Poll from the main Tk window, which outlives any Toplevel kiosk window.
+                self.loader = AssetLoader(widget.nametowidget("."), self.cache_dir)
+            if size is None:
+                self._images[key] = load_thumbnail(source, None, self.cache_dir)
+            else:
+                self._images[key] = self.loader.load(source, size)
+            self._refs[key] = 0
+        self._refs[key] += 1
+        return self._images[key]
+
+    def release(self, source, size=None):
+        key = (source, size)
+        if key not in self._refs:
+            return
+        self._refs[key] -= 1
+        if self._refs[key] <= 0:
+            del self._refs[key]
+            del self._images[key]
+
+    def loaded_count(self):
+        return len(self._images)
+
+    def close(self):
+        if self.loader is not None:
+            self.loader.close()
+            self.loader = None
+        self._images.clear()
+        self._refs.clear()
+
+
+registry = AssetRegistry()
@@ -0,0 +1,282 @@
+"""
+Title: Pizza Palace Bulk Order Import
+File: bulk_import.py
+Author: Joshua Nobel
+
+Loads catering and phone-order batches straight into the order store, so
+nobody has to key them in through the GUI. Input is read a row at a time
+and written a batch at a time, so memory stays flat however big the file.
+
+CSV has one line item per row; consecutive rows with the same "order"
+value make one order:
+
+    order,customer,phone,address,username,item,size,crust,toppings,quantity
+    C-101,Ann Lee,812-555-0101,1 Elm St,,Hawaiian,Large,Thin,,2
+    C-101,Ann Lee,812-555-0101,1 Elm St,,,Medium,Regular,Ham;Pineapple,1
+    C-101,Ann Lee,812-555-0101,1 Elm St,,Sprite,,,,6
+
+"item" is a specialty, a beverage, or blank (or "Custom") for build your
+own; toppings are separated by ";". JSON lines have one order per line:
+
+    {"order": "C-101", "customer": "Ann Lee", "phone": "...", "address": "...",
+     "username": null, "items": [{"specialty": "Hawaiian", "size": "Large", ...}]}
+
+with items as the order API takes them (see ordering.cart_item).
+
+Every item is checked against the catalog and priced by ordering.py, the
+same as the GUI. An order with any bad row is left out whole; each bad row
+is reported with its line number and the reason.
+
+Usage:
+    python bulk_import.py orders.csv --store users.db --rejects rejects.csv --ids ids.csv
+    python bulk_import.py orders.jsonl --check                validate and price only
+    python bulk_import.py --sample orders.csv --rows 100000   write a file to try it on
+"""
+
+import argparse
+import csv
+import json
+import random
+import sys
+import time
+
+import catalog
+import ordering
+import pricing
+import store
+
+BATCH_SIZE = 2000
+CSV_FIELDS = ["order", "customer", "phone", "address", "username", "item", "size", "crust", "toppings", "quantity"]
+
+
+class Rejected(Exception):
+    def __init__(self, line, order, reason):
+        super().__init__(reason)
+        self.line = line
+        self.order = order
+
+
+def csv_orders(f):
+    """(first line, order ref, rows) for each run of rows with the same order, as (line, row) pairs."""
+    reader = csv.DictReader(f)
+    missing = [field for field in ("order", "item") if field not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"The CSV has no {', '.join(missing)} column")
+    current, rows = None, []
+    for row in reader:
+        # DictReader counts the header, so this is the row's line in the file.
+        line = reader.line_num
+        ref = (row.get("order") or "").strip()
+        if rows and ref != current:
+            yield rows[0][0], current, rows
+            rows = []
+        current = ref
+        rows.append((line, row))
+    if rows:
+        yield rows[0][0], current, rows
+
+
+def csv_item(row):
+    name = (row.get("item") or "").strip()
+    quantity = (row.get("quantity") or "1").strip()
+    if not quantity.isdigit():
+        raise ordering.OrderError(f"Quantity {quantity!r} is not a whole number.")
+    spec = {"quantity": int(quantity)}
+    if name in catalog.BEVERAGES:
+        spec.update(type="beverage", beverage=name)
+    else:
+        spec.update(type="pizza", size=(row.get("size") or "").strip(), crust=(row.get("crust") or "").strip())
+        if name and name.lower() != "custom":
+            spec["specialty"] = name
+        toppings = (row.get("toppings") or "").strip()
+        spec["toppings"] = [topping.strip() for topping in toppings.split(";") if topping.strip()]
+        if spec.get("specialty") and spec["toppings"]:
+            raise ordering.OrderError(f"{name} comes as it is; toppings are for build-your-own pizzas.")
+    return ordering.cart_item(spec)
+
+
+def parse_csv(f):
+    """(line, ref, customer, username, items) per order, or a Rejected for each bad row."""
+    for line, ref, rows in csv_orders(f):
+        first = rows[0][1]
+        customer = {field: (first.get(field) or "").strip() for field in ("customer", "phone", "address")}
+        username = (first.get("username") or "").strip() or None
+        items, errors = [], []
+        for row_line, row in rows:
+            try:
+                if any((row.get(field) or "").strip() != customer[field] for field in customer):
+                    raise ordering.OrderError(f"Customer details differ from line {line} of the same order.")
+                items.append(csv_item(row))
+            except ordering.OrderError as e:
+                errors.append(Rejected(row_line, ref, str(e)))
+        yield (line, ref, customer, username, items) if not errors else errors
+
+
+def parse_jsonl(f):
+    for line, text in enumerate(f, 1):
+        if not text.strip():
+            continue
+        ref = None
+        try:
+            record = json.loads(text)
+            if not isinstance(record, dict) or not isinstance(record.get("items"), list):
+                raise ordering.OrderError("Each line must be an object with an items list.")
+            ref = str(record.get("order") or "")
+            customer = {field: str(record.get(field) or "").strip() for field in ("customer", "phone", "address")}
+            items = [ordering.cart_item(spec) for spec in record["items"]]
+        except ValueError as e:
+            # OrderError is a ValueError, and so is bad JSON.
+            yield [Rejected(line, ref, str(e))]
+            continue
+        yield line, ref, customer, record.get("username") or None, items
+
+
+class Importer:
+    def __init__(self, target, check_only=False):
+        self.store = target
+        self.check_only = check_only
+        self.batch = []
+        self.known_users = {}
+        self.imported = 0
+        self.total_cents = 0
+        self.rejected = []
+        self.rejected_count = 0
+        self.examples = []
+        self.ids = []
+
+    def user_exists(self, username):
+        found = self.known_users.get(username)
+        if found is None:
+            if len(self.known_users) > 10000:
+                self.known_users.clear()
+            found = self.known_users[username] = self.store.user_exists(username)
+        return found
+
+    def add(self, line, ref, customer, username, items):
+        if not items:
+            raise Rejected(line, ref, "The order has no items.")
+        missing = [field for field, value in customer.items() if not value]
+        if missing:
+            raise Rejected(line, ref, f"Missing {', '.join(missing)}.")
+        if username is not None and not self.check_only and not self.user_exists(username):
+            raise Rejected(line, ref, f"No account named {username!r}.")
+        order = store.new_order(username, items, customer["customer"], customer["phone"], customer["address"])
+        self.batch.append((line, ref, order, pricing.quote_cart(items).total))
+        if len(self.batch) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        results = [True] * len(self.batch)
+        if not self.check_only:
+            results = self.store.apply([("record_order", order["username"], order) for line, ref, order, total in self.batch])
+        for (line, ref, order, total), result in zip(self.batch, results):
+            if result is True:
+                self.imported += 1
+                self.total_cents += total
+                self.ids.append((ref, order["id"]))
+            else:
+                self.rejected.append(Rejected(line, ref, f"Not saved: {result}"))
+        self.batch = []
+
+    def run(self, orders, rejects_writer=None, ids_writer=None):
+        """Import every order; rejected rows go to rejects_writer and (ref, id) pairs to ids_writer as they happen."""
+        for parsed in orders:
+            if isinstance(parsed, list):
+                self.rejected.extend(parsed)
+            else:
+                try:
+                    self.add(*parsed)
+                except Rejected as e:
+                    self.rejected.append(e)
+            # Only keep what the summary needs; everything else is written out as it goes.
+            self._drain(rejects_writer, ids_writer)
+        self.flush()
+        self._drain(rejects_writer, ids_writer)
+
+    def _drain(self, rejects_writer, ids_writer):
+        if ids_writer is not None:
+            ids_writer.writerows(self.ids)
+        self.ids = []
+        if rejects_writer is not None:
+            rejects_writer.writerows([(e.line, e.order, str(e)) for e in self.rejected])
+        self.rejected_count += len(self.rejected)
+        self.examples = (self.examples + self.rejected)[:10]
+        self.rejected = []
+
+
+def write_sample(path, rows, seed=1):
+    """A catering-style CSV of about rows line items, with the odd mistake in it."""
+    rng = random.Random(seed)
+    specialties = [item["name"] for item in catalog.SPECIALTIES]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        written, n = 0, 0
+        while written < rows:
+            n += 1
+            customer = [f"C-{n}", f"Customer {n % 5000}", f"812-555-{n % 10000:04d}", f"{n} Catering Way", ""]
+            for _ in range(min(rng.randint(1, 6), rows - written)):
+                kind = rng.random()
+                if kind < 0.4:
+                    item = [rng.choice(specialties), rng.choice(catalog.SIZES), rng.choice(catalog.CRUSTS), ""]
+                elif kind < 0.7:
+                    toppings = ";".join(rng.sample(catalog.TOPPINGS, rng.randint(0, 4)))
+                    item = ["", rng.choice(catalog.SIZES), rng.choice(catalog.CRUSTS), toppings]
+                else:
+                    item = [rng.choice(catalog.BEVERAGES), "", "", ""]
+                if rng.random() < 0.002:
+                    item[1] = "Jumbo"
+                writer.writerow(customer + item + [rng.randint(1, 10)])
+                written += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import catering and phone-order batches into the order store")
+    parser.add_argument("source", help=".csv, or .jsonl / .json lines; '-' reads CSV from stdin")
+    parser.add_argument("--store", default="users.json", help="the GUI's store: .json, .d directory or .db")
+    parser.add_argument("--rejects", help="write rejected rows here as CSV (line, order, reason)")
+    parser.add_argument("--ids", help="write each imported order's reference and new order id here as CSV")
+    parser.add_argument("--check", action="store_true", help="validate and price only; write nothing")
+    parser.add_argument("--sample", action="store_true", help="write a sample CSV to source instead of importing")
+    parser.add_argument("--rows", type=int, default=100000, help="rows for --sample")
+    args = parser.parse_args()
+
+    if args.sample:
+        write_sample(args.source, args.rows)
+        print(f"Wrote {args.rows} rows to {args.source}")
+        sys.exit(0)
+
+    is_jsonl = args.source.endswith((".jsonl", ".json", ".ndjson"))
+    source = sys.stdin if args.source == "-" else open(args.source, "r", newline="" if not is_jsonl else None, encoding="utf-8-sig")
+    target = None if args.check else store.open_store(args.store)
+    importer = Importer(target, check_only=args.check)
+    rejects_file = open(args.rejects, "w", newline="") if args.rejects else None
+    ids_file = open(args.ids, "w", newline="") if args.ids else None
+    started = time.perf_counter()
+    try:
+        rejects_writer = csv.writer(rejects_file) if rejects_file else None
+        if rejects_writer:
+            rejects_writer.writerow(["line", "order", "reason"])
+        ids_writer = csv.writer(ids_file) if ids_file else None
+        if ids_writer:
+            ids_writer.writerow(["order", "id"])
+        importer.run(parse_jsonl(source) if is_jsonl else parse_csv(source), rejects_writer, ids_writer)
+    except ValueError as e:
+        print(f"Error reading {args.source}: {e}")
+        sys.exit(2)
+    finally:
+        for f in (source, rejects_file, ids_file):
+            if f is not None and f is not sys.stdin:
+                f.close()
+        if target is not None:
+            target.close()
+
+    elapsed = time.perf_counter() - started
+    verb = "Checked" if args.check else "Imported"
+    print(f"{verb} {importer.imported} orders worth {pricing.format_price(importer.total_cents)} "
+          f"in {elapsed:.1f} s; {importer.rejected_count} rows rejected")
+    for e in importer.examples:
+        print(f"  line {e.line}{f' (order {e.order})' if e.order else ''}: {e}")
+    sys.exit(1 if importer.rejected_count else 0)
@@ -0,0 +1,44 @@
+"""
+Title: Pizza Palace Catalog
+File: catalog.py
+Author: Joshua Nobel
+
+Everything Pizza Palace sells, in one place. Prices are in integer cents;
+pricing.py turns them into lookup tables.
+"""
+
+SIZES = ["Small", "Medium", "Large"]
+CRUSTS = ["Thin", "Regular", "Stuffed"]
+
+TOPPINGS = ["Pepperoni", "Mushrooms", "Onions", "Sausage", "Bacon", "Extra Cheese", "Black Olives", "Green Peppers", "Pineapple", "Spinach", "Ham"]
+
+COKE_FLAVORS = ["Diet Coke", "Coca-cola", "Dr. Pepper", "Sunkist", "Squirt", "Sprite"]
+JARRITOS_FLAVORS = ["Tamarind", "Strawberry", "Mandarin", "Grapefruit", "Fruit Punch"]
+BEVERAGES = COKE_FLAVORS + JARRITOS_FLAVORS
+
+SPECIALTIES = [
+    {"name": "BBQ Chicken", "description": "BBQ sauce, chicken, and mozzarella", "price_cents": 1699, "image": "BBQ Chicken"},
+    {"name": "Charcoal", "description": "Charcoal crust, smoky flavor", "price_cents": 2799, "image": "Charcoal"},
+    {"name": "Cheesey", "description": "Extra cheese and mozzarella", "price_cents": 1499, "image": "Cheesey"},
+    {"name": "Flaming Pork", "description": "Spicy pork and hot sauce", "price_cents": 1799, "image": "Flaming Pork"},
+    {"name": "Hawaiian", "description": "Ham, pineapple, and mozzarella", "price_cents": 1599, "image": "Hawaiian"},
+    {"name": "Margherita", "description": "Classic pizza with tomato sauce and mozzarella", "price_cents": 1599, "image": "Margherita"},
+    {"name": "Meat Lovers", "description": "Pepperoni, sausage, bacon, and ham", "price_cents": 1699, "image": "Meat Lovers"},
+    {"name": "Pepperoni", "description": "Pepperoni, tomato sauce, and mozzarella", "price_cents": 1599, "image": "Pepperoni"},
+    {"name": "Seafood", "description": "Shrimp, calamari, and mozzarella", "price_cents": 1999, "image": "Seafood"},
+    {"name": "Supreme", "description": "Pepperoni, sausage, green peppers, onions, and mushrooms", "price_cents": 1799, "image": "Supreme"}
+]
+
+# Build-your-own pizzas start from a base price by size.
+CUSTOM_BASE_CENTS = {"Small": 1099, "Medium": 1299, "Large": 1499}
+TOPPING_CENTS = 150
+
+# Specialty prices are for a Large; smaller sizes come off that.
+SPECIALTY_SIZE_CENTS = {"Small": -400, "Medium": -200, "Large": 0}
+
+CRUST_CENTS = {"Thin": 0, "Regular": 0, "Stuffed": 200}
+
+COKE_CENTS = 100
+JARRITOS_CENTS = 175
+
+TAX_BASIS_POINTS = 700
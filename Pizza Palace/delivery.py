@@ -0,0 +1,405 @@
+"""
+Title: Pizza Palace Delivery Runs
+File: delivery.py
+Author: Joshua Nobel
+
+Groups ready orders into multi-stop runs for the drivers, so one driver
+takes three orders on the same side of town instead of three drivers
+taking one each.
+
+Addresses are looked up in a local table (addresses.csv: address, then x
+and y in km east and north of the store), so nothing leaves the shop.
+Driving time is the grid distance between two points at DRIVE_KMH, plus
+STOP_MINUTES at each door; every time the planner needs comes from one
+matrix worked out at the start of a plan.
+
+A plan is built in three steps:
+
+    batch     take the order due soonest and keep adding the order that
+              costs the least extra driving, from among each stop's nearest
+              neighbours, while the run has room (MAX_STOPS) and no order
+              in it is late that wouldn't have been late going alone
+    improve   put each run's stops in their best order, then move single
+              stops to other runs wherever that saves driving, until
+              nothing moves
+    assign    give runs, earliest first, to whichever driver is back first
+
+Times are seconds, like kitchen.py.
+
+Usage:
+    python delivery.py bench --orders 500 --drivers 20 --hours 4
+    python delivery.py addresses --out addresses.csv --count 2000      write a table for a made-up town
+"""
+
+import argparse
+import csv
+import heapq
+import itertools
+import math
+import random
+import re
+import time
+
+ADDRESSES_FILE = "addresses.csv"
+DRIVERS = 4
+MAX_STOPS = 4
+DRIVE_KMH = 30
+STOP_MINUTES = 2
+# How many of a stop's nearest neighbours (in place and time) are tried when batching and moving it.
+NEIGHBOURS = 12
+
+SUFFIXES = {"street": "st", "avenue": "ave", "road": "rd", "drive": "dr", "lane": "ln", "boulevard": "blvd",
+            "court": "ct", "place": "pl", "north": "n", "south": "s", "east": "e", "west": "w"}
+STREETS = ["Elm", "Oak", "Maple", "Pine", "Cedar", "Walnut", "Cherry", "Willow", "Birch", "Ash", "Hickory", "Spruce",
+           "Poplar", "Chestnut", "Sycamore", "Magnolia", "Dogwood", "Juniper", "Laurel", "Linden", "Locust",
+           "Mulberry", "Hawthorn", "Alder", "Aspen", "Beech", "Cypress", "Hemlock", "Holly", "Redbud", "Sassafras",
+           "Tulip", "Catalpa", "Buckeye", "Pecan", "Persimmon", "Sumac", "Elder", "Basswood", "Larch"]
+AVENUES = 30
+BLOCK_KM = 0.2
+
+
+def address_key(address):
+    """The form addresses are looked up by: lower case, no punctuation, "Street" as "st" and so on."""
+    words = re.sub(r"[^a-z0-9 ]", " ", address.lower()).split()
+    return " ".join(SUFFIXES.get(word, word) for word in words)
+
+
+def load_addresses(path=ADDRESSES_FILE):
+    """{address_key: (x, y)} from the table at path."""
+    with open(path, newline="") as f:
+        return {address_key(row["address"]): (float(row["x"]), float(row["y"])) for row in csv.DictReader(f)}
+
+
+def grid_addresses():
+    """Every address in the made-up town: numbered streets run north-south, avenues east-west."""
+    width, height = len(STREETS) * BLOCK_KM, AVENUES * BLOCK_KM
+    for n, name in enumerate(STREETS):
+        x = (n + 0.5) * BLOCK_KM - width / 2
+        for number in range(2, AVENUES * 100, 2):
+            yield f"{number} {name} St", x, number / 100 * BLOCK_KM - height / 2
+    for n in range(AVENUES):
+        suffix = "th" if 10 <= (n + 1) % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get((n + 1) % 10, "th")
+        y = (n + 0.5) * BLOCK_KM - height / 2
+        for number in range(2, len(STREETS) * 100, 2):
+            yield f"{number} {n + 1}{suffix} Ave", number / 100 * BLOCK_KM - width / 2, y
+
+
+def write_addresses(path, count, seed=1):
+    rng = random.Random(seed)
+    everything = list(grid_addresses())
+    chosen = sorted(rng.sample(range(len(everything)), min(count, len(everything))))
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["address", "x", "y"])
+        for n in chosen:
+            address, x, y = everything[n]
+            writer.writerow([address, f"{x:.3f}", f"{y:.3f}"])
+
+
+class Stop:
+    __slots__ = ("order_id", "point", "ready_at", "due_at")
+
+    def __init__(self, order_id, point, ready_at, due_at):
+        self.order_id = order_id
+        self.point = point
+        self.ready_at = ready_at
+        self.due_at = due_at
+
+
+class Run:
+    __slots__ = ("driver", "departs_at", "stops", "arrivals", "back_at")
+
+    def __init__(self, driver, departs_at, stops, arrivals, back_at):
+        self.driver = driver
+        self.departs_at = departs_at
+        self.stops = stops
+        self.arrivals = arrivals
+        self.back_at = back_at
+
+    def arrival_of(self, order_id):
+        for stop, arrival in zip(self.stops, self.arrivals):
+            if stop.order_id == order_id:
+                return arrival
+        return None
+
+    def position_at(self, at):
+        """Where the driver is at time at, in km from the store, driving each leg east-west first."""
+        per_km = 3600 / DRIVE_KMH
+        here, clock = (0.0, 0.0), self.departs_at
+        for there in [stop.point for stop in self.stops] + [(0.0, 0.0)]:
+            across, up = there[0] - here[0], there[1] - here[1]
+            drive = (abs(across) + abs(up)) * per_km
+            if at < clock + drive:
+                km = max(at - clock, 0) / per_km
+                if km <= abs(across):
+                    return here[0] + math.copysign(km, across), here[1]
+                return there[0], here[1] + math.copysign(km - abs(across), up)
+            clock += drive + STOP_MINUTES * 60
+            # Handing the order over.
+            if at < clock:
+                return there
+            here = there
+        return 0.0, 0.0
+
+
+def travel_matrix(points):
+    """Seconds from each point to each other, driving the grid, as one flat list."""
+    per_km = 3600 / DRIVE_KMH
+    return [(abs(ax - bx) + abs(ay - by)) * per_km for ax, ay in points for bx, by in points]
+
+
+class Planner:
+    """One plan over stops (store is point 0 of the matrix, stop n is point n + 1)."""
+
+    def __init__(self, stops, now):
+        self.stops = stops
+        self.now = now
+        self.size = len(stops) + 1
+        self.matrix = travel_matrix([(0.0, 0.0)] + [stop.point for stop in stops])
+        self.ready = [0.0] + [max(stop.ready_at, now) for stop in stops]
+        # The latest each stop may arrive: its due time, or if it can't make that even alone, its time alone.
+        stop_seconds = STOP_MINUTES * 60
+        self.limit = [0.0] + [max(stop.due_at, self.ready[n] + self.matrix[n] + stop_seconds)
+                              for n, stop in enumerate(stops, 1)]
+        # Near in both place and time: the drive between two stops plus how far apart they are ready.
+        size, ready = self.size, self.ready
+        self.neighbours = [[]] + [heapq.nsmallest(NEIGHBOURS, (m for m in range(1, size) if m != n),
+                                                  key=lambda m, row=n * size, at=ready[n]:
+                                                  self.matrix[row + m] + abs(ready[m] - at))
+                                  for n in range(1, size)]
+
+    def duration(self, route):
+        """Seconds from leaving the store to being back, for a route of point numbers."""
+        matrix, size = self.matrix, self.size
+        seconds, here = 0.0, 0
+        for point in route:
+            seconds += matrix[here * size + point]
+            here = point
+        return seconds + matrix[here * size] + STOP_MINUTES * 60 * len(route)
+
+    def on_time(self, route, departs_at=None):
+        """Whether every stop on the route arrives by its limit when it leaves once all are ready."""
+        matrix, size, limit = self.matrix, self.size, self.limit
+        clock = max(self.ready[point] for point in route) if departs_at is None else departs_at
+        here = 0
+        for point in route:
+            clock += matrix[here * size + point] + STOP_MINUTES * 60
+            if clock > limit[point]:
+                return False
+            here = point
+        return True
+
+    def best_insert(self, route, point):
+        """(extra seconds, new route) for the cheapest on-time place to put point in route, or None."""
+        best = None
+        base = self.duration(route)
+        for n in range(len(route) + 1):
+            candidate = route[:n] + [point] + route[n:]
+            if self.on_time(candidate):
+                extra = self.duration(candidate) - base
+                if best is None or extra < best[0]:
+                    best = (extra, candidate)
+        return best
+
+    def batch(self):
+        run_of = [None] * self.size
+        runs = []
+        for seed in sorted(range(1, self.size), key=lambda n: self.limit[n]):
+            if run_of[seed] is not None:
+                continue
+            route = [seed]
+            run_of[seed] = len(runs)
+            while len(route) < MAX_STOPS:
+                best = None
+                for point in {m for n in route for m in self.neighbours[n] if run_of[m] is None}:
+                    found = self.best_insert(route, point)
+                    if found is not None and (best is None or found[0] < best[0]):
+                        best = (found[0], point, found[1])
+                if best is None:
+                    break
+                route = best[2]
+                run_of[best[1]] = len(runs)
+            runs.append(route)
+        return runs
+
+    def reorder(self, route):
+        """The route's stops in their quickest on-time order (every order, as runs are short)."""
+        best, best_seconds = route, self.duration(route)
+        for candidate in itertools.permutations(route):
+            candidate = list(candidate)
+            seconds = self.duration(candidate)
+            if seconds < best_seconds and self.on_time(candidate):
+                best, best_seconds = candidate, seconds
+        return best
+
+    def improve(self, runs, passes=3):
+        runs = [self.reorder(route) for route in runs]
+        run_of = [None] * self.size
+        for n, route in enumerate(runs):
+            for point in route:
+                run_of[point] = n
+        for _ in range(passes):
+            moved = False
+            for point in range(1, self.size):
+                home = runs[run_of[point]]
+                without = [p for p in home if p != point]
+                saved = self.duration(home) - (self.duration(without) if without else 0)
+                best = None
+                for other in {run_of[m] for m in self.neighbours[point]} - {run_of[point]}:
+                    if len(runs[other]) >= MAX_STOPS or not runs[other]:
+                        continue
+                    found = self.best_insert(runs[other], point)
+                    if found is not None and found[0] < saved and (best is None or found[0] < best[0]):
+                        best = (found[0], other, found[1])
+                if best is not None and (not without or self.on_time(without)):
+                    runs[run_of[point]] = without
+                    runs[best[1]] = best[2]
+                    run_of[point] = best[1]
+                    moved = True
+            if not moved:
+                break
+        return [self.reorder(route) for route in runs if route]
+
+    def assign(self, runs, drivers):
+        """Runs for (driver, back_at) drivers, earliest ready first, each to the driver back soonest."""
+        free = list(drivers)
+        heapq.heapify(free)
+        planned = []
+        for route in sorted(runs, key=lambda route: max(self.ready[point] for point in route)):
+            back_at, driver = heapq.heappop(free)
+            departs_at = max(max(self.ready[point] for point in route), back_at)
+            clock, here, arrivals = departs_at, 0, []
+            for point in route:
+                clock += self.matrix[here * self.size + point] + STOP_MINUTES * 60
+                arrivals.append(clock)
+                here = point
+            back = clock + self.matrix[here * self.size]
+            planned.append(Run(driver, departs_at, [self.stops[point - 1] for point in route], arrivals, back))
+            heapq.heappush(free, (back, driver))
+        return planned
+
+
+def plan(stops, drivers, now, improve=True):
+    """Runs for stops, given (back_at, driver) for each driver."""
+    if not stops:
+        return []
+    planner = Planner(stops, now)
+    runs = planner.batch()
+    if improve:
+        runs = planner.improve(runs)
+    return planner.assign(runs, drivers)
+
+
+def summarize(runs):
+    late = [arrival - stop.due_at for run in runs for stop, arrival in zip(run.stops, run.arrivals)
+            if arrival > stop.due_at]
+    stops = sum(len(run.stops) for run in runs)
+    return {"runs": len(runs), "stops": stops, "stops_per_run": stops / len(runs) if runs else 0,
+            "driving_hours": sum(run.back_at - run.departs_at for run in runs) / 3600,
+            "late": len(late), "worst_late_minutes": max(late, default=0) / 60}
+
+
+class Dispatcher:
+    """
+    The open deliveries of a running shop. Orders are added as they are placed;
+    a run is fixed once it has left, and everything not yet out is planned again
+    whenever something changes.
+    """
+
+    def __init__(self, addresses, drivers=DRIVERS, now=0.0):
+        self.addresses = addresses
+        self.drivers = [(now, n + 1) for n in range(drivers)]
+        self.waiting = {}
+        # Order id to the run it went out on.
+        self.departed = {}
+        self.out = []
+        self.planned = []
+        self.changed = False
+
+    def locate(self, address):
+        return self.addresses.get(address_key(address))
+
+    def add(self, order_id, address, ready_at, due_at):
+        """Queue an order for delivery; False if its address isn't in the table."""
+        point = self.locate(address)
+        if point is None:
+            return False
+        self.waiting[order_id] = Stop(order_id, point, ready_at, due_at)
+        self.changed = True
+        return True
+
+    def plan(self, now):
+        """The runs still to leave, replanned if an order came in; runs that have left stay as they went."""
+        gone = [run for run in self.planned if run.departs_at <= now]
+        if gone:
+            for run in gone:
+                for stop in run.stops:
+                    del self.waiting[stop.order_id]
+                    self.departed[stop.order_id] = run
+                self.drivers = [(run.back_at, driver) if driver == run.driver else (back_at, driver)
+                                for back_at, driver in self.drivers]
+        if gone or (self.out and self.out[0].back_at <= now):
+            self.out = sorted([run for run in self.out if run.back_at > now] + gone, key=lambda run: run.back_at)
+        if gone or self.changed:
+            self.planned = plan(list(self.waiting.values()), self.drivers, now)
+            self.changed = False
+        return self.planned
+
+    def on_road(self, now):
+        """The runs that have left and whose driver isn't back yet."""
+        self.plan(now)
+        return self.out
+
+    def run_for(self, order_id, now):
+        """The run the order went out on or is planned for, or None."""
+        self.plan(now)
+        if order_id in self.departed:
+            return self.departed[order_id]
+        for run in self.planned:
+            if run.arrival_of(order_id) is not None:
+                return run
+        return None
+
+
+def _bench(orders, drivers, hours=4, seed=1):
+    rng = random.Random(seed)
+    points = [(x, y) for address, x, y in grid_addresses()]
+    now = 0.0
+    stops = []
+    for n in range(orders):
+        # Ready over the next few hours, promised 20 minutes after that.
+        ready_at = now + rng.uniform(0, hours * 3600)
+        stops.append(Stop(n, rng.choice(points), ready_at, ready_at + 1200))
+    fleet = [(now, n + 1) for n in range(drivers)]
+
+    started = time.perf_counter()
+    runs = plan(stops, fleet, now)
+    elapsed = time.perf_counter() - started
+    planner = Planner(stops, now)
+    batched = planner.assign(planner.batch(), fleet)
+    alone = planner.assign([[n] for n in range(1, len(stops) + 1)], fleet)
+    print(f"Planned {orders} orders ready over {hours:g} hours for {drivers} drivers in {elapsed * 1000:.0f} ms")
+    for name, result in (("one order a run", alone), ("batched", batched), ("batched and improved", runs)):
+        figures = summarize(result)
+        print(f"  {name}: {figures['runs']} runs ({figures['stops_per_run']:.1f} stops each), "
+              f"{figures['driving_hours']:.1f} driving hours, {figures['late']} late "
+              f"(worst {figures['worst_late_minutes']:.0f} min)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pizza Palace delivery run planning")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("bench", help="plan a made-up rush and time it")
+    bench.add_argument("--orders", type=int, default=500)
+    bench.add_argument("--drivers", type=int, default=20)
+    bench.add_argument("--hours", type=float, default=4, help="how long the orders take to come out of the kitchen")
+    addresses = commands.add_parser("addresses", help="write an address table for the made-up town")
+    addresses.add_argument("--out", default=ADDRESSES_FILE)
+    addresses.add_argument("--count", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        _bench(args.orders, args.drivers, args.hours)
+    else:
+        write_addresses(args.out, args.count)
+        print(f"Wrote {args.count} addresses to {args.out}")
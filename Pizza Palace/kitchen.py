@@ -0,0 +1,403 @@
+"""
+Title: Pizza Palace Kitchen
+File: kitchen.py
+Author: Joshua Nobel
+
+A discrete-event model of the kitchen, used to give customers a real
+ready time and to try out how many ovens a day of orders needs.
+
+Every pizza is made at a prep station (first come, first served), then
+waits for an oven. An oven has OVEN_SLOTS slots, and everything in it must
+be on the same crust, since each crust bakes at its own temperature. So
+same-crust pizzas are batched: pizzas go into the free slots of an oven
+already baking their crust, or failing that an empty oven, which takes as
+many of that crust as it holds. The crust whose first pizza has waited
+longest and has somewhere to go goes first, but once a pizza with nowhere
+to go has waited HOLD_SECONDS, the ovens stop taking other crusts until
+one empties for it. An order is ready BOX_SECONDS after its last pizza
+comes out; beverages come out of the fridge, so an order of only beverages
+is ready as soon as it is boxed.
+
+Listeners (see subscribe) hear about each ticket as it changes: "placed"
+when it comes in, "moved" when its furthest pizza reaches a new stage and
+"done" once it is boxed. That is what the kitchen display draws from.
+
+Times are seconds: time.time() in the GUI, or any clock in a simulation.
+The kitchen only moves forward when asked (advance, or any query), so it
+costs nothing while no one is looking. A ready time is estimated by
+running a copy of the kitchen forward until that order comes out.
+
+Usage:
+    python kitchen.py simulate --store users.db --day 2026-10-17 --ovens 1 2 3 4
+    python kitchen.py simulate --sample 600 --ovens 1 2 3      a generated day with lunch and dinner rushes
+"""
+
+import argparse
+import copy
+import heapq
+import json
+import random
+import sqlite3
+import time
+from collections import deque
+
+import catalog
+import store
+
+PREP_STATIONS = 2
+OVENS = 2
+OVEN_SLOTS = 4
+
+PREP_SECONDS = 120
+TOPPING_SECONDS = 10
+BAKE_SECONDS = {"Small": 420, "Medium": 480, "Large": 540}
+CRUST_SECONDS = {"Thin": -60, "Regular": 0, "Stuffed": 120}
+# Specialties that bake longer than their size and crust suggest.
+SPECIALTY_SECONDS = {"Charcoal": 180}
+BOX_SECONDS = 60
+# How long a pizza waits for an oven on its crust before the others stop topping up.
+HOLD_SECONDS = 600
+
+QUEUED, PREPPING, WAITING, BAKING, BAKED = range(5)
+STAGES = {QUEUED: "In the queue", PREPPING: "Being made", WAITING: "Waiting for an oven", BAKING: "In the oven",
+          BAKED: "Being boxed"}
+
+
+class Pizza:
+    __slots__ = ("ticket", "crust", "prep", "bake", "state", "prepped_at", "oven_at")
+
+    def __init__(self, ticket, item):
+        self.ticket = ticket
+        self.crust = item.get("crust") or "Regular"
+        self.prep = PREP_SECONDS + TOPPING_SECONDS * len(item.get("toppings", []))
+        self.bake = (BAKE_SECONDS.get(item.get("size"), BAKE_SECONDS["Large"]) + CRUST_SECONDS.get(self.crust, 0)
+                     + SPECIALTY_SECONDS.get(item.get("specialty") or item.get("name"), 0))
+        self.state = QUEUED
+        self.prepped_at = None
+        self.oven_at = None
+
+
+class Oven:
+    __slots__ = ("crust", "baking")
+
+    def __init__(self):
+        self.crust = None
+        self.baking = 0
+
+
+class Ticket:
+    __slots__ = ("order_id", "placed_at", "lines", "pizzas", "left", "stage", "ready_at")
+
+    def __init__(self, order_id, placed_at, lines=()):
+        self.order_id = order_id
+        self.placed_at = placed_at
+        # What the printed ticket would say, one line per cart item.
+        self.lines = lines
+        self.pizzas = []
+        self.left = 0
+        self.stage = QUEUED
+        self.ready_at = None
+
+
+def ticket_lines(items):
+    """The cart as the cooks read it, e.g. "2 x Large Thin Hawaiian" or "1 x Medium Regular: Ham, Olives"."""
+    lines = []
+    for item in items:
+        if item.get("type") == "beverage" or ("beverage" in item and "size" not in item):
+            lines.append(f"{item.get('beverage_quantity', 1)} x {item.get('beverage')}")
+            continue
+        name = item.get("specialty") or item.get("name")
+        pizza = f"{item.get('quantity', 1)} x {item.get('size')} {item.get('crust') or 'Regular'}"
+        toppings = item.get("toppings", [])
+        lines.append(f"{pizza} {name}" if name else f"{pizza}: {', '.join(toppings) or 'Cheese'}")
+    return tuple(lines)
+
+
+def pizzas_in(items):
+    """Each pizza in a cart once per unit of quantity, as the cart items themselves."""
+    for item in items:
+        if not (item.get("type") == "beverage" or ("beverage" in item and "size" not in item)):
+            for _ in range(item.get("quantity", 1)):
+                yield item
+
+
+class Kitchen:
+    def __init__(self, ovens=OVENS, oven_slots=OVEN_SLOTS, prep_stations=PREP_STATIONS, now=0.0):
+        self.ovens = ovens
+        self.oven_slots = oven_slots
+        self.now = now
+        self.events = []
+        self.scheduled = 0
+        self.prep_queue = deque()
+        self.idle_stations = prep_stations
+        self.oven_queues = {}
+        self.oven_list = [Oven() for _ in range(ovens)]
+        self.tickets = {}
+        self.listeners = []
+        # Slot-seconds spent baking, for how busy the ovens were.
+        self.oven_busy = 0.0
+
+    def subscribe(self, listener):
+        """Call listener(event, ticket) on every ticket event from now on; see the module docstring."""
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def _notify(self, event, ticket):
+        for listener in self.listeners:
+            listener(event, ticket)
+
+    def _move(self, pizza, state):
+        pizza.state = state
+        ticket = pizza.ticket
+        if state > ticket.stage:
+            ticket.stage = state
+            if self.listeners:
+                self._notify("moved", ticket)
+
+    def _schedule(self, at, handler, payload):
+        # The count keeps events at the same moment in the order they were scheduled.
+        self.scheduled += 1
+        heapq.heappush(self.events, (at, self.scheduled, handler, payload))
+
+    def place(self, order_id, items, at=None):
+        """Take an order placed at at (default now); returns its estimated ready time."""
+        self.advance(self.now if at is None else at)
+        self._arrive(order_id, items)
+        return self.ready_at(order_id)
+
+    def schedule_order(self, order_id, items, at):
+        """Queue an order to arrive at a later time, for replaying a day."""
+        self._schedule(at, "_arrive_event", (order_id, items))
+
+    def _arrive_event(self, payload):
+        self._arrive(*payload)
+
+    def _arrive(self, order_id, items):
+        ticket = self.tickets[order_id] = Ticket(order_id, self.now, ticket_lines(items))
+        for item in pizzas_in(items):
+            pizza = Pizza(ticket, item)
+            ticket.pizzas.append(pizza)
+            self.prep_queue.append(pizza)
+        ticket.left = len(ticket.pizzas)
+        if self.listeners:
+            self._notify("placed", ticket)
+        if not ticket.left:
+            ticket.stage = BAKED
+            self._ready(ticket)
+        self._start_prep()
+
+    def _start_prep(self):
+        while self.idle_stations and self.prep_queue:
+            pizza = self.prep_queue.popleft()
+            self._move(pizza, PREPPING)
+            self.idle_stations -= 1
+            self._schedule(self.now + pizza.prep, "_prepped", pizza)
+
+    def _prepped(self, pizza):
+        self.idle_stations += 1
+        self._move(pizza, WAITING)
+        pizza.prepped_at = self.now
+        self.oven_queues.setdefault(pizza.crust, deque()).append(pizza)
+        self._start_prep()
+        self._load_ovens()
+
+    def _oven_for(self, crust):
+        """An oven with a free slot on crust, or else an empty one; None if neither."""
+        empty = None
+        for oven in self.oven_list:
+            if oven.crust == crust and oven.baking < self.oven_slots:
+                return oven
+            if empty is None and not oven.baking:
+                empty = oven
+        return empty
+
+    def _load_ovens(self):
+        while True:
+            heads = sorted((queue[0].prepped_at, crust) for crust, queue in self.oven_queues.items() if queue)
+            oven = None
+            for prepped_at, crust in heads:
+                oven = self._oven_for(crust)
+                if oven is not None or self.now - prepped_at >= HOLD_SECONDS:
+                    break
+            if oven is None:
+                return
+            # Fill every free slot with the crust at once; an empty oven takes a whole batch.
+            queue = self.oven_queues[crust]
+            oven.crust = crust
+            for _ in range(min(self.oven_slots - oven.baking, len(queue))):
+                pizza = queue.popleft()
+                self._move(pizza, BAKING)
+                pizza.oven_at = self.now
+                oven.baking += 1
+                self.oven_busy += pizza.bake
+                self._schedule(self.now + pizza.bake, "_baked", (oven, pizza))
+
+    def _baked(self, payload):
+        oven, pizza = payload
+        oven.baking -= 1
+        if not oven.baking:
+            oven.crust = None
+        self._move(pizza, BAKED)
+        ticket = pizza.ticket
+        ticket.left -= 1
+        if not ticket.left:
+            self._ready(ticket)
+        self._load_ovens()
+
+    def _ready(self, ticket):
+        ticket.ready_at = self.now + BOX_SECONDS
+        self._schedule(ticket.ready_at, "_boxed", ticket)
+
+    def _boxed(self, ticket):
+        if self.listeners:
+            self._notify("done", ticket)
+
+    def advance(self, until):
+        """Run every event up to until."""
+        events = self.events
+        while events and events[0][0] <= until:
+            at, _, handler, payload = heapq.heappop(events)
+            self.now = at
+            getattr(self, handler)(payload)
+        self.now = max(self.now, until)
+
+    def run(self):
+        """Run until the kitchen is empty; returns the time it got there."""
+        while self.events:
+            self.advance(self.events[0][0])
+        return self.now
+
+    def copy(self):
+        """A copy to run forward; orders that are already out stay behind."""
+        future = copy.copy(self)
+        future.listeners = []
+        active = {order_id: ticket for order_id, ticket in self.tickets.items() if ticket.ready_at is None}
+        # One deepcopy for everything still moving, so pizzas, tickets and ovens stay linked.
+        (future.events, future.prep_queue, future.oven_queues, future.oven_list,
+         future.tickets) = copy.deepcopy((self.events, self.prep_queue, self.oven_queues, self.oven_list, active))
+        return future
+
+    def ready_at(self, order_id):
+        """When the order will be (or was) ready, or None if the kitchen never saw it."""
+        ticket = self.tickets.get(order_id)
+        if ticket is None:
+            return None
+        if ticket.ready_at is None:
+            # Run a copy until this order is out. An order placed later can still take a free slot
+            # ahead of it, so under a rush the real time can come out a little later.
+            future = self.copy()
+            future_ticket = future.tickets[order_id]
+            while future_ticket.ready_at is None and future.events:
+                future.advance(future.events[0][0])
+            return future_ticket.ready_at
+        return ticket.ready_at
+
+    def stage(self, order_id, now=None):
+        """Where the order is, e.g. "In the oven"; None if the kitchen never saw it."""
+        self.advance(self.now if now is None else now)
+        ticket = self.tickets.get(order_id)
+        if ticket is None:
+            return None
+        if ticket.ready_at is not None and ticket.ready_at <= self.now:
+            return "Ready"
+        return STAGES[ticket.stage]
+
+
+def day_orders(path, day):
+    """(placed_at, order id, items) for every order placed on day ("YYYY-MM-DD", local time), oldest first."""
+    start = time.mktime(time.strptime(day, "%Y-%m-%d"))
+    end = start + 86400
+    if store.is_sqlite(path):
+        conn = sqlite3.connect(path)
+        rows = conn.execute("SELECT o.id, o.placed_at, li.data FROM orders o JOIN line_items li ON li.order_id = o.id "
+                            "WHERE o.placed_at >= ? AND o.placed_at < ? ORDER BY o.placed_at, o.id, li.position",
+                            (start, end))
+        orders = []
+        for order_id, placed_at, data in rows:
+            if not orders or orders[-1][1] != order_id:
+                orders.append((placed_at, order_id, []))
+            orders[-1][2].append(json.loads(data))
+        conn.close()
+        return orders
+    target = store.open_store(path)
+    orders = [(order["placed_at"], order_id, order["items"]) for file in target.order_files
+              for order_id, order in file.records() if start <= order.get("placed_at", 0) < end]
+    target.close()
+    return sorted(orders, key=lambda order: order[:2])
+
+
+def sample_day(orders, seed=1):
+    """A generated day of orders between 11:00 and 22:00, busiest at lunch and dinner."""
+    rng = random.Random(seed)
+    specialties = [item["name"] for item in catalog.SPECIALTIES]
+    day = []
+    for n in range(orders):
+        rush = rng.random()
+        hour = rng.gauss(12.5, 0.6) if rush < 0.3 else rng.gauss(18.5, 1.0) if rush < 0.8 else rng.uniform(11, 22)
+        items = []
+        for _ in range(rng.choice([1, 1, 1, 2, 2, 3])):
+            if rng.random() < 0.6:
+                items.append({"type": "pizza", "size": rng.choice(catalog.SIZES), "crust": rng.choice(catalog.CRUSTS),
+                              "toppings": [], "quantity": 1, "specialty": rng.choice(specialties)})
+            else:
+                items.append({"type": "pizza", "size": rng.choice(catalog.SIZES), "crust": rng.choice(catalog.CRUSTS),
+                              "toppings": rng.sample(catalog.TOPPINGS, rng.randint(0, 4)), "quantity": 1,
+                              "specialty": ""})
+        if rng.random() < 0.5:
+            items.append({"type": "beverage", "beverage": rng.choice(catalog.BEVERAGES), "beverage_quantity": 2})
+        day.append((min(max(hour, 11), 22) * 3600, f"sample-{n}", items))
+    return sorted(day, key=lambda order: order[:2])
+
+
+def simulate(orders, ovens, oven_slots=OVEN_SLOTS, prep_stations=PREP_STATIONS):
+    """Replay (placed_at, order id, items) orders through a kitchen; returns its figures."""
+    kitchen = Kitchen(ovens, oven_slots, prep_stations, now=orders[0][0] if orders else 0.0)
+    for placed_at, order_id, items in orders:
+        kitchen.schedule_order(order_id, items, placed_at)
+    started = time.perf_counter()
+    finished = kitchen.run()
+    elapsed = time.perf_counter() - started
+
+    tickets = [ticket for ticket in kitchen.tickets.values() if ticket.pizzas]
+    waits = sorted(ticket.ready_at - ticket.placed_at for ticket in tickets)
+    pizzas = [pizza for ticket in tickets for pizza in ticket.pizzas]
+    oven_waits = sorted(pizza.oven_at - pizza.prepped_at for pizza in pizzas)
+    span = max(finished - (orders[0][0] if orders else 0.0), 1)
+
+    def percentile(values, share):
+        return values[min(int(len(values) * share), len(values) - 1)] if values else 0
+
+    return {"ovens": ovens, "orders": len(tickets), "pizzas": len(pizzas),
+            "pizzas_per_hour": len(pizzas) / span * 3600,
+            "median_wait": percentile(waits, 0.5), "p90_wait": percentile(waits, 0.9), "max_wait": percentile(waits, 1),
+            "median_oven_wait": percentile(oven_waits, 0.5), "p90_oven_wait": percentile(oven_waits, 0.9),
+            "oven_use": kitchen.oven_busy / (ovens * oven_slots * span), "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pizza Palace kitchen simulation")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sim = commands.add_parser("simulate", help="replay a day of orders under different oven counts")
+    sim.add_argument("--store", default="users.json", help="the GUI's store: .json, .d directory or .db")
+    sim.add_argument("--day", help="YYYY-MM-DD to replay from the store (default: today)")
+    sim.add_argument("--sample", type=int, help="replay a generated day of this many orders instead")
+    sim.add_argument("--ovens", type=int, nargs="+", default=[1, 2, 3, 4])
+    sim.add_argument("--slots", type=int, default=OVEN_SLOTS, help="pizzas per oven")
+    sim.add_argument("--prep", type=int, default=PREP_STATIONS, help="prep stations")
+    args = parser.parse_args()
+
+    if args.sample:
+        orders, source = sample_day(args.sample), f"a generated day of {args.sample} orders"
+    else:
+        day = args.day or time.strftime("%Y-%m-%d")
+        orders, source = day_orders(args.store, day), f"{day} from {args.store}"
+    print(f"Replaying {len(orders)} orders ({source}) with {args.prep} prep stations and {args.slots} pizzas per oven")
+    for ovens in args.ovens:
+        figures = simulate(orders, ovens, args.slots, args.prep)
+        print(f"{ovens} ovens: {figures['pizzas']} pizzas, {figures['pizzas_per_hour']:.0f} an hour, "
+              f"ready in {figures['median_wait'] / 60:.0f} min (median), {figures['p90_wait'] / 60:.0f} min (p90), "
+              f"{figures['max_wait'] / 60:.0f} min (worst); oven queue {figures['median_oven_wait'] / 60:.1f} min "
+              f"(median), {figures['p90_oven_wait'] / 60:.1f} min (p90); ovens busy {figures['oven_use']:.0%} "
+              f"[{figures['seconds'] * 1000:.0f} ms]")
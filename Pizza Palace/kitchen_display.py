@@ -0,0 +1,185 @@
+"""
+Title: Pizza Palace Kitchen Display
+File: kitchen_display.py
+Author: Joshua Nobel
+
+The line cooks' screen: every open ticket, oldest first, with what is on
+it (size, crust, toppings, drinks), where it has got to in the kitchen and
+how long it has been waiting.
+
+Nothing here redraws on a timer. The display subscribes to the kitchen's
+ticket events (see kitchen.py): a placed order adds a row at the bottom, a
+ticket moving to a new stage redraws its own row and a boxed ticket takes
+its row away. Events are queued and applied together when Tk is next
+idle, so a burst of them costs one pass. The rows are a VirtualList, so
+only the tickets on screen have widgets however many are open, and the
+ordering screens in the same process never wait on the display.
+
+Once a second, as a job on the shared scheduler (scheduler.py), the
+display moves the kitchen's clock on, which is what sends the events, and
+updates the waiting times on screen, touching only the labels whose
+minute has changed.
+
+Usage:
+    python PizzaPalace.py --kitchen-display
+"""
+
+import time
+import tkinter as tk
+import tkinter.font as tkfont
+from bisect import bisect_left
+
+import kitchen
+import scheduler
+from widgets import VirtualList
+
+TICK_MS = 1000
+# Waiting longer than this turns a ticket's time red.
+LATE_MINUTES = 20
+STAGE_COLORS = {kitchen.QUEUED: "#FFFFFF", kitchen.PREPPING: "#FFF3B0", kitchen.WAITING: "#FFD27F",
+                kitchen.BAKING: "#FFA66B", kitchen.BAKED: "#B8E0A8"}
+
+
+class KitchenDisplay:
+    def __init__(self, window, kitchen_model):
+        self.window = window
+        self.window.title("Pizza Palace Kitchen")
+        self.window.geometry("700x1000")
+        self.window.configure(bg="#FFE461")
+        self.kitchen = kitchen_model
+
+        self.count_label = tk.Label(window, font=("Cooper Black", 16), bg="#FFE461")
+        self.count_label.pack(pady=10)
+        self.title_height = tkfont.Font(font=("Cooper Black", 12)).metrics("linespace")
+        self.line_height = tkfont.nametofont("TkDefaultFont").metrics("linespace")
+        self.ticket_list = VirtualList(window, self.create_ticket_row, self.update_ticket_row,
+                                       height_of=self.ticket_row_height)
+        self.ticket_list.pack(fill=tk.BOTH, expand=True)
+
+        # Rows in the order the tickets came in; positions[order_id] is the ticket's arrival number.
+        self.tickets = []
+        self.arrivals = []
+        self.positions = {}
+        self.next_arrival = 0
+        self.pending = []
+        self.flush_id = None
+
+        self.kitchen.advance(time.time())
+        self.add_tickets([ticket for ticket in self.kitchen.tickets.values()
+                          if ticket.ready_at is None or ticket.ready_at > self.kitchen.now])
+        self.kitchen.subscribe(self.on_ticket_event)
+        self.scheduler = scheduler.shared(window)
+        self.scheduler.every(TICK_MS, self.tick, owner=self, delay_ms=TICK_MS)
+        self.window.bind("<Destroy>", self.on_destroy, add="+")
+
+    def on_destroy(self, event):
+        if event.widget is self.window:
+            self.kitchen.unsubscribe(self.on_ticket_event)
+            self.scheduler.cancel(self)
+            if self.flush_id is not None:
+                self.window.after_cancel(self.flush_id)
+
+    def on_ticket_event(self, event, ticket):
+        self.pending.append((event, ticket))
+        if self.flush_id is None:
+            self.flush_id = self.window.after_idle(self.flush)
+
+    def flush(self):
+        self.flush_id = None
+        events, self.pending = self.pending, []
+        placed, moved, done = [], {}, set()
+        for event, ticket in events:
+            if event == "placed":
+                placed.append(ticket)
+            elif event == "moved":
+                moved[ticket.order_id] = ticket
+            else:
+                done.add(ticket.order_id)
+
+        self.remove_tickets(done)
+        # A new row is drawn as the ticket stands now, so its moves so far need nothing more.
+        self.add_tickets([ticket for ticket in placed if ticket.order_id not in done])
+        for ticket in placed:
+            moved.pop(ticket.order_id, None)
+        for order_id, ticket in moved.items():
+            index = self.index_of(order_id)
+            if index is not None:
+                self.ticket_list.update_item(index, ticket)
+
+    def index_of(self, order_id):
+        arrival = self.positions.get(order_id)
+        if arrival is None:
+            return None
+        # Arrival numbers only go up, so the rows are sorted by them.
+        return bisect_left(self.arrivals, arrival)
+
+    def add_tickets(self, tickets):
+        for ticket in tickets:
+            self.positions[ticket.order_id] = self.next_arrival
+            self.arrivals.append(self.next_arrival)
+            self.next_arrival += 1
+            self.tickets.append(ticket)
+            # Appending only lays out the new row; the rows above it stay as they are.
+            self.ticket_list.insert(len(self.tickets) - 1, ticket)
+        if tickets:
+            self.update_count()
+
+    def remove_tickets(self, order_ids):
+        order_ids = [order_id for order_id in order_ids if order_id in self.positions]
+        if len(order_ids) == 1:
+            index = self.index_of(order_ids[0])
+            del self.tickets[index], self.arrivals[index]
+            del self.positions[order_ids[0]]
+            self.ticket_list.delete(index)
+        elif order_ids:
+            # Several at once: lay the list out once rather than once per ticket.
+            for order_id in order_ids:
+                del self.positions[order_id]
+            kept = [n for n, ticket in enumerate(self.tickets) if ticket.order_id in self.positions]
+            self.tickets = [self.tickets[n] for n in kept]
+            self.arrivals = [self.arrivals[n] for n in kept]
+            self.ticket_list.set_items(self.tickets)
+        if order_ids:
+            self.update_count()
+
+    def update_count(self):
+        self.count_label.config(text=f"{len(self.tickets)} open tickets")
+
+    def tick(self, now):
+        self.kitchen.advance(now)
+        for index, row in self.ticket_list.visible_rows():
+            self.update_waiting(row, self.tickets[index], now)
+
+    def update_waiting(self, row, ticket, now):
+        minutes = int(now - ticket.placed_at) // 60
+        if minutes != row.minutes:
+            row.minutes = minutes
+            row.waiting_label.config(text=f"{minutes} min", fg="red" if minutes >= LATE_MINUTES else "black")
+
+    def ticket_row_height(self, index, ticket):
+        # Title with pady=2, one line per cart item, the border and the row's own padding.
+        return self.title_height + 4 + self.line_height * max(len(ticket.lines), 1) + 4 + 6
+
+    def create_ticket_row(self, parent):
+        row = tk.Frame(parent, bg="#FFE461", pady=3)
+        row.ticket_frame = tk.Frame(row, borderwidth=2, relief="solid")
+        row.ticket_frame.pack(fill=tk.BOTH, expand=True)
+        row.ticket_frame.columnconfigure(0, weight=1)
+        row.title_label = tk.Label(row.ticket_frame, font=("Cooper Black", 12), anchor=tk.W)
+        row.title_label.grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
+        row.waiting_label = tk.Label(row.ticket_frame, font=("Cooper Black", 12), anchor=tk.E)
+        row.waiting_label.grid(row=0, column=1, sticky=tk.E, padx=5, pady=2)
+        row.items_label = tk.Label(row.ticket_frame, justify=tk.LEFT, anchor=tk.W)
+        row.items_label.grid(row=1, column=0, columnspan=2, sticky=tk.W, padx=5)
+        row.minutes = None
+        return row
+
+    def update_ticket_row(self, row, index, ticket):
+        color = STAGE_COLORS[ticket.stage]
+        for widget in (row.ticket_frame, row.title_label, row.waiting_label, row.items_label):
+            widget.config(bg=color)
+        row.title_label.config(text=f"#{ticket.order_id}  {kitchen.STAGES[ticket.stage]}")
+        row.items_label.config(text="\n".join(ticket.lines))
+        # Rows are reused for other tickets, so the waiting time is always redrawn here.
+        row.minutes = None
+        self.update_waiting(row, ticket, time.time())
@@ -0,0 +1,343 @@
+"""
+Title: Pizza Palace Order API
+File: order_api.py
+Author: Joshua Nobel
+
+A small HTTP/JSON service for taking orders without the GUI, for the web
+front end and the phone-order tablet. It uses the same cart and checkout
+rules (ordering.py) and writes to the same store the GUI does, so orders
+taken here show up in Track Order and in customers' order history.
+
+    GET  /menu                       sizes, crusts, toppings, specialties, beverages
+    POST /quote                      {"items": [...], "coupon": "PALACE10"} -> totals in cents
+    POST /orders                     {"items": [...], "customer": {...}, "coupon": ..., "username": ..., "password": ...}
+    GET  /orders/<id>                one order
+    GET  /orders?phone=... or ?name= orders for a phone number or name, newest first
+
+Items are as ordering.cart_item takes them; the customer has the checkout
+fields (name, address, phone, card_number, card_expiry, card_cvv). Errors
+come back as {"error": "..."} with a 4xx status.
+
+Everything runs on one asyncio loop. The store is only touched from one
+worker thread, and orders arriving together are saved in one batch (one
+store.apply, so one locked write per file) before any of them is answered,
+so an answered order is on disk.
+
+Usage:
+    python order_api.py serve --store users.json --port 8080
+    python order_api.py loadtest --orders 5000 --connections 50     against a throwaway store
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import catalog
+import ordering
+import promotions
+import store
+
+MAX_BODY = 64 * 1024
+MAX_BATCH = 500
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_response(status, payload, keep_alive=True):
+    body = json.dumps(payload).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("ascii") + body
+
+
+class OrderService:
+    def __init__(self, store_path="users.json", promotions_path="promotions.json"):
+        self.store_path = store_path
+        self.engine = promotions.load_rules(promotions_path)
+        # SQLite connections belong to the thread that opened them, so the store lives on one thread.
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.store = None
+        self.pending = None
+        self.writer = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.store = await loop.run_in_executor(self.executor, store.open_store, self.store_path)
+        self.pending = asyncio.Queue()
+        self.writer = asyncio.create_task(self._write_batches())
+
+    async def stop(self):
+        if self.writer is not None:
+            self.writer.cancel()
+        if self.store is not None:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.store.close)
+        self.executor.shutdown()
+
+    async def _call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def _write_batches(self):
+        while True:
+            batch = [await self.pending.get()]
+            while len(batch) < MAX_BATCH and not self.pending.empty():
+                batch.append(self.pending.get_nowait())
+            try:
+                results = await self._call(self.store.apply, [change for change, future in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for (change, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def save(self, change):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.put_nowait((change, future))
+        return await future
+
+    def menu(self):
+        return {"sizes": catalog.SIZES, "crusts": catalog.CRUSTS, "toppings": catalog.TOPPINGS,
+                "specialties": [{"name": item["name"], "description": item["description"]} for item in catalog.SPECIALTIES],
+                "beverages": catalog.BEVERAGES}
+
+    def _cart(self, request):
+        items = request.get("items")
+        if not isinstance(items, list):
+            raise ordering.OrderError("items must be a list.")
+        items = [ordering.cart_item(spec) for spec in items]
+        if not isinstance(request.get("coupon"), (str, type(None))):
+            raise ordering.OrderError("coupon must be text.")
+        coupon = ordering.check_coupon(self.engine, request.get("coupon"))
+        return items, ordering.cart_totals(items, self.engine, coupon)
+
+    @staticmethod
+    def _totals(totals):
+        quote, applied = totals
+        return {"subtotal": quote.subtotal, "discount": quote.subtotal + quote.tax - quote.total, "tax": quote.tax,
+                "total": quote.total, "applied": [[name, value] for name, value in applied]}
+
+    def quote(self, request):
+        items, totals = self._cart(request)
+        return dict(self._totals(totals), items=items)
+
+    async def place_order(self, request):
+        items, totals = self._cart(request)
+        customer = request.get("customer")
+        if not isinstance(customer, dict):
+            raise ordering.OrderError("customer must be an object.")
+        if any(not isinstance(request.get(key), (str, type(None))) for key in ("username", "password")):
+            raise ordering.OrderError("username and password must be text.")
+        username = request.get("username") or None
+        if username is not None and not await self._call(self.store.check_password, username, request.get("password")):
+            raise HttpError(401, "Wrong username or password.")
+        order = ordering.checkout(username, items, customer)
+        result = await self.save(("record_order", username, order))
+        if isinstance(result, Exception):
+            print(f"Error saving order {order['id']}: {result}")
+            raise HttpError(500, "The order could not be saved.")
+        return dict(self._totals(totals), id=order["id"], placed_at=order["placed_at"])
+
+    async def find_order(self, order_id):
+        order = await self._call(self.store.find_order, order_id)
+        if order is None:
+            raise HttpError(404, f"No order {order_id}.")
+        return order
+
+    async def find_orders(self, query):
+        phone = query.get("phone", [None])[0]
+        name = query.get("name", [None])[0]
+        if not phone and not name:
+            raise HttpError(400, "Give a phone or name to search by.")
+        return {"orders": await self._call(self.store.find_orders, phone, name)}
+
+    async def dispatch(self, method, target, body):
+        """(status, payload) for one request."""
+        url = urlsplit(target)
+        path = url.path.rstrip("/")
+        try:
+            request = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {"error": "The request body is not JSON."}
+        if not isinstance(request, dict):
+            return 400, {"error": "The request body must be a JSON object."}
+        try:
+            if path == "/menu" and method == "GET":
+                return 200, self.menu()
+            if path == "/quote" and method == "POST":
+                return 200, self.quote(request)
+            if path == "/orders" and method == "POST":
+                return 201, await self.place_order(request)
+            if path == "/orders" and method == "GET":
+                return 200, await self.find_orders(parse_qs(url.query))
+            if path.startswith("/orders/") and method == "GET":
+                return 200, await self.find_order(path[len("/orders/"):].upper())
+            if path in ("/menu", "/quote", "/orders") or path.startswith("/orders/"):
+                return 405, {"error": f"{method} is not allowed on {path}."}
+            return 404, {"error": f"Nothing at {path}."}
+        except ordering.OrderError as e:
+            return 400, {"error": str(e)}
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            print(f"Error handling {method} {target}: {e}")
+            return 500, {"error": "Something went wrong."}
+
+    async def handle(self, reader, writer):
+        """One connection; HTTP/1.1 keep-alive, one request at a time."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    writer.write(encode_response(400, {"error": "Malformed request line."}, False))
+                    break
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    writer.write(encode_response(400, {"error": "Bad Content-Length."}, False))
+                    break
+                if length > MAX_BODY:
+                    writer.write(encode_response(413, {"error": "Request too large."}, False))
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.dispatch(method, target, body)
+                writer.write(encode_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(store_path, host, port, ready=None):
+    service = OrderService(store_path)
+    await service.start()
+    server = await asyncio.start_server(service.handle, host, port, backlog=1024)
+    print(f"Taking orders on http://{host}:{port} into {store_path}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def _load_order(n):
+    items = [{"type": "pizza", "specialty": catalog.SPECIALTIES[n % len(catalog.SPECIALTIES)]["name"], "size": "Large",
+              "crust": "Regular", "quantity": 1 + n % 2},
+             {"type": "pizza", "size": "Medium", "crust": "Thin", "toppings": catalog.TOPPINGS[:n % 4]},
+             {"type": "beverage", "beverage": catalog.BEVERAGES[n % len(catalog.BEVERAGES)], "quantity": 2}]
+    customer = {"name": f"Load Test {n % 500}", "address": f"{n} Pizza St", "phone": f"812-555-{n % 10000:04d}",
+                "card_number": "4111111111111111", "card_expiry": "12/30", "card_cvv": "123"}
+    return json.dumps({"items": items, "customer": customer, "coupon": "PALACE10" if n % 3 == 0 else None}).encode("utf-8")
+
+
+async def _load_client(host, port, numbers, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    ids = []
+    try:
+        for n in numbers:
+            body = _load_order(n)
+            started = time.perf_counter()
+            writer.write(b"POST /orders HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                         % (host.encode("ascii"), len(body), body))
+            await writer.drain()
+            status_line, _, rest = (await reader.readuntil(b"\r\n\r\n")).partition(b"\r\n")
+            length = int(rest.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            response = json.loads(await reader.readexactly(length))
+            latencies.append(time.perf_counter() - started)
+            if b" 201 " not in status_line:
+                raise RuntimeError(f"Order {n} failed: {status_line.decode()} {response}")
+            ids.append(response["id"])
+    finally:
+        writer.close()
+    return ids
+
+
+async def load_test(host, port, orders, connections):
+    """Place orders over connections keep-alive connections at once; returns (seconds, ids, latencies)."""
+    latencies = []
+    started = time.perf_counter()
+    results = await asyncio.gather(*[_load_client(host, port, range(c, orders, connections), latencies)
+                                     for c in range(connections)])
+    return time.perf_counter() - started, [order_id for ids in results for order_id in ids], sorted(latencies)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_load_test(layout, orders, connections):
+    """Start the service in its own process on a fresh store, load it, and check every order was saved."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, {"json": "users.json", "sharded": "users.d", "sqlite": "users.db"}[layout])
+        port = _free_port()
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--store", path, "--port", str(port)],
+                                  stdout=subprocess.PIPE, text=True)
+        try:
+            server.stdout.readline()
+            elapsed, ids, latencies = asyncio.run(load_test("127.0.0.1", port, orders, connections))
+        finally:
+            server.terminate()
+            server.wait()
+
+        saved = store.open_store(path)
+        missing = sum(saved.find_order(order_id) is None for order_id in ids)
+        saved.close()
+    print(f"{layout}: {len(ids)} orders over {connections} connections in {elapsed:.2f} s, "
+          f"{len(ids) / elapsed:.0f} orders/s, median {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, {missing} missing from the store")
+    return missing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pizza Palace order API")
+    commands = parser.add_subparsers(dest="command", required=True)
+    server_args = commands.add_parser("serve", help="take orders over HTTP")
+    server_args.add_argument("--store", default="users.json", help="the GUI's store: .json, .d directory or .db")
+    server_args.add_argument("--host", default="127.0.0.1")
+    server_args.add_argument("--port", type=int, default=8080)
+    load_args = commands.add_parser("loadtest", help="time placing orders against a service on a throwaway store")
+    load_args.add_argument("--layout", choices=["json", "sharded", "sqlite"], default="sqlite")
+    load_args.add_argument("--orders", type=int, default=5000)
+    load_args.add_argument("--connections", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.store, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        sys.exit(1 if run_load_test(args.layout, args.orders, args.connections) else 0)
@@ -0,0 +1,129 @@
+"""
+Title: Pizza Palace Ordering
+File: ordering.py
+Author: Joshua Nobel
+
+The cart and checkout rules, with no Tk in sight. The GUI and the order
+API (order_api.py) both build cart items, total carts and place orders
+through here, so a pizza costs the same and an order is stored the same
+way whichever one took it.
+
+A cart is a plain list of cart items in the shape the GUI has always
+stored; prices are always worked out here, never taken from the caller.
+"""
+
+from collections import namedtuple
+
+import catalog
+import pricing
+import store
+
+Totals = namedtuple("Totals", ["quote", "applied"])
+
+CUSTOMER_FIELDS = ["name", "address", "phone", "card_number", "card_expiry", "card_cvv"]
+MAX_QUANTITY = 99
+
+
+class OrderError(ValueError):
+    """Something about a cart or checkout the customer needs to fix; the message says what."""
+
+
+def _quantity(quantity):
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or not 1 <= quantity <= MAX_QUANTITY:
+        raise OrderError(f"Quantity must be a whole number from 1 to {MAX_QUANTITY}.")
+    return quantity
+
+
+def _size_and_crust(size, crust):
+    if size not in catalog.SIZES:
+        raise OrderError(f"Size must be one of {', '.join(catalog.SIZES)}.")
+    if crust not in catalog.CRUSTS:
+        raise OrderError(f"Crust must be one of {', '.join(catalog.CRUSTS)}.")
+
+
+def custom_pizza(size, crust, toppings=(), quantity=1):
+    _size_and_crust(size, crust)
+    unknown = [topping for topping in toppings if topping not in catalog.TOPPINGS]
+    if unknown:
+        raise OrderError(f"We don't have {', '.join(unknown)}.")
+    toppings = list(toppings)
+    price = pricing.to_dollars(pricing.custom_pizza_cents(size, crust, toppings))
+    return {"type": "pizza", "size": size, "crust": crust, "toppings": toppings, "quantity": _quantity(quantity),
+            "price": price, "specialty": ""}
+
+
+def specialty_pizza(name, size="Large", crust="Regular", quantity=1):
+    if name not in {item["name"] for item in catalog.SPECIALTIES}:
+        raise OrderError(f"{name} is not on the menu.")
+    _size_and_crust(size, crust)
+    price = pricing.to_dollars(pricing.specialty_cents(name, size, crust))
+    return {"type": "pizza", "size": size, "crust": crust, "toppings": [], "quantity": _quantity(quantity),
+            "name": name, "price": price, "specialty": name}
+
+
+def beverage(name, quantity=1):
+    if name not in catalog.BEVERAGES:
+        raise OrderError(f"We don't have {name}." if name and name != "None" else "Please select a beverage.")
+    quantity = _quantity(quantity)
+    return {"type": "beverage", "beverage": name, "beverage_quantity": quantity,
+            "price": pricing.to_dollars(pricing.beverage_cents(name) * quantity)}
+
+
+def cart_item(spec):
+    """
+    A cart item from a request such as {"type": "pizza", "size": "Large", "crust": "Thin",
+    "toppings": [...], "quantity": 2}, {"type": "pizza", "specialty": "Hawaiian", ...} or
+    {"type": "beverage", "beverage": "Sprite", "quantity": 3}. Any price sent is ignored.
+    """
+    if not isinstance(spec, dict):
+        raise OrderError("Each item must be an object.")
+    if any(not isinstance(spec.get(key), (str, type(None))) for key in ("size", "crust", "specialty", "name", "beverage")):
+        raise OrderError("Sizes, crusts and names must be text.")
+    toppings = spec.get("toppings", [])
+    if not isinstance(toppings, list) or not all(isinstance(topping, str) for topping in toppings):
+        raise OrderError("toppings must be a list of names.")
+    if spec.get("type") == "beverage" or "beverage" in spec:
+        return beverage(spec.get("beverage"), spec.get("quantity", spec.get("beverage_quantity", 1)))
+    if spec.get("specialty") or spec.get("name"):
+        return specialty_pizza(spec.get("specialty") or spec.get("name"), spec.get("size", "Large"),
+                               spec.get("crust", "Regular"), spec.get("quantity", 1))
+    return custom_pizza(spec.get("size"), spec.get("crust"), spec.get("toppings", []), spec.get("quantity", 1))
+
+
+def set_quantity(item, quantity):
+    """Change a cart item's quantity in place, repricing a beverage line."""
+    if item.get("type") == "beverage":
+        item["beverage_quantity"] = _quantity(quantity)
+        item["price"] = pricing.to_dollars(pricing.beverage_cents(item["beverage"]) * quantity)
+    else:
+        item["quantity"] = _quantity(quantity)
+
+
+def check_coupon(engine, code):
+    """The coupon code as the promotions engine knows it, or None for no code."""
+    code = (code or "").strip().upper()
+    if code and not engine.has_coupon(code):
+        raise OrderError(f"{code} is not a valid coupon.")
+    return code or None
+
+
+def cart_totals(items, engine, coupon=None):
+    result = engine.evaluate(items, coupon=coupon)
+    return Totals(pricing.quote_cart(items, result.discount), result.applied)
+
+
+def check_customer(customer):
+    if any(not isinstance(customer.get(field), (str, type(None))) for field in CUSTOMER_FIELDS):
+        raise OrderError("Customer details must be text.")
+    missing = [field for field in CUSTOMER_FIELDS if not str(customer.get(field) or "").strip()]
+    if missing:
+        raise OrderError("Please fill out all fields.")
+
+
+def checkout(username, items, customer):
+    """The order record for a cart (see store.new_order); raises OrderError if it can't be placed."""
+    if not items:
+        raise OrderError("Your cart is empty.")
+    check_customer(customer)
+    return store.new_order(username, items, customer["name"].strip(), customer["phone"].strip(),
+                           customer["address"].strip())
@@ -0,0 +1,317 @@
+"""
+Title: Pizza Palace Order Archive
+File: orderpack.py
+Author: Joshua Nobel
+
+A compact binary format for order history (.opk), read through mmap.
+
+Layout, all little-endian:
+
+    header      magic "PPOH", version, counts and the offset of each section
+    strings     offsets into a UTF-8 blob; every size, crust, specialty,
+                beverage, topping and username is stored once here
+    toppings    string ids; a line item's toppings are a bitmask over this list
+    users       (name, first order, order count), sorted by name
+    orders      (first item, item count, flags, total cents)
+    items       fixed 24-byte records: kind, size, crust, key flags, name,
+                quantity, price in cents and the topping bitmask
+
+Nothing is parsed up front. Finding a customer is a binary search over the
+users table, and an order's items can be walked straight out of the mapped
+file with ITEM.iter_unpack(pack.item_view(order)).
+
+An archive named after the store (users.opk beside users.json, see
+store.open_archive) is what the GUI's order history reads: a page whose
+orders are all in the archive comes straight from the mapped file, and
+newer orders from the store. Repack with the GUI closed, as Windows won't
+replace a file that is mapped.
+
+The "price" round-trips as integer cents, so 19.990000000000002 comes back as
+19.99, and toppings come back in menu order. Otherwise items come back
+with the keys they went in with, including the older {"name": ...} shape.
+
+Usage:
+    python orderpack.py pack users.json users.opk        archive every customer's order history
+    python orderpack.py unpack users.opk history.json    back to {"user": {"order_history": [...]}}
+    python orderpack.py stats users.json                 compare JSON and packed sizes
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+import catalog
+import pricing
+import store
+
+MAGIC = b"PPOH"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHH5I6I")
+OFFSET = struct.Struct("<I")
+USER = struct.Struct("<III")
+ORDER = struct.Struct("<IHHI")
+# Version 1 had 16-bit names and quantities, which a big store's usernames ran past.
+ITEM = struct.Struct("<BBBBIIIQ")
+
+KIND_CUSTOM, KIND_SPECIALTY, KIND_BEVERAGE = 0, 1, 2
+NONE = 0xFF
+NO_NAME = 0xFFFFFFFF
+
+# Which of the optional keys the item had, so it comes back in the same shape.
+HAS_TYPE = 1
+HAS_NAME = 2
+HAS_SPECIALTY = 4
+BLANK_SPECIALTY = 8
+
+PIZZA_KEYS = {"type", "size", "crust", "toppings", "quantity", "price", "name", "specialty"}
+BEVERAGE_KEYS = {"type", "beverage", "beverage_quantity", "price"}
+
+
+class Packer:
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+        self.toppings = []
+        self.topping_bits = {}
+
+    def string(self, value):
+        found = self.ids.get(value)
+        if found is None:
+            found = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return found
+
+    def small(self, value):
+        # Sizes and crusts share the string table but must fit in a byte.
+        found = self.string(value)
+        if found >= NONE:
+            raise ValueError(f"Too many distinct strings before {value!r} to pack it in a byte")
+        return found
+
+    def topping_mask(self, toppings):
+        mask = 0
+        for topping in toppings:
+            bit = self.topping_bits.get(topping)
+            if bit is None:
+                if len(self.toppings) == 64:
+                    raise ValueError("More than 64 distinct toppings")
+                bit = self.topping_bits[topping] = len(self.toppings)
+                self.toppings.append(self.string(topping))
+            mask |= 1 << bit
+        return mask
+
+    def item(self, item):
+        flags = HAS_TYPE if "type" in item else 0
+        if item.get("type") == "beverage" or ("beverage" in item and "size" not in item):
+            if not set(item) <= BEVERAGE_KEYS:
+                raise ValueError(f"Cannot pack beverage keys {sorted(set(item) - BEVERAGE_KEYS)}")
+            return ITEM.pack(KIND_BEVERAGE, NONE, NONE, flags, self.string(item["beverage"]),
+                             item.get("beverage_quantity", 1), pricing.to_cents(item.get("price", 0)), 0)
+
+        if not set(item) <= PIZZA_KEYS:
+            raise ValueError(f"Cannot pack pizza keys {sorted(set(item) - PIZZA_KEYS)}")
+        name = item.get("specialty") or item.get("name")
+        if "name" in item:
+            flags |= HAS_NAME
+        if "specialty" in item:
+            flags |= HAS_SPECIALTY if item["specialty"] else BLANK_SPECIALTY
+        if "name" in item and "specialty" in item and item["specialty"] and item["name"] != item["specialty"]:
+            raise ValueError(f"Cannot pack an item named {item['name']!r} with specialty {item['specialty']!r}")
+        return ITEM.pack(KIND_SPECIALTY if name else KIND_CUSTOM,
+                         self.small(item["size"]) if item.get("size") is not None else NONE,
+                         self.small(item["crust"]) if item.get("crust") is not None else NONE,
+                         flags, self.string(name) if name else NO_NAME, item.get("quantity", 1),
+                         pricing.to_cents(item.get("price", 0)), self.topping_mask(item.get("toppings", [])))
+
+
+def pack(users, path):
+    """Write the order history of a users.json-shaped dict to path; returns the number of bytes written."""
+    packer = Packer()
+    # Sizes and crusts first so they get the low ids that fit in a byte, and the
+    # catalog's toppings in menu order.
+    for value in catalog.SIZES + catalog.CRUSTS:
+        packer.string(value)
+    packer.topping_mask(catalog.TOPPINGS)
+
+    user_rows, order_rows, item_rows = [], [], []
+    for username in sorted(users, key=lambda name: name.encode("utf-8")):
+        orders = users[username].get("order_history", [])
+        user_rows.append(USER.pack(packer.string(username), len(order_rows), len(orders)))
+        for order in orders:
+            order_rows.append(ORDER.pack(len(item_rows), len(order), 0, sum(pricing.item_cents(item) for item in order)))
+            item_rows.extend(packer.item(item) for item in order)
+
+    encoded = [value.encode("utf-8") for value in packer.strings]
+    string_offsets = [0]
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    def align(position):
+        return (position + 7) & ~7
+
+    strings_at = HEADER.size
+    blob_at = strings_at + OFFSET.size * len(string_offsets)
+    toppings_at = align(blob_at + string_offsets[-1])
+    users_at = align(toppings_at + OFFSET.size * len(packer.toppings))
+    orders_at = align(users_at + USER.size * len(user_rows))
+    items_at = align(orders_at + ORDER.size * len(order_rows))
+    size = items_at + ITEM.size * len(item_rows)
+
+    def chunks():
+        position = 0
+        sections = [
+            (0, [HEADER.pack(MAGIC, VERSION, 0, len(encoded), len(packer.toppings), len(user_rows), len(order_rows),
+                             len(item_rows), strings_at, blob_at, toppings_at, users_at, orders_at, items_at)]),
+            (strings_at, [OFFSET.pack(offset) for offset in string_offsets]),
+            (blob_at, encoded),
+            (toppings_at, [OFFSET.pack(string_id) for string_id in packer.toppings]),
+            (users_at, user_rows),
+            (orders_at, order_rows),
+            (items_at, item_rows),
+        ]
+        for start, parts in sections:
+            yield b"\0" * (start - position)
+            position = start
+            for part in parts:
+                yield part
+                position += len(part)
+
+    store.atomic_write(path, chunks())
+    return size
+
+
+class OrderPack:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            self.map.close()
+            raise ValueError(f"{path} is not an order archive")
+        self.view = memoryview(self.map)
+        (magic, version, _, self.string_count, self.topping_count, self.user_count, self.order_count, self.item_count,
+         self.strings_at, self.blob_at, self.toppings_at, self.users_at, self.orders_at, self.items_at) = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an order archive")
+        if version != VERSION:
+            raise ValueError(f"{path} is order archive version {version}; this reader handles {VERSION}")
+        self._strings = {}
+        self._toppings = None
+
+    def string(self, string_id):
+        value = self._strings.get(string_id)
+        if value is None:
+            start, end = struct.unpack_from("<II", self.map, self.strings_at + OFFSET.size * string_id)
+            value = self._strings[string_id] = str(self.view[self.blob_at + start:self.blob_at + end], "utf-8")
+        return value
+
+    def toppings(self, mask):
+        if self._toppings is None:
+            self._toppings = [self.string(OFFSET.unpack_from(self.map, self.toppings_at + OFFSET.size * bit)[0])
+                              for bit in range(self.topping_count)]
+        return [topping for bit, topping in enumerate(self._toppings) if mask >> bit & 1]
+
+    def _user(self, username):
+        """Binary search the users table; returns (first order, order count) or None."""
+        key = username.encode("utf-8")
+        lo, hi = 0, self.user_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name_id, first, count = USER.unpack_from(self.map, self.users_at + USER.size * mid)
+            start, end = struct.unpack_from("<II", self.map, self.strings_at + OFFSET.size * name_id)
+            found = self.view[self.blob_at + start:self.blob_at + end]
+            if found == key:
+                return first, count
+            if bytes(found) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def usernames(self):
+        for n in range(self.user_count):
+            yield self.string(USER.unpack_from(self.map, self.users_at + USER.size * n)[0])
+
+    def order_range(self, username):
+        """range() of the order numbers belonging to username, oldest first."""
+        found = self._user(username)
+        return range(found[0], found[0] + found[1]) if found else range(0)
+
+    def numbered_orders(self, username, low, high):
+        """(number, items) for username's orders numbered high down to low + 1, as store.order_page has them."""
+        orders = self.order_range(username)
+        return [(number, self.items(orders[number - 1])) for number in range(high, low, -1)]
+
+    def order_total(self, order):
+        return ORDER.unpack_from(self.map, self.orders_at + ORDER.size * order)[3]
+
+    def item_view(self, order):
+        """The order's item records as a memoryview into the mapped file; nothing is copied."""
+        first, count, flags, total = ORDER.unpack_from(self.map, self.orders_at + ORDER.size * order)
+        start = self.items_at + ITEM.size * first
+        return self.view[start:start + ITEM.size * count]
+
+    def items(self, order):
+        """The order's items in the cart item shape the GUI stores."""
+        return [self.decode(record) for record in ITEM.iter_unpack(self.item_view(order))]
+
+    def decode(self, record):
+        kind, size, crust, flags, name_id, quantity, cents, mask = record
+        price = pricing.to_dollars(cents)
+        if kind == KIND_BEVERAGE:
+            item = {"type": "beverage"} if flags & HAS_TYPE else {}
+            item.update(beverage=self.string(name_id), beverage_quantity=quantity, price=price)
+            return item
+        item = {"type": "pizza"} if flags & HAS_TYPE else {}
+        item.update(size=self.string(size) if size != NONE else None, crust=self.string(crust) if crust != NONE else None,
+                    toppings=self.toppings(mask), quantity=quantity)
+        name = self.string(name_id) if name_id != NO_NAME else None
+        if flags & HAS_NAME:
+            item["name"] = name
+        item["price"] = price
+        if flags & HAS_SPECIALTY:
+            item["specialty"] = name
+        elif flags & BLANK_SPECIALTY:
+            item["specialty"] = ""
+        return item
+
+    def orders(self, username):
+        return [self.items(order) for order in self.order_range(username)]
+
+    def unpack(self):
+        return {username: {"order_history": self.orders(username)} for username in self.usernames()}
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("pack", "unpack", "stats"):
+        print("Usage: python orderpack.py pack users.json users.opk | unpack users.opk history.json | stats users.json")
+        sys.exit(2)
+
+    command = sys.argv[1]
+    if command == "unpack":
+        archive = OrderPack(sys.argv[2])
+        history = archive.unpack()
+        archive.close()
+        with open(sys.argv[3], "w") as f:
+            json.dump(history, f)
+        print(f"Unpacked {len(history)} customers to {sys.argv[3]}")
+        sys.exit(0)
+
+    with open(sys.argv[2], "r") as f:
+        users = json.load(f)
+    if command == "pack":
+        size = pack(users, sys.argv[3])
+        print(f"Packed {sum(len(user.get('order_history', [])) for user in users.values())} orders into {size} bytes")
+    else:
+        history_bytes = len(json.dumps({name: user.get("order_history", []) for name, user in users.items()}))
+        with tempfile.TemporaryDirectory() as directory:
+            size = pack(users, os.path.join(directory, "orders.opk"))
+        print(f"JSON order history {history_bytes} bytes, packed {size} bytes ({history_bytes / size:.1f}x smaller)")
@@ -0,0 +1,135 @@
+"""
+Title: Pizza Palace Pricing
+File: pricing.py
+Author: Joshua Nobel
+
+The one place prices are worked out. Everything is integer cents; the price
+tables for specialties, build-your-own pizzas and beverages are computed once
+at import, so quoting a cart is a handful of dict lookups per line.
+
+Cart items keep the shape the GUI has always stored: a pizza's "price" is
+the price of one pizza, a beverage's "price" is the whole line.
+
+Usage (back office):
+    python pricing.py users.json     reprice every stored order and print the totals
+"""
+
+import sys
+import time
+from collections import namedtuple
+
+import catalog
+
+Quote = namedtuple("Quote", ["subtotal", "tax", "total"])
+
+SPECIALTY_TABLE = {
+    (item["name"], size, crust): item["price_cents"] + catalog.SPECIALTY_SIZE_CENTS[size] + catalog.CRUST_CENTS[crust]
+    for item in catalog.SPECIALTIES
+    for size in catalog.SIZES
+    for crust in catalog.CRUSTS
+}
+
+CUSTOM_TABLE = {
+    (size, crust): catalog.CUSTOM_BASE_CENTS[size] + catalog.CRUST_CENTS[crust]
+    for size in catalog.SIZES
+    for crust in catalog.CRUSTS
+}
+
+BEVERAGE_TABLE = dict(
+    [(flavor, catalog.COKE_CENTS) for flavor in catalog.COKE_FLAVORS]
+    + [(flavor, catalog.JARRITOS_CENTS) for flavor in catalog.JARRITOS_FLAVORS]
+)
+
+
+def to_cents(dollars):
+    return int(round(dollars * 100))
+
+
+def to_dollars(cents):
+    """Cents as the float stored in a cart item, e.g. 1999 -> 19.99 (never 19.990000000000002)."""
+    return round(cents / 100, 2)
+
+
+def format_price(cents):
+    sign = "-" if cents < 0 else ""
+    return f"{sign}${abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+def custom_pizza_cents(size, crust, toppings):
+    return CUSTOM_TABLE[(size, crust)] + catalog.TOPPING_CENTS * len(toppings)
+
+
+def specialty_cents(name, size, crust):
+    return SPECIALTY_TABLE[(name, size, crust)]
+
+
+def beverage_cents(beverage):
+    return BEVERAGE_TABLE[beverage]
+
+
+def tax_cents(subtotal):
+    # Round half up to the cent.
+    return (subtotal * catalog.TAX_BASIS_POINTS + 5000) // 10000
+
+
+def item_cents(item):
+    """Price of one cart line, quantity included."""
+    if item.get("type") == "beverage" or ("beverage" in item and "size" not in item):
+        unit = BEVERAGE_TABLE.get(item.get("beverage"))
+        if unit is None:
+            return to_cents(item.get("price", 0))
+        return unit * item.get("beverage_quantity", 1)
+
+    size = item.get("size")
+    crust = item.get("crust")
+    specialty = item.get("specialty") or item.get("name")
+    if specialty:
+        unit = SPECIALTY_TABLE.get((specialty, size, crust))
+    else:
+        unit = CUSTOM_TABLE.get((size, crust))
+        if unit is not None:
+            unit += catalog.TOPPING_CENTS * len(item.get("toppings", []))
+    if unit is None:
+        # Something the catalog no longer sells; trust what was stored.
+        unit = to_cents(item.get("price", 0))
+    return unit * item.get("quantity", 1)
+
+
+def quote_cart(items, discount=0):
+    """Quote a cart; a promotion discount comes off before tax."""
+    subtotal = 0
+    for item in items:
+        subtotal += item_cents(item)
+    taxed = max(subtotal - discount, 0)
+    tax = tax_cents(taxed)
+    return Quote(subtotal, tax, taxed + tax)
+
+
+def quote_carts(carts):
+    """Quote many carts in one call; returns a list of Quotes in the same order."""
+    price = item_cents
+    tax = tax_cents
+    quotes = []
+    for items in carts:
+        subtotal = sum(price(item) for item in items)
+        t = tax(subtotal)
+        quotes.append(Quote(subtotal, t, subtotal + t))
+    return quotes
+
+
+if __name__ == "__main__":
+    import json
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "users.json"
+    with open(path, "r") as f:
+        users = json.load(f)
+
+    carts = [order for user in users.values() for order in user.get("order_history", [])]
+    started = time.perf_counter()
+    quotes = quote_carts(carts)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    print(f"Repriced {len(quotes)} orders in {elapsed:.1f} ms")
+    print(f"Subtotal {format_price(sum(q.subtotal for q in quotes))}, "
+          f"tax {format_price(sum(q.tax for q in quotes))}, "
+          f"total {format_price(sum(q.total for q in quotes))}")
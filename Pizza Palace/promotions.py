@@ -0,0 +1,384 @@
+"""
+Title: Pizza Palace Promotions
+File: promotions.py
+Author: Joshua Nobel
+
+Promotions and coupons are plain data (see promotions.json) compiled into a
+PromotionEngine. Rules are indexed by the catalog keys they need, e.g.
+("item", "Charcoal") or ("group", "jarritos"), so a cart is only checked
+against rules whose required items it actually contains.
+
+A rule looks like:
+    {"id": "lunch-combo", "name": "2 Large Specialties + 4 Jarritos",
+     "requires": [{"match": {"kind": "specialty", "size": "Large"}, "count": 2},
+                  {"match": {"group": "jarritos"}, "count": 4}],
+     "reward": {"type": "amount_off", "cents": 500}}
+
+Match keys are kind (specialty, custom or beverage), item (specialty name,
+"custom" or beverage flavor), size, crust and group (coke or jarritos); a
+value may be a list. Rewards are amount_off, percent_off_items, bundle_price,
+free_crust and percent_off_cart. Optional fields are days (["Tue"]), coupon,
+min_subtotal_cents, repeat (apply as often as the cart allows) and stackable
+(for cart-wide percentages).
+
+Item rewards use up the units they match, so two promotions never discount
+the same pizza; the engine keeps taking whichever promotion is worth the
+most on the units still unclaimed, then applies the best cart-wide
+percentage on what is left.
+
+Usage:
+    python promotions.py --bench     time cart evaluation with 1,000 active rules
+"""
+
+import datetime
+import heapq
+import json
+import random
+import sys
+import time
+from collections import namedtuple
+from itertools import combinations
+
+import catalog
+import pricing
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+MATCH_ATTRS = ("kind", "item", "size", "crust", "group")
+REWARD_TYPES = ("amount_off", "percent_off_items", "bundle_price", "free_crust", "percent_off_cart")
+
+Result = namedtuple("Result", ["discount", "applied"])
+
+
+class Rule:
+    __slots__ = ("id", "name", "requirements", "reward", "amount", "days", "coupon",
+                 "min_subtotal", "max_applications", "stackable", "trigger_counts", "item_keys", "open_ended")
+
+    def __init__(self, definition):
+        self.id = definition.get("id") or definition.get("name")
+        self.name = definition.get("name", self.id)
+        if not self.id:
+            raise ValueError("Promotion is missing an id")
+
+        self.requirements = []
+        for requirement in definition.get("requires", []):
+            predicate = []
+            for attr, values in requirement.get("match", {}).items():
+                if attr not in MATCH_ATTRS:
+                    raise ValueError(f"Promotion {self.id}: unknown match key {attr!r}")
+                if not isinstance(values, list):
+                    values = [values]
+                predicate.append((attr, frozenset(values)))
+            predicate.sort(key=lambda pair: MATCH_ATTRS.index(pair[0]))
+            self.requirements.append((tuple(predicate), int(requirement.get("count", 1))))
+
+        reward = definition.get("reward", {})
+        self.reward = reward.get("type")
+        if self.reward not in REWARD_TYPES:
+            raise ValueError(f"Promotion {self.id}: unknown reward type {self.reward!r}")
+        self.amount = int(reward.get("cents", reward.get("percent", 0)))
+
+        self.days = frozenset(definition["days"]) if definition.get("days") else None
+        self.coupon = definition["coupon"].upper() if definition.get("coupon") else None
+        self.min_subtotal = int(definition.get("min_subtotal_cents", 0))
+        self.max_applications = 999 if definition.get("repeat") else 1
+        self.stackable = bool(definition.get("stackable"))
+
+        # How many units a cart needs of each requirement's single-valued attributes,
+        # e.g. (("item", "Charcoal"), ("size", "Large")), before the rule is worth checking.
+        self.trigger_counts = {}
+        self.open_ended = not self.requirements
+        for predicate, count in self.requirements:
+            key = tuple((attr, next(iter(values))) for attr, values in predicate if len(values) == 1)
+            if key:
+                self.trigger_counts[key] = self.trigger_counts.get(key, 0) + count
+            else:
+                self.open_ended = True
+        self.item_keys = list(self.trigger_counts.items())
+        if self.coupon:
+            self.trigger_counts[(("coupon", self.coupon),)] = 1
+
+    def triggered(self, key_counts):
+        for key, count in self.trigger_counts.items():
+            if key_counts.get(key, 0) < count:
+                return False
+        return True
+
+    def bound(self, key_counts, key_cents, key_crust, subtotal):
+        """A quick ceiling on what the rule can be worth for a cart, from per-key totals."""
+        if self.open_ended:
+            total = crust = subtotal
+        else:
+            total = crust = 0
+            for key, count in self.item_keys:
+                total += key_cents[key]
+                crust += key_crust[key]
+            if total > subtotal:
+                total = subtotal
+        if self.reward == "amount_off":
+            times = self.max_applications
+            for key, count in self.item_keys:
+                if key_counts[key] // count < times:
+                    times = key_counts[key] // count
+            return min(self.amount * times, total)
+        if self.reward == "percent_off_items":
+            return total * self.amount // 100
+        if self.reward == "bundle_price":
+            return total
+        if self.reward == "free_crust":
+            return crust
+        return 0
+
+    def value(self, taken, lines):
+        total = sum(lines[i][2] * qty for i, qty in taken)
+        if self.reward == "amount_off":
+            return min(self.amount, total)
+        if self.reward == "percent_off_items":
+            return total * self.amount // 100
+        if self.reward == "bundle_price":
+            return max(total - self.amount, 0)
+        if self.reward == "free_crust":
+            return sum(lines[i][3] * qty for i, qty in taken)
+        return 0
+
+
+def cart_lines(items):
+    """Flatten cart items into (attrs, quantity, unit_cents, crust_cents) lines."""
+    lines = []
+    for item in items:
+        if item.get("type") == "beverage" or ("beverage" in item and "size" not in item):
+            beverage = item.get("beverage")
+            quantity = item.get("beverage_quantity", 1)
+            group = "jarritos" if beverage in catalog.JARRITOS_FLAVORS else "coke"
+            attrs = {"kind": "beverage", "item": beverage, "group": group}
+            crust = 0
+        else:
+            name = item.get("specialty") or item.get("name") or ""
+            quantity = item.get("quantity", 1)
+            attrs = {"kind": "specialty" if name else "custom", "item": name or "custom",
+                     "size": item.get("size"), "crust": item.get("crust")}
+            crust = catalog.CRUST_CENTS.get(item.get("crust"), 0)
+        if quantity > 0:
+            lines.append((attrs, quantity, pricing.item_cents(item) // quantity, crust))
+    return lines
+
+
+def _matching_lines(predicate, lines, order, matching):
+    """Indices of the lines a predicate matches, dearest first; cached per cart."""
+    found = matching.get(predicate)
+    if found is None:
+        found = []
+        for i in order:
+            attrs = lines[i][0]
+            for attr, values in predicate:
+                if attrs.get(attr) not in values:
+                    break
+            else:
+                found.append(i)
+        matching[predicate] = found
+    return found
+
+
+def _take(rule, lines, order, matching, remaining):
+    """Use up units for one application of rule; returns the (line, quantity) pairs or None."""
+    taken = []
+    for predicate, count in rule.requirements:
+        need = count
+        for i in _matching_lines(predicate, lines, order, matching):
+            have = remaining[i]
+            if have:
+                used = need if need < have else have
+                remaining[i] = have - used
+                taken.append((i, used))
+                need -= used
+                if not need:
+                    break
+        if need:
+            for i, used in taken:
+                remaining[i] += used
+            return None
+    return taken
+
+
+class PromotionEngine:
+    def __init__(self, definitions=()):
+        self.rules = [Rule(definition) for definition in definitions]
+        self.index = {}
+        self.unindexed = []
+        self.coupons = {rule.coupon for rule in self.rules if rule.coupon}
+        self.keys = {key for rule in self.rules for key in rule.trigger_counts}
+        self._line_keys = {}
+        for rule in self.rules:
+            if rule.trigger_counts:
+                # Any one of its keys will do as the bucket; the rest are checked per cart.
+                self.index.setdefault(max(rule.trigger_counts, key=len), []).append(rule)
+            else:
+                self.unindexed.append(rule)
+
+    def has_coupon(self, code):
+        return code.strip().upper() in self.coupons
+
+    def line_keys(self, attrs):
+        """The trigger keys a line with these attributes counts towards; cached per kind of line."""
+        pairs = tuple((attr, attrs[attr]) for attr in MATCH_ATTRS if attr in attrs)
+        keys = self._line_keys.get(pairs)
+        if keys is None:
+            keys = [key for size in range(1, len(pairs) + 1)
+                    for key in combinations(pairs, size) if key in self.keys]
+            self._line_keys[pairs] = keys
+        return keys
+
+    def candidates(self, key_counts):
+        for key in key_counts:
+            yield from self.index.get(key, ())
+        yield from self.unindexed
+
+    def evaluate(self, items, coupon=None, day=None):
+        lines = cart_lines(items)
+        if not lines:
+            return Result(0, [])
+        subtotal = sum(unit * qty for attrs, qty, unit, crust in lines)
+        if day is None:
+            day = DAYS[datetime.date.today().weekday()]
+
+        # Count units (and their cents) under every trigger key each line matches,
+        # so any requirement's single-valued part can be looked up directly.
+        key_counts = {}
+        key_cents = {}
+        key_crust = {}
+        for attrs, qty, unit, crust in lines:
+            for key in self.line_keys(attrs):
+                key_counts[key] = key_counts.get(key, 0) + qty
+                key_cents[key] = key_cents.get(key, 0) + unit * qty
+                key_crust[key] = key_crust.get(key, 0) + crust * qty
+        if coupon:
+            key_counts[(("coupon", coupon.strip().upper()),)] = 1
+
+        # Candidates go on a heap by their ceiling value, so most are never fully checked.
+        heap = []
+        cart_rules = []
+        for n, rule in enumerate(self.candidates(key_counts)):
+            if not rule.triggered(key_counts):
+                continue
+            if rule.days is not None and day not in rule.days:
+                continue
+            if subtotal < rule.min_subtotal:
+                continue
+            if rule.reward == "percent_off_cart":
+                cart_rules.append(rule)
+                continue
+            bound = rule.bound(key_counts, key_cents, key_crust, subtotal)
+            if bound > 0:
+                heap.append((-bound, n, rule))
+        heapq.heapify(heap)
+
+        # Use the dearest units first so percentage rewards are worth the most.
+        order = sorted(range(len(lines)), key=lambda i: -lines[i][2])
+        quantities = [line[1] for line in lines]
+        matching = {}
+
+        # Greedy one application at a time, by what it is worth on the units still
+        # unclaimed. Worth only drops as units are used up, so the top of the heap is
+        # taken once its fresh value still beats every other ceiling; otherwise it goes
+        # back with the lower value. Repeatable rules go back after each application.
+        remaining = quantities[:]
+        left_units = sum(remaining)
+        earned = {}
+        while heap and left_units:
+            ceiling, n, rule = heapq.heappop(heap)
+            taken = _take(rule, lines, order, matching, remaining)
+            if taken is None:
+                continue
+            value = rule.value(taken, lines)
+            if value <= 0 or (heap and value < -heap[0][0]):
+                for i, used in taken:
+                    remaining[i] += used
+                if value > 0:
+                    heapq.heappush(heap, (-value, n, rule))
+                continue
+            left_units -= sum(used for i, used in taken)
+            times, total = earned.get(rule, (0, 0))
+            earned[rule] = (times + 1, total + value)
+            if times + 1 < rule.max_applications:
+                heapq.heappush(heap, (-value, n, rule))
+        best_applied = [(rule.name, total) for rule, (times, total) in earned.items()]
+        best_discount = sum(value for name, value in best_applied)
+
+        # Cart-wide percentages apply to what is left; only stackable ones combine.
+        left = subtotal - best_discount
+        applied = list(best_applied)
+        best_single = None
+        for rule in cart_rules:
+            if rule.requirements and _take(rule, lines, order, matching, quantities[:]) is None:
+                continue
+            value = left * rule.amount // 100
+            if rule.stackable:
+                applied.append((rule.name, value))
+            elif best_single is None or value > best_single[1]:
+                best_single = (rule.name, value)
+        if best_single:
+            applied.append(best_single)
+
+        discount = min(sum(value for name, value in applied), subtotal)
+        return Result(discount, applied)
+
+
+def load_rules(path="promotions.json"):
+    try:
+        with open(path, "r") as f:
+            return PromotionEngine(json.load(f))
+    except FileNotFoundError:
+        return PromotionEngine()
+
+
+def _bench(rule_count=1000, carts=2000):
+    rng = random.Random(7)
+    specialties = [item["name"] for item in catalog.SPECIALTIES]
+    definitions = []
+    for n in range(rule_count):
+        kind = rng.random()
+        if kind < 0.4:
+            requires = [{"match": {"item": rng.choice(specialties), "size": rng.choice(catalog.SIZES)}, "count": rng.randint(1, 3)}]
+        elif kind < 0.7:
+            requires = [{"match": {"item": rng.choice(specialties)}, "count": rng.randint(1, 2)},
+                        {"match": {"item": rng.choice(catalog.BEVERAGES)}, "count": rng.randint(1, 4)}]
+        else:
+            requires = [{"match": {"group": rng.choice(["coke", "jarritos"])}, "count": rng.randint(2, 6)}]
+        reward = rng.choice([{"type": "amount_off", "cents": rng.randint(100, 800)},
+                             {"type": "percent_off_items", "percent": rng.randint(5, 30)},
+                             {"type": "free_crust"}])
+        definition = {"id": f"rule-{n}", "requires": requires, "reward": reward}
+        if rng.random() < 0.2:
+            definition["days"] = [rng.choice(DAYS)]
+        if rng.random() < 0.1:
+            definition = {"id": f"coupon-{n}", "coupon": f"CODE{n}", "reward": {"type": "percent_off_cart", "percent": rng.randint(5, 20)}}
+        definitions.append(definition)
+
+    started = time.perf_counter()
+    engine = PromotionEngine(definitions)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    sample = []
+    for _ in range(carts):
+        cart = []
+        for _ in range(rng.randint(1, 6)):
+            cart.append({"type": "pizza", "size": rng.choice(catalog.SIZES), "crust": rng.choice(catalog.CRUSTS), "toppings": [],
+                         "quantity": rng.randint(1, 3), "specialty": rng.choice(specialties)})
+        for _ in range(rng.randint(0, 3)):
+            cart.append({"type": "beverage", "beverage": rng.choice(catalog.BEVERAGES), "beverage_quantity": rng.randint(1, 6)})
+        sample.append((cart, f"CODE{rng.randrange(rule_count)}" if rng.random() < 0.3 else None))
+
+    started = time.perf_counter()
+    for cart, coupon in sample:
+        engine.evaluate(cart, coupon=coupon, day="Tue")
+    per_cart = (time.perf_counter() - started) * 1000 / carts
+
+    print(f"Compiled {rule_count} rules in {compile_ms:.1f} ms")
+    print(f"Evaluated {carts} carts: {per_cart:.3f} ms per cart")
+    return per_cart
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        sys.exit(0 if _bench() < 1.0 else 1)
+    engine = load_rules(sys.argv[1] if len(sys.argv) > 1 else "promotions.json")
+    print(f"{len(engine.rules)} promotions loaded")
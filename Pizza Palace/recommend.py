@@ -0,0 +1,299 @@
+"""
+Title: Pizza Palace Recommendations
+File: recommend.py
+Author: Joshua Nobel
+
+"Frequently ordered together" suggestions for the cart screen, e.g. a
+Fruit Punch with a Flaming Pork.
+
+The index is a square matrix over the catalog (every specialty, topping
+and beverage), held as one flat array of 32-bit counts: cell [a][b] is how
+many orders had both a and b, and [a][a] how many had a. Placing an order
+bumps the cells for each pair of distinct catalog items in it. Each row's
+candidates are ranked once and kept until an order touches that row, so
+suggesting for a cart is a merge of a few short ranked lists, and carts
+seen since the last order are answered from a cache.
+
+Only specialties and beverages are suggested, since those are what the
+cart can add; toppings count towards what a build-your-own pizza goes
+with. A suggestion is the item most often bought by customers who bought
+something in the cart (the highest share of orders), among those seen
+together at least MIN_TOGETHER times.
+
+The matrix is kept in a small binary file beside the store. Each terminal
+keeps the counts it has added since it last saved and adds them to
+whatever is on disk under the store's file lock, so terminals sharing a
+store don't overwrite each other's counts.
+
+Usage:
+    python recommend.py build --store users.json      rebuild the index from every stored order
+    python recommend.py suggest "Flaming Pork"        what the index suggests for a cart
+    python recommend.py bench                         time updates and lookups
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import struct
+import sys
+import time
+from array import array
+
+import catalog
+import store
+
+MAGIC = b"PPCO"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+
+MIN_TOGETHER = 2
+SUGGESTIONS = 3
+# Orders a terminal counts before adding them to the file; the rest go when it closes.
+SAVE_EVERY = 10
+
+SPECIALTY_NAMES = [item["name"] for item in catalog.SPECIALTIES]
+ITEMS = ([("specialty", name) for name in SPECIALTY_NAMES] + [("topping", name) for name in catalog.TOPPINGS]
+         + [("beverage", name) for name in catalog.BEVERAGES])
+
+
+def index_path(store_path):
+    return os.path.splitext(store_path.rstrip("/\\"))[0] + ".cooccur"
+
+
+class Recommender:
+    def __init__(self, path=None, items=ITEMS):
+        self.path = path
+        self.items = list(items)
+        self.positions = {item: n for n, item in enumerate(self.items)}
+        self.size = len(self.items)
+        self.counts = array("I", bytes(4 * self.size * self.size))
+        # What this terminal has added since it last saved.
+        self.added = array("I", bytes(4 * self.size * self.size))
+        self.unsaved = 0
+        self.suggestable = [n for n, (kind, name) in enumerate(self.items) if kind != "topping"]
+        self._ranked = {}
+        self._cache = {}
+        if path is not None:
+            self.counts = self._read() or self.counts
+
+    def positions_in(self, items):
+        """The matrix positions of the catalog items in a cart, each once."""
+        found = set()
+        for item in items:
+            if item.get("type") == "beverage" or ("beverage" in item and "size" not in item):
+                found.add(self.positions.get(("beverage", item.get("beverage"))))
+                continue
+            name = item.get("specialty") or item.get("name")
+            if name:
+                found.add(self.positions.get(("specialty", name)))
+            for topping in item.get("toppings", []):
+                found.add(self.positions.get(("topping", topping)))
+        found.discard(None)
+        return sorted(found)
+
+    def add_order(self, items):
+        """Count one placed order: O(k^2) for the k distinct catalog items in it, a handful at most."""
+        positions = self.positions_in(items)
+        size, counts, added = self.size, self.counts, self.added
+        for a in positions:
+            row = a * size
+            for b in positions:
+                counts[row + b] += 1
+                added[row + b] += 1
+            self._ranked.pop(a, None)
+        self.unsaved += 1
+        self._cache.clear()
+
+    def ranked(self, a):
+        """[(score, b)] for the suggestable items bought with a, best first."""
+        found = self._ranked.get(a)
+        if found is None:
+            row = a * self.size
+            seen = self.counts[row + a]
+            found = sorted((((self.counts[row + b] / seen, self.counts[row + b]), b) for b in self.suggestable
+                            if b != a and self.counts[row + b] >= MIN_TOGETHER), reverse=True) if seen else []
+            self._ranked[a] = found
+        return found
+
+    def suggest(self, items, limit=SUGGESTIONS):
+        """Up to limit (kind, name) catalog items to suggest for a cart, best first."""
+        in_cart = tuple(self.positions_in(items))
+        found = self._cache.get((in_cart, limit))
+        if found is not None:
+            return found
+        scores = {}
+        for a in in_cart:
+            taken = 0
+            # Only the row's best few outside the cart can make the cut.
+            for score, b in self.ranked(a):
+                if b in in_cart:
+                    continue
+                if score > scores.get(b, (0, 0)):
+                    scores[b] = score
+                taken += 1
+                if taken == limit:
+                    break
+        best = sorted(scores, key=lambda b: (scores[b], -b), reverse=True)[:limit]
+        found = self._cache[(in_cart, limit)] = [self.items[b] for b in best]
+        return found
+
+    def _read(self):
+        """The counts on disk, mapped onto this catalog; None if there is no index file yet."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) < HEADER.size:
+            raise ValueError(f"{self.path} is not a version {VERSION} recommendation index")
+        magic, version, _, names_length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} recommendation index")
+        try:
+            names = [tuple(item) for item in json.loads(data[HEADER.size:HEADER.size + names_length])]
+        except (TypeError, UnicodeDecodeError, ValueError):
+            names = None
+        if names is None or not all(len(item) == 2 and all(isinstance(part, str) for part in item) for item in names):
+            raise ValueError(f"{self.path} has a damaged catalog list")
+        if len(data) != HEADER.size + names_length + 4 * len(names) * len(names):
+            raise ValueError(f"{self.path} is cut short or damaged; rebuild it with recommend.py build")
+        stored = array("I")
+        stored.frombytes(data[HEADER.size + names_length:])
+        if sys.byteorder == "big":
+            stored.byteswap()
+        if names == self.items:
+            return stored
+        # The catalog has changed since the file was written; keep what still sells.
+        counts = array("I", bytes(4 * self.size * self.size))
+        mapped = [(n, self.positions[item]) for n, item in enumerate(names) if item in self.positions]
+        for a, new_a in mapped:
+            for b, new_b in mapped:
+                counts[new_a * self.size + new_b] = stored[a * len(names) + b]
+        return counts
+
+    def _write(self, counts):
+        names = json.dumps(self.items).encode("utf-8")
+        data = array("I", counts)
+        if sys.byteorder == "big":
+            data.byteswap()
+        store.atomic_write(self.path, [HEADER.pack(MAGIC, VERSION, 0, len(names)), names, data.tobytes()])
+
+    def save(self):
+        """Add this terminal's new counts to the index file, and pick up everyone else's."""
+        if self.path is None or not self.unsaved:
+            return
+        with store.file_lock(self.path):
+            counts = self._read() or array("I", bytes(4 * self.size * self.size))
+            for n, value in enumerate(self.added):
+                if value:
+                    counts[n] += value
+            self._write(counts)
+        self.counts = counts
+        self.added = array("I", bytes(4 * self.size * self.size))
+        self.unsaved = 0
+        self._ranked.clear()
+        self._cache.clear()
+
+    def rebuild(self, orders):
+        """Replace the index with counts over orders (carts of items), e.g. from stored_orders()."""
+        self.counts = array("I", bytes(4 * self.size * self.size))
+        self.added = array("I", bytes(4 * self.size * self.size))
+        total = 0
+        for items in orders:
+            self.add_order(items)
+            total += 1
+        with store.file_lock(self.path):
+            self._write(self.counts)
+        self.added = array("I", bytes(4 * self.size * self.size))
+        self.unsaved = 0
+        return total
+
+
+def stored_orders(path):
+    """Every order in the store at path, as a list of cart items, read a record at a time."""
+    if store.is_sqlite(path):
+        conn = sqlite3.connect(path)
+        last_id, items = None, []
+        for order_id, data in conn.execute("SELECT order_id, data FROM line_items ORDER BY order_id, position"):
+            if order_id != last_id and items:
+                yield items
+                items = []
+            last_id = order_id
+            items.append(json.loads(data))
+        if items:
+            yield items
+        conn.close()
+        return
+    target = store.open_store(path)
+    # Customers' orders are in their histories; guests' are only in the order book.
+    for file in target.user_files:
+        for username, user in file.records():
+            yield from user.get("order_history", [])
+    for file in target.order_files:
+        for order_id, order in file.records():
+            if order.get("username") is None:
+                yield order["items"]
+    target.close()
+
+
+def _bench(orders=20000, lookups=100000):
+    import random
+    rng = random.Random(1)
+    recommender = Recommender()
+    carts = []
+    for _ in range(orders):
+        cart = [{"type": "pizza", "specialty": rng.choice(SPECIALTY_NAMES), "toppings": []},
+                {"type": "pizza", "specialty": "", "toppings": rng.sample(catalog.TOPPINGS, 3)},
+                {"type": "beverage", "beverage": rng.choice(catalog.BEVERAGES)}]
+        carts.append(cart)
+    started = time.perf_counter()
+    for cart in carts:
+        recommender.add_order(cart)
+    updated = (time.perf_counter() - started) / orders * 1e6
+
+    started = time.perf_counter()
+    for n in range(lookups // 100):
+        recommender._cache.clear()
+        recommender.suggest(carts[n % orders])
+    cold = (time.perf_counter() - started) / (lookups // 100) * 1e6
+
+    started = time.perf_counter()
+    for n in range(lookups // 100):
+        recommender._ranked.clear()
+        recommender._cache.clear()
+        recommender.suggest(carts[n % orders])
+    after_order = (time.perf_counter() - started) / (lookups // 100) * 1e6
+
+    started = time.perf_counter()
+    for n in range(lookups):
+        recommender.suggest(carts[n % 10])
+    warm = (time.perf_counter() - started) / lookups * 1e6
+    print(f"{recommender.size}x{recommender.size} matrix, {recommender.size ** 2 * 4} bytes")
+    print(f"add_order {updated:.1f} us")
+    print(f"suggest {cold:.1f} us for a new cart, {after_order:.1f} us with every row re-ranked, "
+          f"{warm:.1f} us for a cart seen since the last order")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pizza Palace frequently-ordered-together index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="rebuild the index from every stored order")
+    build.add_argument("--store", default="users.json")
+    suggest = commands.add_parser("suggest", help="suggestions for a cart of specialties and beverages")
+    suggest.add_argument("--store", default="users.json")
+    suggest.add_argument("names", nargs="+")
+    commands.add_parser("bench", help="time updates and lookups")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        _bench()
+    elif args.command == "build":
+        started = time.perf_counter()
+        total = Recommender(index_path(args.store)).rebuild(stored_orders(args.store))
+        print(f"Indexed {total} orders into {index_path(args.store)} in {time.perf_counter() - started:.1f} s")
+    else:
+        cart = [{"type": "beverage", "beverage": name} if name in catalog.BEVERAGES else {"specialty": name}
+                for name in args.names]
+        for kind, name in Recommender(index_path(args.store)).suggest(cart):
+            print(f"{name} ({kind})")
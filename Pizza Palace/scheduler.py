@@ -0,0 +1,149 @@
+"""
+Title: Pizza Palace Scheduler
+File: scheduler.py
+Author: Joshua Nobel
+
+All of the GUI's periodic work (countdowns, the kitchen display's clock,
+the couriers on the Track Order map) runs from one root.after chain per
+Tk interpreter, rather than each screen keeping its own.
+
+    every(interval_ms, callback, owner)    run callback(now) every interval
+    cancel(owner)                          stop everything owner started
+
+Jobs due within SLACK_MS of each other run in the same wake-up, so a 1 s
+countdown and a 100 ms animation wake Tk ten times a second, not eleven.
+Each job keeps to its own grid of due times on the monotonic clock, so it
+doesn't drift however late a wake-up comes; if Tk was busy for longer than
+an interval the missed ticks are skipped, not run in a burst. Callbacks
+get time.time() (the same value for every job in a wake-up), which is the
+clock the kitchen and the delivery planner use.
+
+An owner is anything hashable, e.g. (app, "track_order") for a screen. A
+job whose widgets have been destroyed (its callback raises TclError) is
+dropped rather than left to fail every tick.
+"""
+
+import heapq
+import time
+import tkinter as tk
+
+SLACK_MS = 5
+
+
+class Job:
+    __slots__ = ("scheduler", "interval", "callback", "owner", "due", "cancelled")
+
+    def __init__(self, scheduler, interval, callback, owner, due):
+        self.scheduler = scheduler
+        self.interval = interval
+        self.callback = callback
+        self.owner = owner
+        self.due = due
+        self.cancelled = False
+
+    def cancel(self):
+        self.scheduler.cancel_job(self)
+
+
+class Scheduler:
+    def __init__(self, root, slack_ms=SLACK_MS):
+        self.root = root
+        self.slack = slack_ms / 1000
+        self.jobs = []
+        self.owners = {}
+        self.scheduled = 0
+        self.cancelled = 0
+        self.after_id = None
+        self.wake_at = None
+        # The job whose callback is running; it is out of the heap until it is due again.
+        self.running = None
+
+    def every(self, interval_ms, callback, owner=None, delay_ms=0):
+        """Run callback(now) every interval_ms, the first time after delay_ms; returns the Job."""
+        job = Job(self, interval_ms / 1000, callback, owner, time.monotonic() + delay_ms / 1000)
+        self.owners.setdefault(owner, set()).add(job)
+        self._push(job)
+        self._arm()
+        return job
+
+    def cancel(self, owner):
+        """Stop every job owner started."""
+        for job in list(self.owners.get(owner, ())):
+            self.cancel_job(job)
+
+    def cancel_job(self, job):
+        if job.cancelled:
+            return
+        job.cancelled = True
+        if job is not self.running:
+            self.cancelled += 1
+        jobs = self.owners.get(job.owner)
+        if jobs is not None:
+            jobs.discard(job)
+            if not jobs:
+                del self.owners[job.owner]
+        # Cancelled jobs are left in the heap until they come up, unless they are most of it.
+        if self.cancelled > len(self.jobs) // 2:
+            self.jobs = [entry for entry in self.jobs if not entry[2].cancelled]
+            heapq.heapify(self.jobs)
+            self.cancelled = 0
+        self._arm()
+
+    def _push(self, job):
+        # The count keeps jobs due at the same moment in the order they were started.
+        self.scheduled += 1
+        heapq.heappush(self.jobs, (job.due, self.scheduled, job))
+
+    def _arm(self):
+        if self.running is not None:
+            # _wake arms once it has run everything due.
+            return
+        while self.jobs and self.jobs[0][2].cancelled:
+            heapq.heappop(self.jobs)
+            self.cancelled -= 1
+        if not self.jobs:
+            if self.after_id is not None:
+                self.root.after_cancel(self.after_id)
+                self.after_id = None
+            return
+        due = self.jobs[0][0]
+        if self.after_id is not None:
+            if self.wake_at <= due:
+                return
+            self.root.after_cancel(self.after_id)
+        self.wake_at = due
+        self.after_id = self.root.after(max(int((due - time.monotonic()) * 1000), 0), self._wake)
+
+    def _wake(self):
+        self.after_id = None
+        started = time.monotonic()
+        now = time.time()
+        while self.jobs and self.jobs[0][0] <= started + self.slack:
+            due, _, job = heapq.heappop(self.jobs)
+            if job.cancelled:
+                self.cancelled -= 1
+                continue
+            self.running = job
+            try:
+                job.callback(now)
+            except tk.TclError:
+                # Its widgets are gone.
+                self.cancel_job(job)
+            finally:
+                self.running = None
+            if job.cancelled:
+                continue
+            job.due = due + job.interval
+            if job.due <= started:
+                job.due += ((started - job.due) // job.interval + 1) * job.interval
+            self._push(job)
+        self._arm()
+
+
+def shared(widget):
+    """The scheduler for widget's Tk interpreter, so every window in the process shares one."""
+    root = widget.nametowidget(".")
+    found = getattr(root, "pizza_scheduler", None)
+    if found is None:
+        found = root.pizza_scheduler = Scheduler(root)
+    return found
@@ -0,0 +1,1107 @@
+"""
+Title: Pizza Palace User Store
+File: store.py
+Author: Joshua Nobel
+
+Where accounts and order history live. The GUI only talks to a UserStore;
+open_store() picks the implementation from the file name:
+
+    users.json   JsonUserStore, the original single JSON document
+    users.db     SqliteUserStore, users, orders and line items in their own
+                 indexed tables, so placing an order is one small transaction
+                 however many orders are already stored
+    users.d/     ShardedJsonUserStore, users hashed over 64 JSON files
+
+The GUI wraps whichever it opens in a WriteBehindStore, which does the
+writing on a background thread.
+
+The JSON stores are safe to share between terminals: every change takes a
+file lock, re-reads the file, and replaces it with a temp file rename, so
+concurrent checkouts never lose an order and a crash never leaves half a
+file behind. Sharding gives each group of customers its own lock.
+
+Each JSON file has a sorted username index beside it (users.json.idx), so
+logging in or checking a name reads one customer's record rather than
+parsing every account the shop has ever had. The index also locates each
+order, so order_page() reads only the page of history on screen. Older
+pages come from a packed archive of the history (users.opk, see
+orderpack.py) when there is one.
+
+Writes are another matter: placing an order rewrites the whole of each
+JSON file it touches (users.json, users.orders.json, users.lookup.json and
+their indexes), so with one file a checkout costs more with every order
+the shop has ever taken. users.json suits a small shop; a large one should
+run on users.db, or on users.d where each file holds a 64th of it, after a
+one-off "python store.py import users.json users.db".
+
+Usage:
+    python store.py import users.json users.db     one-shot copy of a JSON store into SQLite (or users.d)
+    python store.py stress --layout sharded --writers 8     concurrent terminals; fails if an order is lost
+"""
+
+import argparse
+import itertools
+import json
+import mmap
+import os
+import queue
+import secrets
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+import pricing
+
+
+PAGE_SIZE = 10
+
+# orders are (number, items) pairs, newest first; a customer's first order is number 1.
+# older and newer are the before= cursors for the neighbouring pages, or None at either end.
+Page = namedtuple("Page", ["orders", "total", "older", "newer"])
+
+
+def page_range(total, before, limit):
+    """Clamp a before= cursor; the page holds order numbers low + 1 to before."""
+    before = total if before is None else max(0, min(before, total))
+    return before, max(before - limit, 0)
+
+
+def make_page(orders, total, before, low, limit):
+    return Page(orders, total, low if low > 0 else None, min(before + limit, total) if before < total else None)
+
+
+# Order ids are read out over the phone, so leave out 0/O and 1/I/L.
+ORDER_ID_CHARS = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
+
+
+def new_order_id():
+    """
+    The time in hex and six random characters; unique without the terminals having to
+    agree on a counter. Flat out at 400 orders a second, two would clash about every three
+    hours; the store refuses the second rather than overwrite the first.
+    """
+    return f"{int(time.time()):X}-{''.join(secrets.choice(ORDER_ID_CHARS) for _ in range(6))}"
+
+
+def new_order(username, items, name="", phone="", address=""):
+    return {"id": new_order_id(), "placed_at": time.time(), "username": username,
+            "name": name, "phone": phone, "address": address, "items": list(items)}
+
+
+def phone_key(phone):
+    return "".join(ch for ch in phone if ch.isdigit())
+
+
+def name_key(name):
+    return " ".join(name.casefold().split())
+
+
+def lookup_keys(order):
+    """The secondary index keys an order is filed under."""
+    keys = []
+    if phone_key(order.get("phone", "")):
+        keys.append("phone:" + phone_key(order["phone"]))
+    if name_key(order.get("name", "")):
+        keys.append("name:" + name_key(order["name"]))
+    return keys
+
+
+def order_items(change):
+    """The cart items a queued add_order or record_order change adds to its user's history."""
+    method, username, arg = change
+    if method == "add_order":
+        return list(arg)
+    if method == "record_order" and username is not None:
+        return list(arg["items"])
+    return None
+
+
+class UserStore:
+    """
+    get_user(username) returns {"password": ..., "order_history": [...]} or None.
+    Orders are lists of cart items, oldest first.
+    """
+
+    def get_user(self, username):
+        raise NotImplementedError
+
+    def user_exists(self, username):
+        return self.get_user(username) is not None
+
+    def check_password(self, username, password):
+        user = self.get_user(username)
+        return user is not None and user["password"] == password
+
+    def add_user(self, username, password):
+        """Create an account; returns False if the username is taken."""
+        raise NotImplementedError
+
+    def add_order(self, username, items):
+        raise NotImplementedError
+
+    def orders(self, username):
+        raise NotImplementedError
+
+    def order_count(self, username):
+        return len(self.orders(username))
+
+    def record_order(self, username, order):
+        """
+        Keep a placed order (see new_order) so it can be found by id, phone number or
+        name, adding its items to username's history unless username is None (a guest).
+        """
+        raise NotImplementedError
+
+    def find_order(self, order_id):
+        raise NotImplementedError
+
+    def find_orders(self, phone=None, name=None, limit=20):
+        """Orders placed under a phone number or customer name, newest first."""
+        raise NotImplementedError
+
+    def order_page(self, username, before=None, limit=PAGE_SIZE):
+        """The orders numbered up to before (default: the newest), newest first, limit at a time."""
+        orders = self.orders(username)
+        before, low = page_range(len(orders), before, limit)
+        return make_page([(number, orders[number - 1]) for number in range(before, low, -1)], len(orders), before, low, limit)
+
+    def apply(self, changes):
+        """
+        Apply a batch of ("add_user", username, password), ("add_order", username, items)
+        and ("record_order", username, order) changes; returns one result per change:
+        True, False (name taken) or the exception.
+        """
+        results = []
+        for method, username, arg in changes:
+            try:
+                result = getattr(self, method)(username, arg)
+                results.append(True if result is None else result)
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def import_users(self, users):
+        """Copy a users.json document in, skipping names already taken; returns (users added, orders added)."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path + ".lock", shared with every other process using it."""
+    with open(path + ".lock", "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ten seconds; keep waiting.
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write(path, chunks):
+    """Write bytes to a temp file beside path and rename it over path, so readers never see half a file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    for attempt in range(50):
+        try:
+            os.replace(tmp_path, path)
+            return
+        except PermissionError:
+            # Windows refuses while another process has the file open for reading.
+            time.sleep(0.01)
+    os.replace(tmp_path, path)
+
+
+INDEX_VERSION = 2
+
+
+def _signature(stat):
+    return b"#%d %d %d %d\n" % (INDEX_VERSION, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+def _search_index(index, start, key):
+    """Binary search the sorted key<TAB>offset<TAB>length[<TAB>count] lines of index[start:] for key."""
+    lo, hi = start, len(index)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        newline = index.rfind(b"\n", lo, mid)
+        line_start = newline + 1 if newline >= 0 else lo
+        line_end = index.find(b"\n", line_start)
+        fields = index[line_start:line_end].split(b"\t")
+        if fields[0] == key:
+            return tuple(int(field) for field in fields[1:])
+        if fields[0] < key:
+            lo = line_end + 1
+        else:
+            hi = line_start
+    return None
+
+
+def _user_key(username):
+    return json.dumps(username).encode("ascii")
+
+
+def _order_key(username, number):
+    # The closing quote of the JSON string keeps these apart from any username.
+    return b"%s#%d" % (_user_key(username), number)
+
+
+STALE = object()
+
+
+class JsonFile:
+    """
+    One JSON object on disk, keyed by username, with a sorted index beside it
+    (path + ".idx"). The index gives the byte offset and length of every
+    user's record, how many orders they have, and where each of those orders
+    sits inside the record. Lookups binary search the index on disk and read
+    only the bytes asked for, so they cost the same however many customers,
+    or orders, are stored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _lookup(self, keys, read):
+        """
+        The index entries for keys, or with read the JSON they point at; None for
+        keys that aren't there. STALE if the index doesn't match the file.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return [None] * len(keys)
+        with f:
+            signature = _signature(os.fstat(f.fileno()))
+            try:
+                with open(self.index_path, "rb") as index_file:
+                    if index_file.readline() != signature:
+                        return STALE
+                    start = index_file.tell()
+                    if os.fstat(index_file.fileno()).st_size == start:
+                        return [None] * len(keys)
+                    with mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index:
+                        found = [_search_index(index, start, key) for key in keys]
+            except FileNotFoundError:
+                return STALE
+            if not read:
+                return found
+            records = []
+            for entry in found:
+                if entry is None:
+                    records.append(None)
+                else:
+                    f.seek(entry[0])
+                    records.append(json.loads(f.read(entry[1])))
+            return records
+
+    def lookup(self, keys, read=True):
+        found = self._lookup(keys, read)
+        if found is STALE:
+            # Written by something that doesn't keep the index (or an older version);
+            # rewrite it in the indexed layout once. No one else writes while we hold the lock.
+            with file_lock(self.path):
+                found = self._lookup(keys, read)
+                if found is STALE:
+                    self.write(self.load())
+                    found = self._lookup(keys, read)
+        return found
+
+    def records(self):
+        """Every (key, record) pair, read a line at a time rather than loading the whole file."""
+        # Make sure the file is in the one-record-per-line layout write() produces.
+        self.lookup([], read=False)
+        try:
+            f = open(self.path, "r")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                line = line.strip().rstrip(",")
+                if line in ("{", "}", ""):
+                    continue
+                yield json.loads("{" + line + "}").popitem()
+
+    def get(self, username):
+        return self.lookup([_user_key(username)])[0]
+
+    def contains(self, username):
+        return self.lookup([_user_key(username)], read=False)[0] is not None
+
+    def order_count(self, username):
+        entry = self.lookup([_user_key(username)], read=False)[0]
+        return entry[2] if entry else 0
+
+    def get_orders(self, username, numbers):
+        """Orders by number (the oldest is 1), read without the rest of the user's record."""
+        return self.lookup([_order_key(username, number) for number in numbers])
+
+    def write(self, data):
+        """Write data one record per line, then the index of where each record sits. Call with the lock held."""
+        entries = []
+
+        def records():
+            position = 1
+            yield b"{"
+            for n, (username, user) in enumerate(data.items()):
+                key = _user_key(username)
+                head = b"%s\n%s: " % (b"," if n else b"", key)
+                position += len(head)
+                yield head
+                start = position
+                if not isinstance(user, dict) or "order_history" not in user:
+                    chunk = json.dumps(user).encode("ascii")
+                    position += len(chunk)
+                    yield chunk
+                    entries.append((key, start, len(chunk), 0))
+                    continue
+
+                # The record is the user's JSON with order_history last, written an order at a time.
+                orders = user["order_history"]
+                rest = json.dumps({name: value for name, value in user.items() if name != "order_history"})
+                chunk = (rest[:-1] + (", " if len(rest) > 2 else "") + '"order_history": [').encode("ascii")
+                for number, order in enumerate(orders, 1):
+                    if number > 1:
+                        chunk += b", "
+                    position += len(chunk)
+                    yield chunk
+                    chunk = json.dumps(order).encode("ascii")
+                    entries.append((_order_key(username, number), position, len(chunk)))
+                chunk += b"]}"
+                position += len(chunk)
+                yield chunk
+                entries.append((key, start, position - start, len(orders)))
+            yield b"\n}\n"
+
+        atomic_write(self.path, records())
+        entries.sort()
+        lines = (b"\t".join([entry[0]] + [b"%d" % value for value in entry[1:]]) + b"\n" for entry in entries)
+        atomic_write(self.index_path, itertools.chain([_signature(os.stat(self.path))], lines))
+
+    def update(self, change):
+        """Run change(data) on a fresh copy under the lock and write it back; returns change's result."""
+        with file_lock(self.path):
+            data = self.load()
+            result = change(data)
+            if result is not False:
+                self.write(data)
+        return result
+
+
+def _add_user(users, username, password):
+    if username in users:
+        return False
+    users[username] = {"password": password, "order_history": []}
+    return True
+
+
+def _add_order(users, username, items):
+    if username not in users:
+        return KeyError(f"No such user {username!r}")
+    users[username].setdefault("order_history", []).append(list(items))
+    return True
+
+
+def _keep_order(orders, order):
+    if order["id"] in orders:
+        return KeyError(f"Order {order['id']} already exists")
+    orders[order["id"]] = order
+    return True
+
+
+def _file_order(lookup, key, order_id):
+    lookup.setdefault(key, {"orders": []})["orders"].append(order_id)
+    return True
+
+
+class JsonUserStore(UserStore):
+    """
+    Users in one JSON file. Placed orders go in a second file keyed by order
+    id, and a third maps "phone:<digits>" and "name:<name>" to order ids.
+    Every write rewrites those files whole; see the module docstring for
+    the layouts to use once a shop has a lot of orders.
+    """
+
+    def __init__(self, path="users.json"):
+        self.path = path
+        base = os.path.splitext(path)[0]
+        self.user_files = [JsonFile(path)]
+        self.order_files = [JsonFile(base + ".orders.json")]
+        self.lookup_files = [JsonFile(base + ".lookup.json")]
+
+    @staticmethod
+    def shard(files, key):
+        return files[zlib.crc32(key.encode("utf-8")) % len(files)]
+
+    def file_for(self, username):
+        return self.shard(self.user_files, username)
+
+    def get_user(self, username):
+        return self.file_for(username).get(username)
+
+    def user_exists(self, username):
+        return self.file_for(username).contains(username)
+
+    def order_count(self, username):
+        return self.file_for(username).order_count(username)
+
+    def order_page(self, username, before=None, limit=PAGE_SIZE):
+        file = self.file_for(username)
+        total = file.order_count(username)
+        before, low = page_range(total, before, limit)
+        numbers = list(range(before, low, -1))
+        orders = [(number, order or []) for number, order in zip(numbers, file.get_orders(username, numbers))]
+        return make_page(orders, total, before, low, limit)
+
+    def add_user(self, username, password):
+        return self.apply([("add_user", username, password)])[0]
+
+    def add_order(self, username, items):
+        result = self.apply([("add_order", username, items)])[0]
+        if isinstance(result, Exception):
+            raise result
+
+    def record_order(self, username, order):
+        result = self.apply([("record_order", username, order)])[0]
+        if isinstance(result, Exception):
+            raise result
+
+    def find_order(self, order_id):
+        return self.shard(self.order_files, order_id).get(order_id)
+
+    def find_orders(self, phone=None, name=None, limit=20):
+        key = "phone:" + phone_key(phone) if phone else "name:" + name_key(name or "")
+        entry = self.shard(self.lookup_files, key).get(key)
+        if entry is None:
+            return []
+        ids = list(dict.fromkeys(entry["orders"][::-1]))[:limit]
+        return [order for order in map(self.find_order, ids) if order is not None]
+
+    def apply(self, changes):
+        """Like UserStore.apply, but with one locked read and write per file for the whole batch."""
+        results = [True] * len(changes)
+        # Order files first, so an order refused there (a duplicate id) never reaches
+        # the customer's history or the lookup; a change that fails stops there.
+        orders_by_file, users_by_file, lookups_by_file = {}, {}, {}
+        for n, (method, username, arg) in enumerate(changes):
+            if method == "add_user":
+                users_by_file.setdefault(self.file_for(username), []).append(
+                    (n, lambda users, username=username, password=arg: _add_user(users, username, password)))
+            elif method == "add_order" or username is not None:
+                items = arg if method == "add_order" else arg["items"]
+                users_by_file.setdefault(self.file_for(username), []).append(
+                    (n, lambda users, username=username, items=items: _add_order(users, username, items)))
+            if method == "record_order":
+                order = arg
+                orders_by_file.setdefault(self.shard(self.order_files, order["id"]), []).append(
+                    (n, lambda orders, order=order: _keep_order(orders, order)))
+                for key in lookup_keys(order):
+                    lookups_by_file.setdefault(self.shard(self.lookup_files, key), []).append(
+                        (n, lambda lookup, key=key, order_id=order["id"]: _file_order(lookup, key, order_id)))
+
+        def change(data, ops):
+            changed = False
+            for n, op in ops:
+                if results[n] is not True:
+                    continue
+                result = op(data)
+                if result is None or result is True:
+                    changed = True
+                else:
+                    results[n] = result
+            # Nothing changed, nothing to write.
+            return changed
+
+        for by_file in (orders_by_file, users_by_file, lookups_by_file):
+            for file, ops in by_file.items():
+                if all(results[n] is not True for n, op in ops):
+                    continue
+                try:
+                    file.update(lambda data: change(data, ops))
+                except Exception as e:
+                    for n, op in ops:
+                        if results[n] is True:
+                            results[n] = e
+        return results
+
+    def orders(self, username):
+        user = self.get_user(username)
+        return user.get("order_history", []) if user else []
+
+    def import_users(self, users):
+        by_file = {}
+        for username, user in users.items():
+            by_file.setdefault(self.file_for(username), {})[username] = user
+
+        def change(existing, incoming):
+            added = [name for name in incoming if name not in existing]
+            for name in added:
+                existing[name] = incoming[name]
+            return added
+
+        added = []
+        for file, incoming in by_file.items():
+            added += file.update(lambda existing: change(existing, incoming))
+        return len(added), sum(len(users[name].get("order_history", [])) for name in added)
+
+
+class ShardedJsonUserStore(JsonUserStore):
+    """
+    Users, orders and lookups each spread over SHARDS JSON files in a directory
+    by a hash of their key. Each shard has its own lock, so terminals serving
+    different customers rarely wait on each other, and a write only rewrites
+    the shards it touches.
+    """
+
+    SHARDS = 64
+
+    def __init__(self, directory="users.d"):
+        self.path = directory
+        os.makedirs(directory, exist_ok=True)
+        self.user_files = [JsonFile(os.path.join(directory, f"shard-{n:02d}.json")) for n in range(self.SHARDS)]
+        self.order_files = [JsonFile(os.path.join(directory, f"orders-{n:02d}.json")) for n in range(self.SHARDS)]
+        self.lookup_files = [JsonFile(os.path.join(directory, f"lookup-{n:02d}.json")) for n in range(self.SHARDS)]
+
+
+ORDERS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id),
+    placed_at REAL,
+    number INTEGER,
+    ref TEXT,
+    name TEXT,
+    phone TEXT,
+    address TEXT,
+    name_key TEXT,
+    phone_key TEXT
+)
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL
+);
+""" + ORDERS_TABLE.format(name="orders") + """;
+CREATE TABLE IF NOT EXISTS line_items (
+    order_id INTEGER NOT NULL REFERENCES orders(id),
+    position INTEGER NOT NULL,
+    kind TEXT,
+    item TEXT,
+    quantity INTEGER,
+    price_cents INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (order_id, position)
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS orders_by_number ON orders(user_id, number);
+CREATE UNIQUE INDEX IF NOT EXISTS orders_by_ref ON orders(ref);
+CREATE INDEX IF NOT EXISTS orders_by_phone ON orders(phone_key);
+CREATE INDEX IF NOT EXISTS orders_by_name ON orders(name_key);
+"""
+
+
+def line_item_row(order_id, position, item):
+    """One cart item as a line_items row; data keeps the item exactly as the cart had it."""
+    if item.get("type") == "beverage" or ("beverage" in item and "size" not in item):
+        kind, name, quantity = "beverage", item.get("beverage"), item.get("beverage_quantity", 1)
+    else:
+        name = item.get("specialty") or item.get("name")
+        kind, name = ("specialty", name) if name else ("custom", "custom")
+        quantity = item.get("quantity", 1)
+    return (order_id, position, kind, name, quantity, pricing.item_cents(item), json.dumps(item))
+
+
+class SqliteUserStore(UserStore):
+    def __init__(self, path="users.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.executescript(INDEXES)
+        self.conn.execute("PRAGMA foreign_keys=ON")
+
+    def _migrate(self):
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(orders)")]
+        if "ref" in columns:
+            return
+        # Stores from before order ids and guest orders. SQLite can't drop user_id's
+        # NOT NULL in place, so copy into a new table (foreign keys are still off here).
+        number = "number" if "number" in columns else "NULL"
+        with self.conn:
+            self.conn.execute(ORDERS_TABLE.format(name="orders_new"))
+            self.conn.execute(f"INSERT INTO orders_new (id, user_id, placed_at, number) SELECT id, user_id, placed_at, {number} FROM orders")
+            self.conn.execute("DROP TABLE orders")
+            self.conn.execute("ALTER TABLE orders_new RENAME TO orders")
+            self.conn.execute("UPDATE orders SET number = (SELECT COUNT(*) FROM orders o WHERE o.user_id = orders.user_id AND o.id <= orders.id) "
+                              "WHERE number IS NULL")
+
+    def _user_id(self, username):
+        row = self.conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def get_user(self, username):
+        row = self.conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return None
+        return {"password": row[0], "order_history": self.orders(username)}
+
+    def user_exists(self, username):
+        return self._user_id(username) is not None
+
+    def check_password(self, username, password):
+        row = self.conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+        return row is not None and row[0] == password
+
+    def add_user(self, username, password):
+        try:
+            with self.conn:
+                self.conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def add_order(self, username, items, placed_at=None):
+        with self.conn:
+            self._insert_order(self._user_id(username), items, placed_at)
+
+    def _insert_order(self, user_id, items, placed_at=None, order=None):
+        if user_id is None and order is None:
+            raise KeyError("No such user")
+        details = (order["id"], order["name"], order["phone"], order["address"], name_key(order["name"]),
+                   phone_key(order["phone"])) if order else (None,) * 6
+        cursor = self.conn.execute(
+            "INSERT INTO orders (user_id, placed_at, number, ref, name, phone, address, name_key, phone_key) "
+            "VALUES (?, ?, (SELECT COALESCE(MAX(number), 0) + 1 FROM orders WHERE user_id = ?), ?, ?, ?, ?, ?, ?)",
+            (user_id, time.time() if placed_at is None else placed_at, user_id) + details)
+        order_id = cursor.lastrowid
+        self.conn.executemany("INSERT INTO line_items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              [line_item_row(order_id, position, item) for position, item in enumerate(items)])
+
+    def apply(self, changes):
+        """Like UserStore.apply, but the whole batch is one transaction."""
+        results = []
+        try:
+            with self.conn:
+                for method, username, arg in changes:
+                    if method == "add_user":
+                        cursor = self.conn.execute("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)", (username, arg))
+                        results.append(cursor.rowcount == 1)
+                    elif method == "add_order":
+                        try:
+                            self._insert_order(self._user_id(username), arg)
+                            results.append(True)
+                        except KeyError as e:
+                            results.append(e)
+                    else:
+                        try:
+                            results.append(self._record_order(username, arg))
+                        except sqlite3.IntegrityError as e:
+                            # A clashing order id; the failed INSERT is undone, the batch goes on.
+                            results.append(e)
+        except sqlite3.Error as e:
+            results = [e] * len(changes)
+        return results
+
+    def orders(self, username):
+        rows = self.conn.execute(
+            "SELECT o.id, li.data FROM orders o JOIN users u ON u.id = o.user_id "
+            "LEFT JOIN line_items li ON li.order_id = o.id "
+            "WHERE u.username = ? ORDER BY o.id, li.position", (username,))
+        orders = []
+        last_id = None
+        for order_id, data in rows:
+            if order_id != last_id:
+                orders.append([])
+                last_id = order_id
+            if data is not None:
+                orders[-1].append(json.loads(data))
+        return orders
+
+    def record_order(self, username, order):
+        with self.conn:
+            result = self._record_order(username, order)
+        if isinstance(result, Exception):
+            raise result
+
+    def _record_order(self, username, order):
+        user_id = self._user_id(username) if username is not None else None
+        # An unknown user's order is still kept, as a guest order.
+        self._insert_order(user_id, order["items"], order["placed_at"], order)
+        if username is not None and user_id is None:
+            return KeyError(f"No such user {username!r}")
+        return True
+
+    def find_order(self, order_id):
+        row = self.conn.execute(
+            "SELECT o.id, o.ref, o.placed_at, u.username, o.name, o.phone, o.address FROM orders o "
+            "LEFT JOIN users u ON u.id = o.user_id WHERE o.ref = ?", (order_id,)).fetchone()
+        if row is None:
+            return None
+        items = [json.loads(data) for (data,) in self.conn.execute(
+            "SELECT data FROM line_items WHERE order_id = ? ORDER BY position", (row[0],))]
+        return {"id": row[1], "placed_at": row[2], "username": row[3], "name": row[4], "phone": row[5],
+                "address": row[6], "items": items}
+
+    def find_orders(self, phone=None, name=None, limit=20):
+        column, key = ("phone_key", phone_key(phone)) if phone else ("name_key", name_key(name or ""))
+        refs = self.conn.execute(f"SELECT ref FROM orders WHERE {column} = ? ORDER BY id DESC LIMIT ?", (key, limit))
+        return [self.find_order(ref) for (ref,) in refs.fetchall()]
+
+    def order_count(self, username):
+        row = self.conn.execute("SELECT MAX(o.number) FROM orders o JOIN users u ON u.id = o.user_id WHERE u.username = ?",
+                                (username,)).fetchone()
+        return row[0] or 0
+
+    def order_page(self, username, before=None, limit=PAGE_SIZE):
+        user_id = self._user_id(username)
+        total = self.order_count(username) if user_id is not None else 0
+        before, low = page_range(total, before, limit)
+        rows = self.conn.execute(
+            "SELECT o.number, li.data FROM orders o LEFT JOIN line_items li ON li.order_id = o.id "
+            "WHERE o.user_id = ? AND o.number > ? AND o.number <= ? ORDER BY o.number DESC, li.position",
+            (user_id, low, before))
+        orders = []
+        for number, data in rows:
+            if not orders or orders[-1][0] != number:
+                orders.append((number, []))
+            if data is not None:
+                orders[-1][1].append(json.loads(data))
+        return make_page(orders, total, before, low, limit)
+
+    def import_users(self, users):
+        """Copy a users.json document in one transaction; returns (users added, orders added)."""
+        added_users = added_orders = 0
+        with self.conn:
+            for username, user in users.items():
+                cursor = self.conn.execute("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)",
+                                           (username, user.get("password", "")))
+                if not cursor.rowcount:
+                    print(f"Skipping {username}: already in {self.path}")
+                    continue
+                added_users += 1
+                for items in user.get("order_history", []):
+                    self._insert_order(cursor.lastrowid, items, placed_at=0)
+                    added_orders += 1
+        return added_users, added_orders
+
+    def close(self):
+        self.conn.close()
+
+
+PENDING = object()
+
+
+class WriteBehindStore(UserStore):
+    """
+    Wraps the store at path so the Tk thread never waits on disk. Changes are queued
+    for a writer thread, which gathers whatever arrives within LINGER seconds into
+    one apply() (one file write or one transaction). Callbacks passed as on_saved
+    run on the Tk thread, from a root.after poll, once their change is durable.
+
+    Until then reads see queued changes as if they were saved. Reading a customer
+    with changes in flight waits for the current flush, so a change is never seen
+    twice or not at all.
+    """
+
+    LINGER = 0.05
+
+    def __init__(self, path, root, poll_ms=50):
+        self.path = path
+        self.root = root
+        self.poll_ms = poll_ms
+        self.reader = open_store(path)
+        self.archive = open_archive(path)
+        self.pending = []
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="store-writer", daemon=True)
+        self.thread.start()
+        self._poll_id = None
+        self.closed = False
+
+    def _run(self):
+        # SQLite connections belong to the thread that opened them.
+        writer = open_store(self.path)
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            if batch[0] is None:
+                break
+            time.sleep(self.LINGER)
+            while True:
+                try:
+                    entry = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    running = False
+                    break
+                batch.append(entry)
+            with self.lock:
+                results = writer.apply([entry[0] for entry in batch])
+                for entry, result in zip(batch, results):
+                    entry[2] = result
+        writer.close()
+
+    def _submit(self, change, on_saved):
+        entry = [change, on_saved, PENDING]
+        self.pending.append(entry)
+        self.queue.put(entry)
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        done = [entry for entry in self.pending if entry[2] is not PENDING]
+        self.pending = [entry for entry in self.pending if entry[2] is PENDING]
+        for change, on_saved, result in done:
+            if isinstance(result, Exception):
+                print(f"Error saving {change[0]} for {change[1]}: {result}")
+            if on_saved is not None:
+                on_saved(result)
+        if self.pending:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
+
+    def _read(self, username, read):
+        """read() plus the changes for username it cannot have seen yet."""
+        if not any(entry[0][1] == username for entry in self.pending):
+            return read(), []
+        with self.lock:
+            return read(), [entry[0] for entry in self.pending if entry[0][1] == username and entry[2] is PENDING]
+
+    def get_user(self, username):
+        user, unsaved = self._read(username, lambda: self.reader.get_user(username))
+        for change in unsaved:
+            items = order_items(change)
+            if change[0] == "add_user" and user is None:
+                user = {"password": change[2], "order_history": []}
+            elif items is not None and user is not None:
+                user = dict(user, order_history=user.get("order_history", []) + [items])
+        return user
+
+    def user_exists(self, username):
+        exists, unsaved = self._read(username, lambda: self.reader.user_exists(username))
+        return exists or any(method == "add_user" for method, name, arg in unsaved)
+
+    def orders(self, username):
+        orders, unsaved = self._read(username, lambda: self.reader.orders(username))
+        return orders + [items for items in map(order_items, unsaved) if items is not None]
+
+    def order_count(self, username):
+        count, unsaved = self._read(username, lambda: self.reader.order_count(username))
+        return count + sum(order_items(change) is not None for change in unsaved)
+
+    def order_page(self, username, before=None, limit=PAGE_SIZE):
+        def read():
+            saved = self.reader.order_count(username)
+            cursor = min(before, saved) if before is not None else None
+            if self.archive is not None:
+                # History only grows, so the archive's order n is the store's order n.
+                archived = len(self.archive.order_range(username))
+                top, low = page_range(saved, cursor, limit)
+                if archived <= saved and top <= archived:
+                    return saved, make_page(self.archive.numbered_orders(username, low, top), saved, top, low, limit)
+            return saved, self.reader.order_page(username, cursor, limit)
+
+        (saved, page), unsaved = self._read(username, read)
+        queued = [items for items in map(order_items, unsaved) if items is not None]
+        if not queued:
+            return page
+        # Queued orders are the newest; fill the page from them first, then from the store.
+        total = saved + len(queued)
+        before, low = page_range(total, before, limit)
+        orders = [(number, queued[number - saved - 1]) for number in range(before, max(low, saved), -1)]
+        orders += page.orders[:limit - len(orders)]
+        return make_page(orders, total, before, low, limit)
+
+    def add_user(self, username, password, on_saved=None):
+        """Queue a new account; returns False straight away if the name is already taken."""
+        if self.user_exists(username):
+            return False
+        self._submit(("add_user", username, password), on_saved)
+        return True
+
+    def add_order(self, username, items, on_saved=None):
+        self._submit(("add_order", username, list(items)), on_saved)
+
+    def record_order(self, username, order, on_saved=None):
+        self._submit(("record_order", username, order), on_saved)
+
+    def _queued_orders(self):
+        return [entry[0][2] for entry in self.pending if entry[0][0] == "record_order"]
+
+    def find_order(self, order_id):
+        # A queued order is the same record whether or not its write has landed yet.
+        for order in self._queued_orders():
+            if order["id"] == order_id:
+                return order
+        return self.reader.find_order(order_id)
+
+    def find_orders(self, phone=None, name=None, limit=20):
+        key = ("phone:" + phone_key(phone)) if phone else ("name:" + name_key(name or ""))
+        queued = [order for order in self._queued_orders() if key in lookup_keys(order)][::-1]
+        saved = [order for order in self.reader.find_orders(phone, name, limit) if order["id"] not in {o["id"] for o in queued}]
+        return (queued + saved)[:limit]
+
+    def close(self):
+        """Write everything still queued, then stop the writer thread."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        if self._poll_id is not None:
+            try:
+                self.root.after_cancel(self._poll_id)
+            except Exception:
+                # The window is already gone, and its pending poll with it.
+                pass
+            self._poll_id = None
+        for change, on_saved, result in self.pending:
+            if isinstance(result, Exception):
+                print(f"Error saving {change[0]} for {change[1]}: {result}")
+        self.pending = []
+        self.reader.close()
+        if self.archive is not None:
+            self.archive.close()
+
+
+def archive_path(store_path):
+    return os.path.splitext(store_path.rstrip("/\\"))[0] + ".opk"
+
+
+def open_archive(store_path):
+    """The packed order history beside the store (see orderpack.py), or None if there isn't one."""
+    path = archive_path(store_path)
+    if not os.path.exists(path):
+        return None
+    import orderpack
+    try:
+        return orderpack.OrderPack(path)
+    except (OSError, ValueError) as e:
+        print(f"Error opening the order archive {path}: {e}")
+        return None
+
+
+def is_sqlite(path):
+    """Whether open_store would open path as a SqliteUserStore."""
+    return os.path.splitext(path)[1].lower() in (".db", ".sqlite", ".sqlite3")
+
+
+def open_store(path="users.json"):
+    if is_sqlite(path):
+        return SqliteUserStore(path)
+    if path.endswith(".d") or os.path.isdir(path):
+        return ShardedJsonUserStore(path)
+    return JsonUserStore(path)
+
+
+def _stress_writer(path, writer, orders):
+    """One terminal: registers its own customers and orders for them, plus for a customer every terminal shares."""
+    store = open_store(path)
+    customers = [f"terminal{writer}-customer{n}" for n in range(10)]
+    for username in customers:
+        store.add_user(username, "pw")
+    store.add_user("shared", "pw")
+    for n in range(orders):
+        username = "shared" if n % 20 == 0 else customers[n % len(customers)]
+        store.add_order(username, [{"type": "beverage", "beverage": "Sprite", "beverage_quantity": 1,
+                                    "price": 1.0, "terminal": writer, "n": n}])
+    store.close()
+
+
+def _stress(layout, writers, orders):
+    """Run writers terminal processes against a fresh store; returns (orders per second, orders lost)."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, {"json": "users.json", "sharded": "users.d", "sqlite": "users.db"}[layout])
+        open_store(path).close()
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=writers) as pool:
+            for future in [pool.submit(_stress_writer, path, writer, orders) for writer in range(writers)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+        store = open_store(path)
+        found = set()
+        for writer in range(writers):
+            for username in [f"terminal{writer}-customer{n}" for n in range(10)]:
+                found.update((item["terminal"], item["n"]) for order in store.orders(username) for item in order)
+        found.update((item["terminal"], item["n"]) for order in store.orders("shared") for item in order)
+        store.close()
+    return writers * orders / elapsed, writers * orders - len(found)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pizza Palace user store tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="one-shot copy of users.json into another store (.db, .d directory or .json)")
+    importer.add_argument("source")
+    importer.add_argument("destination")
+    stress = commands.add_parser("stress", help="concurrent terminal processes placing orders; fails if any order is lost")
+    stress.add_argument("--layout", choices=["json", "sharded", "sqlite"], default="sharded")
+    stress.add_argument("--writers", type=int, default=8)
+    stress.add_argument("--orders", type=int, default=200, help="orders per writer")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        with open(args.source, "r") as f:
+            users = json.load(f)
+        started = time.perf_counter()
+        store = open_store(args.destination)
+        added_users, added_orders = store.import_users(users)
+        store.close()
+        print(f"Imported {added_users} users and {added_orders} orders in {(time.perf_counter() - started) * 1000:.1f} ms")
+    else:
+        lost = 0
+        for writers in sorted({1, args.writers}):
+            rate, missing = _stress(args.layout, writers, args.orders)
+            lost += missing
+            print(f"{args.layout}: {writers} writers, {rate:.0f} orders/s, {missing} lost")
+        sys.exit(1 if lost else 0)
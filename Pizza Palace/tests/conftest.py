@@ -0,0 +1,17 @@
+"""
+Title: Pizza Palace Tests
+File: tests/conftest.py
+Author: Joshua Nobel
+
+Tests for the modules with no Tk in them. The app's modules sit one level
+up and import each other as plain modules, so that directory goes on
+sys.path. Run from the repository root or from Pizza Palace:
+
+    python -m pytest -q
+"""
+
+import os
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
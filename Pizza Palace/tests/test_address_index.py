@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+import address_index
+from address_index import AddressIndex, query_keys
+
+ADDRESSES = ["12 County Rd", "12 Court St", "12 Cottage Ln", "120 Main St", "40 Roanoke Ave", "40 Road St",
+             "9 Lantern Way", "9 Lane Ave", "5 South St", "5 Spring Rd", "7 Elm St", "7 Elm Street"]
+ADDRESSES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "addresses.csv")
+
+
+@pytest.fixture
+def index():
+    return AddressIndex(ADDRESSES)
+
+
+def test_query_keys_keep_the_word_as_typed():
+    assert query_keys("") == set()
+    assert query_keys("  ") == set()
+    assert query_keys("22 Elm ") == {("22 elm", False)}
+    assert query_keys("12 Cou") == {("12 cou", False), ("12 ct", True)}
+    assert query_keys("Stre") == {("stre", False), ("st", True)}
+    # "s" is already the short form of "south", so only "st" is added.
+    assert query_keys("5 s") == {("5 s", False), ("5 st", True)}
+    assert query_keys("5 st") == {("5 st", False)}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12 Cou", ["12 County Rd", "12 Court St"]),
+    ("12 Co", ["12 Cottage Ln", "12 County Rd", "12 Court St"]),
+    ("40 Roa", ["40 Road St", "40 Roanoke Ave"]),
+    ("9 Lan", ["9 Lantern Way", "9 Lane Ave"]),
+    ("5 so", ["5 South St"]),
+    ("12", ["12 Cottage Ln", "12 County Rd", "12 Court St", "120 Main St"]),
+    ("12 court street", ["12 Court St"]),
+    ("", []),
+    ("99", []),
+])
+def test_completions(index, text, expected):
+    assert index.complete(text) == expected
+
+
+def test_same_address_written_two_ways_is_offered_once(index):
+    assert index.complete("7 elm") == ["7 Elm Street"]
+
+
+def test_limit(index):
+    assert index.complete("12", limit=2) == ["12 Cottage Ln", "12 County Rd"]
+    assert AddressIndex([]).complete("12") == []
+
+
+def test_every_delivery_address_completes_to_itself():
+    index = address_index.load_index(ADDRESSES_FILE)
+    assert index.size == 2000
+    for n in range(0, index.size, 97):
+        assert index.address(n) in index.complete(index.address(n))
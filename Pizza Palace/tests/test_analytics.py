@@ -0,0 +1,25 @@
+import pytest
+
+import analytics
+import store
+
+
+def test_is_sqlite_goes_by_the_suffix():
+    assert all(store.is_sqlite(name) for name in ["users.db", "shop.sqlite", "shop.SQLITE3"])
+    assert not any(store.is_sqlite(name) for name in ["users.json", "users.d", "users.db.d"])
+
+
+@pytest.mark.parametrize("name", ["users.d", "users.db", "users.sqlite3"])
+def test_every_layout_gives_the_same_report(tmp_path, name):
+    sprites = [[{"type": "beverage", "beverage": "Sprite", "beverage_quantity": n, "price": float(n)}] for n in range(1, 7)]
+    orders = [store.new_order("amy" if n % 2 else None, items, "Amy", "812-555-0101", "1 Elm St")
+              for n, items in enumerate(sprites)]
+    reports = []
+    for path in [str(tmp_path / "users.json"), str(tmp_path / name)]:
+        shop = store.open_store(path)
+        shop.add_user("amy", "pw")
+        for order in orders:
+            shop.record_order(order["username"], order)
+        shop.close()
+        reports.append(analytics.analyze(path, workers=1))
+    assert reports[0] and reports[0] == reports[1]
@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+import delivery
+from delivery import Dispatcher, Planner, Stop, plan, summarize
+
+# Seconds to drive one km.
+KM = 3600 / delivery.DRIVE_KMH
+STOP = delivery.STOP_MINUTES * 60
+
+
+def rush(orders, seed=1):
+    rng = random.Random(seed)
+    points = [(x, y) for address, x, y in delivery.grid_addresses()]
+    stops = []
+    for n in range(orders):
+        ready_at = rng.uniform(0, 3600)
+        stops.append(Stop(n, rng.choice(points), ready_at, ready_at + 1200))
+    return stops
+
+
+def test_duration_and_on_time_drive_the_grid():
+    planner = Planner([Stop(1, (1.0, 2.0), 0, 10000), Stop(2, (1.0, -1.0), 0, 10000)], now=0)
+    assert planner.duration([1]) == pytest.approx(6 * KM + STOP)
+    assert planner.duration([1, 2]) == pytest.approx((3 + 3 + 2) * KM + 2 * STOP)
+    assert planner.on_time([1, 2])
+    assert not planner.on_time([1, 2], departs_at=10000)
+
+
+def test_orders_on_the_same_side_of_town_go_together():
+    stops = [Stop(1, (2.0, 2.0), 0, 1800), Stop(2, (2.2, 2.0), 0, 1800), Stop(3, (-2.0, -2.0), 0, 1800)]
+    runs = plan(stops, [(0.0, 1), (0.0, 2)], now=0)
+    assert sorted(sorted(stop.order_id for stop in run.stops) for run in runs) == [[1, 2], [3]]
+    assert {run.driver for run in runs} == {1, 2}
+
+
+def test_a_run_does_not_make_an_order_late_that_could_go_alone():
+    # Each can only just make it going straight there, so neither may wait on the other.
+    stops = [Stop(1, (3.0, 0.0), 0, 3 * KM + STOP), Stop(2, (0.0, 1.0), 0, KM + STOP)]
+    runs = plan(stops, [(0.0, 1), (0.0, 2)], now=0)
+    assert sorted([stop.order_id for stop in run.stops] for run in runs) == [[1], [2]]
+    assert summarize(runs)["late"] == 0
+
+
+def test_every_order_is_planned_once_within_the_limits():
+    stops = rush(120)
+    runs = plan(stops, [(0.0, n + 1) for n in range(6)], now=0)
+    planned = sorted(stop.order_id for run in runs for stop in run.stops)
+    assert planned == list(range(120))
+    assert all(1 <= len(run.stops) <= delivery.MAX_STOPS for run in runs)
+    for run in runs:
+        assert run.departs_at >= max(stop.ready_at for stop in run.stops)
+        assert run.arrivals == sorted(run.arrivals)
+    planner = Planner(stops, 0)
+    for run in runs:
+        route = [stop.order_id + 1 for stop in run.stops]
+        assert run.back_at - run.departs_at == pytest.approx(planner.duration(route))
+
+
+def test_improving_never_adds_driving():
+    stops = rush(200, seed=3)
+    planner = Planner(stops, 0)
+    batched = planner.batch()
+    improved = planner.improve(batched)
+    assert sorted(point for route in improved for point in route) == list(range(1, 201))
+    assert sum(map(planner.duration, improved)) <= sum(map(planner.duration, batched))
+
+
+def test_runs_go_to_the_driver_back_first():
+    stops = [Stop(1, (5.0, 0.0), 0, 5 * KM + STOP), Stop(2, (-5.0, 0.0), 600, 600 + 5 * KM + STOP)]
+    runs = plan(stops, [(900.0, 1), (300.0, 2)], now=0)
+    assert [(run.driver, run.departs_at) for run in runs] == [(2, 300.0), (1, 900.0)]
+
+
+def test_position_at():
+    run = plan([Stop(1, (1.0, 1.0), 0, 3600)], [(0.0, 1)], now=0)[0]
+    assert run.position_at(0) == (0.0, 0.0)
+    assert run.position_at(0.5 * KM) == pytest.approx((0.5, 0.0))
+    assert run.position_at(1.5 * KM) == pytest.approx((1.0, 0.5))
+    assert run.position_at(2 * KM + 60) == (1.0, 1.0)
+    assert run.position_at(run.back_at + 1) == (0.0, 0.0)
+
+
+def test_dispatcher_keeps_runs_that_have_left():
+    dispatcher = Dispatcher({"1 elm st": (1.0, 0.0), "2 elm st": (1.2, 0.0)}, drivers=1)
+    assert not dispatcher.add(9, "99 Nowhere Rd", 0, 1800)
+    assert dispatcher.add(1, "1 Elm Street", 0, 1800)
+    first = dispatcher.run_for(1, now=0)
+    assert first is not None and first.departs_at == 0
+    # Order 1 has gone by now, so order 2 waits for the driver rather than joining it.
+    assert dispatcher.add(2, "2 Elm St.", 10, 3600)
+    assert dispatcher.on_road(10) == [first]
+    assert dispatcher.run_for(1, 10) is first
+    second = dispatcher.run_for(2, 10)
+    assert second is not first and second.departs_at == first.back_at
+    assert dispatcher.on_road(first.back_at + 1) == [second]
+    assert dispatcher.on_road(second.back_at + 1) == []
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import order_api
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CUSTOMER = {"name": "Amy", "address": "1 Elm St", "phone": "812-555-0101",
+            "card_number": "4111111111111111", "card_expiry": "12/30", "card_cvv": "123"}
+PIZZA = {"type": "pizza", "size": "Large", "crust": "Thin"}
+
+
+def send(tmp_path, requests):
+    """[(status, payload)] for (method, target, body) requests against a fresh store."""
+    async def run():
+        service = order_api.OrderService(str(tmp_path / "users.json"), os.path.join(APP_DIR, "promotions.json"))
+        await service.start()
+        try:
+            return [await service.dispatch(method, target, body if isinstance(body, bytes) else json.dumps(body).encode())
+                    for method, target, body in requests]
+        finally:
+            await service.stop()
+    return asyncio.run(run())
+
+
+def test_an_order_is_quoted_placed_and_found(tmp_path):
+    order = {"items": [PIZZA], "customer": CUSTOMER, "coupon": "palace10"}
+    (quote_status, quote), (status, placed) = send(tmp_path, [("POST", "/quote", order), ("POST", "/orders", order)])
+    assert quote_status == 200 and status == 201
+    assert (quote["subtotal"], quote["discount"]) == (1499, 149)
+    assert placed["total"] == quote["total"]
+
+    (found_status, found), (listed_status, listed) = send(tmp_path, [
+        ("GET", f"/orders/{placed['id'].lower()}", b""), ("GET", "/orders?phone=8125550101", b"")])
+    assert found_status == 200 and found["id"] == placed["id"]
+    assert [entry["id"] for entry in listed["orders"]] == [placed["id"]]
+
+
+@pytest.mark.parametrize("body", [
+    b"[]", b'"x"', b"null", b"{not json",
+    {"items": "x"},
+    {"items": [PIZZA], "customer": []},
+    {"items": [PIZZA], "customer": dict(CUSTOMER, name=5)},
+    {"items": [PIZZA], "customer": CUSTOMER, "coupon": 5},
+    {"items": [PIZZA], "customer": CUSTOMER, "username": ["amy"]},
+    {"items": [dict(PIZZA, toppings=[["Ham"]])], "customer": CUSTOMER},
+    {"items": [{"specialty": ["Seafood"]}], "customer": CUSTOMER},
+])
+def test_bad_requests_get_400_with_a_message(tmp_path, body):
+    [(status, payload)] = send(tmp_path, [("POST", "/orders", body)])
+    assert status == 400
+    assert payload["error"]
+
+
+def test_unknown_paths_and_methods(tmp_path):
+    statuses = [status for status, payload in send(tmp_path, [
+        ("GET", "/nowhere", b""), ("DELETE", "/orders", b""), ("GET", "/orders/NO-SUCH", b""), ("GET", "/orders", b"")])]
+    assert statuses == [404, 405, 404, 400]
+
+
+def test_a_bad_content_length_is_answered(tmp_path):
+    async def run():
+        service = order_api.OrderService(str(tmp_path / "users.json"))
+        await service.start()
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"POST /quote HTTP/1.1\r\nContent-Length: abc\r\n\r\n")
+            await writer.drain()
+            answer = await reader.read()
+            writer.close()
+            return answer
+        finally:
+            server.close()
+            await service.stop()
+    assert asyncio.run(run()).startswith(b"HTTP/1.1 400 ")
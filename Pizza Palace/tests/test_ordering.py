@@ -0,0 +1,69 @@
+import pytest
+
+import ordering
+import promotions
+
+CUSTOMER = {"name": " Amy Pond ", "address": "1 Elm St", "phone": "812-555-0101",
+            "card_number": "4111111111111111", "card_expiry": "12/30", "card_cvv": "123"}
+
+
+def test_cart_items_are_priced_here_not_by_the_caller():
+    assert ordering.cart_item({"size": "Large", "crust": "Thin", "toppings": ["Ham"], "price": 0.01}) == {
+        "type": "pizza", "size": "Large", "crust": "Thin", "toppings": ["Ham"], "quantity": 1, "price": 16.49, "specialty": ""}
+    assert ordering.cart_item({"type": "pizza", "specialty": "Seafood", "size": "Small", "quantity": 2})["price"] == 15.99
+    assert ordering.cart_item({"type": "beverage", "beverage": "Mandarin", "quantity": 3})["price"] == 5.25
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("pizza", "Each item must be an object."),
+    ({"size": "Huge", "crust": "Thin"}, "Size must be one of"),
+    ({"size": "Large", "crust": "Deep"}, "Crust must be one of"),
+    ({"size": "Large", "crust": "Thin", "toppings": ["Anchovies"]}, "We don't have Anchovies."),
+    ({"size": "Large", "crust": "Thin", "toppings": "Ham"}, "toppings must be a list of names."),
+    ({"size": ["Large"], "crust": "Thin"}, "must be text."),
+    ({"specialty": "Calzone"}, "Calzone is not on the menu."),
+    ({"specialty": ["Seafood"]}, "must be text."),
+    ({"beverage": "Tab"}, "We don't have Tab."),
+    ({"beverage": "Sprite", "quantity": 0}, "Quantity must be a whole number"),
+    ({"beverage": "Sprite", "quantity": True}, "Quantity must be a whole number"),
+    ({"size": "Large", "crust": "Thin", "quantity": 2.5}, "Quantity must be a whole number"),
+])
+def test_bad_cart_items_say_what_is_wrong(spec, message):
+    with pytest.raises(ordering.OrderError, match=message.replace(".", r"\.")):
+        ordering.cart_item(spec)
+
+
+def test_set_quantity_reprices_beverages():
+    item = ordering.beverage("Sprite", 2)
+    ordering.set_quantity(item, 5)
+    assert (item["beverage_quantity"], item["price"]) == (5, 5.0)
+    with pytest.raises(ordering.OrderError):
+        ordering.set_quantity(item, 100)
+
+
+def test_coupons_are_checked_against_the_engine():
+    engine = promotions.PromotionEngine([{"id": "ten", "coupon": "PALACE10", "reward": {"type": "percent_off_cart", "percent": 10}}])
+    assert ordering.check_coupon(engine, " palace10 ") == "PALACE10"
+    assert ordering.check_coupon(engine, "") is None
+    with pytest.raises(ordering.OrderError, match="NOPE is not a valid coupon"):
+        ordering.check_coupon(engine, "nope")
+
+
+def test_cart_totals_take_the_discount_before_tax():
+    engine = promotions.PromotionEngine([{"id": "ten", "coupon": "PALACE10", "reward": {"type": "percent_off_cart", "percent": 10}}])
+    items = [ordering.beverage("Sprite", 10)]
+    quote, applied = ordering.cart_totals(items, engine, "PALACE10")
+    assert applied == [("ten", 100)]
+    assert (quote.subtotal, quote.tax, quote.total) == (1000, 63, 963)
+
+
+def test_checkout_needs_a_cart_and_every_customer_field():
+    items = [ordering.beverage("Sprite")]
+    order = ordering.checkout("amy", items, CUSTOMER)
+    assert (order["username"], order["name"], order["items"]) == ("amy", "Amy Pond", items)
+    with pytest.raises(ordering.OrderError, match="Your cart is empty"):
+        ordering.checkout("amy", [], CUSTOMER)
+    with pytest.raises(ordering.OrderError, match="Please fill out all fields"):
+        ordering.checkout("amy", items, dict(CUSTOMER, card_cvv="  "))
+    with pytest.raises(ordering.OrderError, match="Customer details must be text"):
+        ordering.checkout("amy", items, dict(CUSTOMER, phone=8125550101))
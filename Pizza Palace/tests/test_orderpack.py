@@ -0,0 +1,89 @@
+import struct
+
+import pytest
+
+import orderpack
+import store
+
+HISTORY = {
+    "amy": {"password": "pw", "order_history": [
+        [{"size": "Small", "crust": "Stuffed", "toppings": ["Spinach", "Mushrooms"], "quantity": 1, "price": 19.990000000000002},
+         {"size": "Medium", "crust": "Regular", "toppings": [], "quantity": 1, "name": "Charcoal", "price": 25.99}],
+        [{"type": "beverage", "beverage": "Fruit Punch", "beverage_quantity": 4, "price": 7.0},
+         {"type": "pizza", "size": "Large", "crust": "Thin", "toppings": [], "quantity": 2, "name": "Hawaiian",
+          "price": 15.99, "specialty": "Hawaiian"},
+         {"type": "pizza", "size": "Large", "crust": "Thin", "toppings": ["Bacon"], "quantity": 1, "price": 16.49,
+          "specialty": ""}],
+    ]},
+    "zoë": {"password": "pw", "order_history": [[{"beverage": "Sprite", "beverage_quantity": 1, "price": 1.0}]]},
+    "guest-only": {"password": "pw", "order_history": []},
+}
+
+
+def test_round_trip_keeps_each_item_shape(tmp_path):
+    path = str(tmp_path / "users.opk")
+    orderpack.pack(HISTORY, path)
+    archive = orderpack.OrderPack(path)
+    unpacked = archive.unpack()
+    archive.close()
+    for username, user in HISTORY.items():
+        expected = [[dict(item, price=round(item["price"], 2)) for item in order] for order in user["order_history"]]
+        for order in expected:
+            for item in order:
+                if "toppings" in item:
+                    item["toppings"] = sorted(item["toppings"], key=orderpack.catalog.TOPPINGS.index)
+        assert unpacked[username]["order_history"] == expected
+
+
+def test_customers_are_found_without_reading_the_rest(tmp_path):
+    path = str(tmp_path / "users.opk")
+    orderpack.pack(HISTORY, path)
+    archive = orderpack.OrderPack(path)
+    assert list(archive.order_range("amy")) == [0, 1]
+    assert archive.order_range("nobody") == range(0)
+    assert len(archive.item_view(1)) == 3 * orderpack.ITEM.size
+    assert archive.numbered_orders("amy", 0, 2) == [(2, archive.items(1)), (1, archive.items(0))]
+    archive.close()
+
+
+def test_names_past_the_first_65536_strings(tmp_path):
+    users = {f"user{n:06d}": {"order_history": []} for n in range(70000)}
+    users["zz"] = {"order_history": [[{"type": "beverage", "beverage": "Brand New Soda", "beverage_quantity": 2, "price": 3.5}]]}
+    path = str(tmp_path / "users.opk")
+    orderpack.pack(users, path)
+    archive = orderpack.OrderPack(path)
+    assert archive.orders("zz") == users["zz"]["order_history"]
+    archive.close()
+
+
+@pytest.mark.parametrize("data", [b"", b"PPOH", b"NOPE" + bytes(60), struct.pack("<4sH", b"PPOH", 1) + bytes(58)])
+def test_damaged_or_old_archives_are_refused(tmp_path, data):
+    path = tmp_path / "users.opk"
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        orderpack.OrderPack(str(path))
+
+
+class Root:
+    def after(self, ms, callback):
+        return "after#1"
+
+    def after_cancel(self, after_id):
+        pass
+
+
+def test_history_pages_come_from_the_archive_beside_the_store(tmp_path):
+    path = str(tmp_path / "users.json")
+    shop = store.open_store(path)
+    shop.import_users(HISTORY)
+    shop.add_order("amy", [{"type": "beverage", "beverage": "Sprite", "beverage_quantity": 1, "price": 1.0}])
+    shop.close()
+    orderpack.pack(HISTORY, store.archive_path(path))
+
+    writer = store.WriteBehindStore(path, Root())
+    assert writer.archive is not None
+    # Order 3 was placed after packing, so the newest page still comes from the store.
+    assert [number for number, items in writer.order_page("amy", limit=1).orders] == [3]
+    older = writer.order_page("amy", before=2, limit=2)
+    assert older == store.Page([(2, writer.archive.items(1)), (1, writer.archive.items(0))], 3, None, 3)
+    writer.close()
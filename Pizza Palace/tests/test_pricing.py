@@ -0,0 +1,40 @@
+import pricing
+
+
+def test_float_prices_round_trip_as_cents():
+    assert pricing.to_cents(19.990000000000002) == 1999
+    assert pricing.to_dollars(1999) == 19.99
+    assert pricing.format_price(1999) == "$19.99"
+    assert pricing.format_price(5) == "$0.05"
+    assert pricing.format_price(-250) == "-$2.50"
+
+
+def test_custom_pizza_is_base_crust_and_toppings_times_quantity():
+    item = {"type": "pizza", "size": "Large", "crust": "Stuffed", "toppings": ["Ham", "Bacon"], "quantity": 3}
+    assert pricing.item_cents(item) == (1499 + 200 + 2 * 150) * 3
+
+
+def test_specialty_is_priced_from_the_catalog_not_the_stored_price():
+    item = {"size": "Small", "crust": "Regular", "toppings": [], "quantity": 2, "name": "Seafood", "price": 1.0}
+    assert pricing.item_cents(item) == (1999 - 400) * 2
+
+
+def test_beverage_price_is_the_whole_line():
+    assert pricing.item_cents({"type": "beverage", "beverage": "Fruit Punch", "beverage_quantity": 4, "price": 7.0}) == 700
+
+
+def test_items_the_catalog_no_longer_sells_keep_their_stored_price():
+    assert pricing.item_cents({"size": "Huge", "crust": "Thin", "toppings": [], "quantity": 2, "price": 9.5}) == 1900
+    assert pricing.item_cents({"type": "beverage", "beverage": "Tab", "beverage_quantity": 3, "price": 2.25}) == 225
+
+
+def test_tax_rounds_half_up_after_the_discount():
+    # 7% of 1250 is 87.5 cents.
+    quote = pricing.quote_cart([{"type": "beverage", "beverage": "Sprite", "beverage_quantity": 15}], discount=250)
+    assert quote == pricing.Quote(1500, 88, 1250 + 88)
+    assert pricing.quote_cart([{"type": "beverage", "beverage": "Sprite", "beverage_quantity": 1}], discount=500).total == 0
+
+
+def test_quote_carts_matches_quote_cart():
+    carts = [[{"type": "beverage", "beverage": "Sprite", "beverage_quantity": n}] for n in range(1, 5)]
+    assert pricing.quote_carts(carts) == [pricing.quote_cart(cart) for cart in carts]
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import promotions
+
+SHOP_RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "promotions.json")
+
+
+def specialty(name, quantity=1, size="Large", crust="Regular"):
+    return {"type": "pizza", "size": size, "crust": crust, "toppings": [], "quantity": quantity, "name": name, "specialty": name}
+
+
+def jarritos(quantity):
+    return {"type": "beverage", "beverage": "Mandarin", "beverage_quantity": quantity}
+
+
+def test_lunch_combo_repeats_as_often_as_the_cart_allows():
+    engine = promotions.load_rules(SHOP_RULES)
+    cart = [specialty("Hawaiian", 2), jarritos(4)]
+    assert engine.evaluate(cart, day="Mon") == promotions.Result(500, [("2 Large Specialties + 4 Jarritos", 500)])
+    assert engine.evaluate([specialty("Hawaiian", 4), jarritos(9)], day="Mon").discount == 1000
+    assert engine.evaluate([specialty("Hawaiian", 2), jarritos(3)], day="Mon").discount == 0
+
+
+def test_free_stuffed_crust_only_on_tuesday():
+    engine = promotions.load_rules(SHOP_RULES)
+    cart = [specialty("Cheesey", 2, crust="Stuffed")]
+    assert engine.evaluate(cart, day="Tue").discount == 400
+    assert engine.evaluate(cart, day="Wed").discount == 0
+
+
+def test_coupon_takes_its_percentage_off_what_is_left():
+    engine = promotions.load_rules(SHOP_RULES)
+    assert engine.has_coupon(" palace10 ")
+    assert not engine.has_coupon("PALACE11")
+    cart = [specialty("Hawaiian", 2), jarritos(4)]
+    # 3898 - 500 = 3398, and 10% of that.
+    assert engine.evaluate(cart, coupon="palace10", day="Mon").applied == [
+        ("2 Large Specialties + 4 Jarritos", 500), ("Coupon PALACE10", 339)]
+    assert engine.evaluate(cart, day="Mon").discount == 500
+
+
+def test_two_promotions_never_discount_the_same_pizza():
+    engine = promotions.PromotionEngine([
+        {"id": "half-charcoal", "requires": [{"match": {"item": "Charcoal", "size": "Large"}}],
+         "reward": {"type": "percent_off_items", "percent": 50}},
+        {"id": "three-off", "requires": [{"match": {"kind": "specialty"}}], "reward": {"type": "amount_off", "cents": 300}},
+    ])
+    assert engine.evaluate([specialty("Charcoal")], day="Mon").applied == [("half-charcoal", 1399)]
+    assert engine.evaluate([specialty("Charcoal", 2)], day="Mon").discount == 1399 + 300
+
+
+def test_minimum_subtotal_and_bundle_price():
+    engine = promotions.PromotionEngine([
+        {"id": "two-for-25", "requires": [{"match": {"kind": "specialty", "size": "Large"}, "count": 2}],
+         "reward": {"type": "bundle_price", "cents": 2500}, "min_subtotal_cents": 3500},
+    ])
+    # Two Large Margheritas are 3198, under the minimum.
+    assert engine.evaluate([specialty("Margherita", 2)], day="Mon").discount == 0
+    assert engine.evaluate([specialty("Seafood", 2)], day="Mon").discount == 2 * 1999 - 2500
+
+
+def test_bad_definitions_are_refused():
+    with pytest.raises(ValueError):
+        promotions.PromotionEngine([{"id": "x", "reward": {"type": "free_pizza"}}])
+    with pytest.raises(ValueError):
+        promotions.PromotionEngine([{"id": "x", "requires": [{"match": {"colour": "red"}}], "reward": {"type": "amount_off"}}])
+    with pytest.raises(ValueError):
+        promotions.PromotionEngine([{"reward": {"type": "amount_off"}}])
+
+
+def test_missing_rules_file_means_no_promotions(tmp_path):
+    assert promotions.load_rules(str(tmp_path / "none.json")).evaluate([specialty("Hawaiian")]).discount == 0
@@ -0,0 +1,72 @@
+import pytest
+
+import recommend
+from recommend import Recommender
+
+PORK = {"type": "pizza", "size": "Large", "crust": "Thin", "toppings": [], "quantity": 1, "name": "Flaming Pork",
+        "specialty": "Flaming Pork", "price": 15.99}
+PUNCH = {"type": "beverage", "beverage": "Fruit Punch", "beverage_quantity": 1, "price": 1.75}
+SPRITE = {"beverage": "Sprite", "beverage_quantity": 1, "price": 1.75}
+MUSHROOM = {"size": "Small", "crust": "Regular", "toppings": ["Mushrooms"], "quantity": 1, "price": 9.99}
+
+
+def test_suggests_what_was_bought_together():
+    recommender = Recommender()
+    for _ in range(3):
+        recommender.add_order([PORK, PUNCH])
+    for _ in range(recommend.MIN_TOGETHER - 1):
+        recommender.add_order([PORK, SPRITE])
+    assert recommender.suggest([PORK]) == [("beverage", "Fruit Punch")]
+    assert recommender.suggest([PUNCH]) == [("specialty", "Flaming Pork")]
+    assert recommender.suggest([PORK, PUNCH]) == []
+    # Toppings count towards what a pizza goes with, but are never suggested.
+    for _ in range(2):
+        recommender.add_order([MUSHROOM, SPRITE])
+    assert recommender.suggest([MUSHROOM]) == [("beverage", "Sprite")]
+    assert ("topping", "Mushrooms") not in recommender.suggest([SPRITE])
+    # Adding an order drops what was ranked and cached before it.
+    recommender.add_order([PORK, SPRITE])
+    assert recommender.suggest([PORK]) == [("beverage", "Fruit Punch"), ("beverage", "Sprite")]
+
+
+def test_terminals_add_to_each_others_counts(tmp_path):
+    path = str(tmp_path / "users.cooccur")
+    first, second = Recommender(path), Recommender(path)
+    first.add_order([PORK, PUNCH])
+    second.add_order([PORK, PUNCH])
+    first.save()
+    second.save()
+    assert Recommender(path).suggest([PORK]) == [("beverage", "Fruit Punch")]
+
+
+def test_counts_follow_the_catalog_when_it_changes(tmp_path):
+    path = str(tmp_path / "users.cooccur")
+    old = Recommender(path, items=[("beverage", "Retired Soda")] + recommend.ITEMS)
+    old.rebuild([[PORK, PUNCH]] * 2)
+    assert Recommender(path).suggest([PORK]) == [("beverage", "Fruit Punch")]
+
+
+def written(tmp_path):
+    path = tmp_path / "users.cooccur"
+    Recommender(str(path)).rebuild([[PORK, PUNCH]])
+    return path, path.read_bytes()
+
+
+@pytest.mark.parametrize("damage", [
+    lambda data: data[:recommend.HEADER.size - 1],
+    lambda data: b"NOPE" + data[4:],
+    lambda data: data[:-1],
+    lambda data: data + bytes(4),
+    lambda data: data[:recommend.HEADER.size] + b"\xff" + data[recommend.HEADER.size + 1:],
+    lambda data: data[:recommend.HEADER.size] + b"{" + data[recommend.HEADER.size + 1:],
+])
+def test_damaged_index_is_refused(tmp_path, damage):
+    path, data = written(tmp_path)
+    path.write_bytes(damage(data))
+    with pytest.raises(ValueError):
+        Recommender(str(path))
+
+
+def test_index_sits_beside_the_store():
+    assert recommend.index_path("users.json") == "users.cooccur"
+    assert recommend.index_path("shop/users.d/") == "shop/users.cooccur"
@@ -0,0 +1,161 @@
+import os
+import threading
+
+import pytest
+
+import store
+
+LAYOUTS = ["users.json", "users.d", "users.db"]
+
+
+@pytest.fixture(params=LAYOUTS)
+def shop(request, tmp_path):
+    opened = store.open_store(str(tmp_path / request.param))
+    yield opened
+    opened.close()
+
+
+def sprite(n):
+    return [{"type": "beverage", "beverage": "Sprite", "beverage_quantity": 1, "price": 1.0, "n": n}]
+
+
+def test_open_store_picks_the_layout_from_the_name(tmp_path):
+    for name, kind in [("users.json", store.JsonUserStore), ("users.d", store.ShardedJsonUserStore),
+                       ("users.db", store.SqliteUserStore)]:
+        opened = store.open_store(str(tmp_path / name))
+        assert type(opened) is kind
+        opened.close()
+
+
+def test_atomic_write_replaces_the_file_and_leaves_no_temp_file(tmp_path):
+    path = str(tmp_path / "users.json")
+    store.atomic_write(path, [b"old"])
+    store.atomic_write(path, [b"n", b"ew"])
+    assert open(path, "rb").read() == b"new"
+    assert os.listdir(tmp_path) == ["users.json"]
+
+
+def test_file_lock_lets_one_holder_in_at_a_time(tmp_path):
+    path = str(tmp_path / "counter")
+    store.atomic_write(path, [b"0"])
+
+    def bump():
+        for _ in range(50):
+            with store.file_lock(path):
+                value = int(open(path).read())
+                store.atomic_write(path, [b"%d" % (value + 1)])
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert open(path).read() == "200"
+
+
+@pytest.mark.parametrize("layout", ["json", "sharded", "sqlite"])
+def test_concurrent_terminals_lose_no_orders(layout):
+    rate, lost = store._stress(layout, writers=3, orders=20)
+    assert lost == 0
+
+
+def test_accounts_and_orders(shop):
+    assert shop.add_user("amy", "pw") is True
+    assert shop.add_user("amy", "other") is False
+    assert shop.check_password("amy", "pw")
+    assert not shop.check_password("amy", "other")
+    assert not shop.user_exists("bob")
+    shop.add_order("amy", sprite(1))
+    shop.add_order("amy", sprite(2))
+    assert [order[0]["n"] for order in shop.orders("amy")] == [1, 2]
+    assert shop.order_count("amy") == 2
+
+
+def page_numbers(page):
+    return [number for number, items in page.orders]
+
+
+def test_order_history_pages_newest_first(shop):
+    shop.add_user("amy", "pw")
+    for n in range(1, 26):
+        shop.add_order("amy", sprite(n))
+
+    first = shop.order_page("amy", limit=10)
+    assert page_numbers(first) == list(range(25, 15, -1))
+    assert (first.total, first.older, first.newer) == (25, 15, None)
+    assert [items[0]["n"] for number, items in first.orders] == page_numbers(first)
+
+    last = shop.order_page("amy", before=5, limit=10)
+    assert page_numbers(last) == [5, 4, 3, 2, 1]
+    assert (last.older, last.newer) == (None, 15)
+
+    # A cursor past either end is clamped.
+    assert page_numbers(shop.order_page("amy", before=99, limit=3)) == [25, 24, 23]
+    assert shop.order_page("amy", before=0, limit=3).orders == []
+
+
+def test_a_customer_with_no_orders_has_one_empty_page(shop):
+    shop.add_user("amy", "pw")
+    assert shop.order_page("amy") == store.Page([], 0, None, None)
+    assert shop.order_page("nobody") == store.Page([], 0, None, None)
+
+
+class Root:
+    """Enough of a Tk root for WriteBehindStore; the poll that reports saves never runs."""
+
+    def after(self, ms, callback):
+        return "after#1"
+
+    def after_cancel(self, after_id):
+        pass
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_pages_include_orders_still_queued_for_the_writer(tmp_path, layout):
+    path = str(tmp_path / layout)
+    saved = store.open_store(path)
+    saved.add_user("amy", "pw")
+    for n in range(1, 8):
+        saved.add_order("amy", sprite(n))
+    saved.close()
+
+    writer = store.WriteBehindStore(path, Root())
+    for n in range(8, 11):
+        writer.add_order("amy", sprite(n))
+    page = writer.order_page("amy", limit=4)
+    assert page_numbers(page) == [10, 9, 8, 7]
+    assert [items[0]["n"] for number, items in page.orders] == [10, 9, 8, 7]
+    assert writer.order_count("amy") == 10
+    writer.close()
+    reopened = store.open_store(path)
+    assert reopened.order_count("amy") == 10
+    reopened.close()
+
+
+def test_orders_are_found_by_id_phone_and_name(shop):
+    shop.add_user("amy", "pw")
+    first = store.new_order("amy", sprite(1), "Amy Pond", "(812) 555-0101", "1 Elm St")
+    second = store.new_order(None, sprite(2), "Amy Pond", "812.555.0101", "1 Elm St")
+    shop.record_order("amy", first)
+    shop.record_order(None, second)
+
+    assert shop.find_order(first["id"])["items"] == first["items"]
+    assert shop.find_order(second["id"])["username"] is None
+    assert shop.find_order("NO-SUCH") is None
+    # Newest first; phone numbers match on their digits and names ignore case.
+    assert [order["id"] for order in shop.find_orders(phone="812-555-0101")] == [second["id"], first["id"]]
+    assert [order["id"] for order in shop.find_orders(name="amy pond")] == [second["id"], first["id"]]
+    # A guest's order isn't in anyone's history.
+    assert shop.order_count("amy") == 1
+
+
+def test_a_duplicate_order_id_changes_nothing(shop):
+    shop.add_user("amy", "pw")
+    order = store.new_order("amy", sprite(1), "Amy", "812-555-0101", "1 Elm St")
+    shop.record_order("amy", order)
+    clash = dict(order, items=sprite(2), phone="812-555-9999")
+    results = shop.apply([("record_order", "amy", clash)])
+    assert isinstance(results[0], Exception)
+    assert [items[0]["n"] for items in shop.orders("amy")] == [1]
+    assert shop.find_order(order["id"])["items"] == order["items"]
+    assert shop.find_orders(phone="812-555-9999") == []
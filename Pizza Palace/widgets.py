@@ -0,0 +1,281 @@
+"""
+Title: Pizza Palace Widgets
+File: widgets.py
+Author: Joshua Nobel
+
+Reusable Tk widgets for the Pizza Palace GUI.
+
+VirtualList shows a long list of rows inside a canvas but only keeps widgets
+for the rows currently on screen. Rows scrolled out of view are hidden and
+handed to the next row that scrolls in, so a list of 10,000 items costs the
+same to draw and scroll as a list of 20.
+
+AutocompleteEntry is an Entry that drops a list of completions under
+itself as the user types. Looking them up is left to a complete function,
+which may answer later from another thread (see address_index.Lookup);
+an answer for anything but what is in the box now is ignored.
+"""
+
+import tkinter as tk
+from bisect import bisect_left, bisect_right
+
+
+def bind_mousewheel(widget, canvas):
+    """Scroll canvas with the mouse wheel while the pointer is over widget."""
+    def on_wheel(event):
+        if event.num == 4:
+            canvas.yview_scroll(-3, "units")
+        elif event.num == 5:
+            canvas.yview_scroll(3, "units")
+        elif event.delta:
+            # Windows reports multiples of 120, macOS small deltas.
+            step = -event.delta // 120 if abs(event.delta) >= 120 else -event.delta
+            canvas.yview_scroll(step * 3, "units")
+
+    def on_enter(event):
+        widget.bind_all("<MouseWheel>", on_wheel)
+        widget.bind_all("<Button-4>", on_wheel)
+        widget.bind_all("<Button-5>", on_wheel)
+
+    def on_leave(event):
+        # Moving onto a child widget also sends <Leave>; keep the wheel bound then.
+        inside = widget.winfo_containing(*widget.winfo_pointerxy())
+        if inside is not None and str(inside).startswith(str(widget)):
+            return
+        widget.unbind_all("<MouseWheel>")
+        widget.unbind_all("<Button-4>")
+        widget.unbind_all("<Button-5>")
+
+    widget.bind("<Enter>", on_enter, add="+")
+    widget.bind("<Leave>", on_leave, add="+")
+
+
+class VirtualList(tk.Frame):
+    def __init__(self, parent, create_row, update_row, row_height=None, height_of=None, bg="#FFE461", **kwargs):
+        """
+        create_row(parent) builds one empty row widget; update_row(row, index, item)
+        fills it in for an item. Rows are either all row_height pixels tall,
+        measured from the first row when row_height is None, or height_of(index, item)
+        pixels tall when the list has variable row heights.
+        """
+        super().__init__(parent, bg=bg, **kwargs)
+        self.create_row = create_row
+        self.update_row = update_row
+        self.row_height = row_height
+        self.height_of = height_of
+        self.items = []
+        self._offsets = [0]
+        self._active = {}
+        self._pool = []
+
+        self.canvas = tk.Canvas(self, bg=bg, highlightthickness=0, yscrollincrement=20, takefocus=1)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", self._on_configure)
+        self.canvas.bind("<Button-1>", lambda e: self.canvas.focus_set())
+        self.canvas.bind("<Up>", lambda e: self.yview("scroll", -1, "units"))
+        self.canvas.bind("<Down>", lambda e: self.yview("scroll", 1, "units"))
+        self.canvas.bind("<Prior>", lambda e: self.yview("scroll", -1, "pages"))
+        self.canvas.bind("<Next>", lambda e: self.yview("scroll", 1, "pages"))
+        self.canvas.bind("<Home>", lambda e: self.yview("moveto", 0))
+        self.canvas.bind("<End>", lambda e: self.yview("moveto", 1))
+        bind_mousewheel(self, self)
+
+    def yview_scroll(self, number, what):
+        self.yview("scroll", number, what)
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self._render()
+
+    def set_items(self, items):
+        self.items = list(items)
+        self._recompute_offsets(0)
+        self._invalidate()
+
+    def insert(self, index, item):
+        self.items.insert(index, item)
+        self._recompute_offsets(index)
+        self._invalidate(index)
+
+    def delete(self, index):
+        del self.items[index]
+        self._recompute_offsets(index)
+        self._invalidate(index)
+
+    def update_item(self, index, item):
+        """Replace one item, redrawing only its row if it is on screen."""
+        self.items[index] = item
+        if self.height_of is not None:
+            old_height = self._offsets[index + 1] - self._offsets[index]
+            if self.height_of(index, item) != old_height:
+                self._recompute_offsets(index)
+                self._invalidate(index)
+                return
+        row = self._active.get(index)
+        if row is not None:
+            self.update_row(row[0], index, item)
+
+    def refresh(self):
+        """Redraw the rows on screen, e.g. after the items changed in place."""
+        for index, (row, window) in self._active.items():
+            self.update_row(row, index, self.items[index])
+
+    def visible_rows(self):
+        """(index, row widget) for each row on screen, for small in-place updates."""
+        return [(index, row) for index, (row, window) in self._active.items()]
+
+    def see(self, index):
+        total = self._offsets[-1]
+        if total:
+            self.yview("moveto", self._offsets[index] / total)
+
+    def _row_size(self, index, item):
+        if self.height_of is not None:
+            return self.height_of(index, item)
+        if self.row_height is None:
+            # Measure a real row once and use it for every row.
+            row, window = self._acquire()
+            self.update_row(row, index, item)
+            row.update_idletasks()
+            self.row_height = max(row.winfo_reqheight(), 1)
+            self._release(row, window)
+        return self.row_height
+
+    def _recompute_offsets(self, start):
+        del self._offsets[start + 1:]
+        y = self._offsets[start]
+        for index in range(start, len(self.items)):
+            y += self._row_size(index, self.items[index])
+            self._offsets.append(y)
+        self.canvas.configure(scrollregion=(0, 0, 0, y))
+
+    def _invalidate(self, start=0):
+        # Rows before start keep their index and position; only the rest are redrawn.
+        for index in [i for i in self._active if i >= start]:
+            self._release(*self._active.pop(index))
+        self._render()
+
+    def _acquire(self):
+        if self._pool:
+            return self._pool.pop()
+        row = self.create_row(self.canvas)
+        window = self.canvas.create_window(0, 0, window=row, anchor="nw", width=self.canvas.winfo_width())
+        return row, window
+
+    def _release(self, row, window):
+        self.canvas.itemconfigure(window, state="hidden")
+        self.canvas.coords(window, 0, -10000)
+        self._pool.append((row, window))
+
+    def _on_configure(self, event):
+        for row, window in self._active.values():
+            self.canvas.itemconfigure(window, width=event.width)
+        for row, window in self._pool:
+            self.canvas.itemconfigure(window, width=event.width)
+        self._render()
+
+    def _render(self):
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(bisect_right(self._offsets, top) - 1, 0)
+        last = min(bisect_left(self._offsets, bottom), len(self.items))
+
+        for index in [i for i in self._active if i < first or i >= last]:
+            self._release(*self._active.pop(index))
+
+        width = self.canvas.winfo_width()
+        for index in range(first, last):
+            if index in self._active:
+                continue
+            row, window = self._acquire()
+            self._active[index] = (row, window)
+            self.update_row(row, index, self.items[index])
+            height = self._offsets[index + 1] - self._offsets[index]
+            self.canvas.coords(window, 0, self._offsets[index])
+            self.canvas.itemconfigure(window, state="normal", width=width, height=height)
+
+
+class AutocompleteEntry(tk.Entry):
+    def __init__(self, parent, complete, rows=6, min_chars=2, **kwargs):
+        """
+        complete(text, show) looks text up and calls show(text, matches) on the
+        Tk thread when it has them. Down moves into the list; Return or a click
+        takes a completion and Escape closes the list.
+        """
+        super().__init__(parent, **kwargs)
+        self.complete = complete
+        self.rows = rows
+        self.min_chars = min_chars
+        self.asked = None
+        self.listbox = tk.Listbox(parent, height=rows, exportselection=False)
+        self.bind("<KeyRelease>", self._on_key, add="+")
+        self.bind("<Down>", self._into_list, add="+")
+        self.bind("<Escape>", lambda e: self.hide(), add="+")
+        self.bind("<FocusOut>", self._on_focus_out, add="+")
+        self.listbox.bind("<ButtonRelease-1>", lambda e: self._take())
+        self.listbox.bind("<Return>", lambda e: self._take())
+        self.listbox.bind("<Escape>", lambda e: (self.hide(), self.focus_set()))
+        self.listbox.bind("<FocusOut>", self._on_focus_out, add="+")
+
+    def _on_key(self, event):
+        if event.keysym in ("Down", "Up", "Return", "Escape", "Tab"):
+            return
+        text = self.get()
+        if text == self.asked:
+            return
+        self.asked = text
+        if len(text.strip()) < self.min_chars:
+            self.hide()
+            return
+        self.complete(text, self.show)
+
+    def show(self, text, matches):
+        if text != self.get():
+            return
+        if not matches or matches == [text]:
+            self.hide()
+            return
+        self.listbox.delete(0, tk.END)
+        for match in matches:
+            self.listbox.insert(tk.END, match)
+        self.listbox.configure(height=min(len(matches), self.rows))
+        self.listbox.place(in_=self, relx=0, rely=1, relwidth=1)
+        self.listbox.lift()
+
+    def hide(self):
+        self.listbox.place_forget()
+
+    def _into_list(self, event):
+        if self.listbox.winfo_ismapped():
+            self.listbox.focus_set()
+            self.listbox.selection_clear(0, tk.END)
+            self.listbox.selection_set(0)
+            self.listbox.activate(0)
+        return "break"
+
+    def _take(self):
+        selection = self.listbox.curselection()
+        if selection:
+            text = self.listbox.get(selection[0])
+            self.delete(0, tk.END)
+            self.insert(0, text)
+            self.asked = text
+        self.hide()
+        self.focus_set()
+        self.icursor(tk.END)
+
+    def _on_focus_out(self, event):
+        # Wait until focus has landed: going from the box to its own list keeps the list open.
+        self.after_idle(self._hide_unless_focused)
+
+    def _hide_unless_focused(self):
+        try:
+            focused = self.focus_get()
+        except KeyError:
+            focused = None
+        if focused not in (self, self.listbox):
+            self.hide()